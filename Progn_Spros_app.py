@@ -5,16 +5,27 @@ sys.path.insert(0,'opt/foresight')
 # Импорт стандартной библиотеки
 import logging  # Ведение журнала для отладки и мониторинга
 
+import click  # Команды flask CLI
+
 # Импорт Flask
-from flask import Flask, jsonify, request  # Основные классы и функции Flask
+from flask import Flask, Response, jsonify, request  # Основные классы и функции Flask
 
 # Импорт SQLAlchemy
 from sqlalchemy import select, distinct, not_, literal, func, and_  # Основные функции SQLAlchemy
 from werkzeug.exceptions import HTTPException, InternalServerError
 
-from progSpros_back.model.db_models_ps import Base, PSDATA, reference_models  # Модели баз данных
+from progSpros_back.model.db_models_ps import PSDATA, reference_models  # Модели баз данных
+from progSpros_back.model.migrations_ps import LATEST_VERSION, SchemaCheck, current_version, upgrade  # Миграции
 from progSpros_back.functions.chart_data_functions_ps import apply_dynamic_filters  # Функции отображения данных на графике
 from progSpros_back.functions.utility_functions_ps import create_filter_params  # Полезные функции
+from progSpros_back.functions.reference_cache_ps import get_reference_lookups  # Кэш справочников
+from progSpros_back.functions.json_response_ps import JSONProvider  # Сериализация ответов JSON
+from progSpros_back.functions.request_metrics_ps import request_metrics, start_request, finish_request  # Метрики
+from progSpros_back.functions.forecast_cube_ps import refresh_forecast_cube  # Агрегат прогноза
+from progSpros_back.functions.swagger_spec_ps import SwaggerSpec  # Спецификация Swagger
+from progSpros_back.functions.bulk_load_ps import MODES, load_forecast  # Загрузка прогноза
+from progSpros_back.functions.prirost_builder_ps import build_prirost, parse_pair  # Построение прироста
+from progSpros_back.functions.utility_functions_ps import to_date
 from progSpros_back.functions.query_functions_ps import otrasl_query, all_data_query  # Функции запроса
 from progSpros_back.library_models_ps import ns_mod, year_grapth_model  # Library models
 from progSpros_back.config_ps import Config, changelog, secret_key  # Конфигурация и список изменений
@@ -30,6 +41,7 @@ from progSpros_back.namespace.ns_big_invest_xls_ps import ns_big_invest_xls_ps
 from progSpros_back.namespace.ns_region_fo_ps import ns_region_fo_ps
 from progSpros_back.namespace.ns_years_ps import ns_years_ps
 from progSpros_back.namespace.ots_pr_spr.ns_ots_pr_spr_pot_ps import ns_ots_pr_spr_ps
+from progSpros_back.namespace.ns_service_ps import ns_service_ps
 # Работа с базой данных
 from progSpros_back.database_ps import db, engine, cache
 # Импорт Flask-Restx
@@ -38,6 +50,8 @@ from flask_restx import Api, Resource, Namespace  # Классы Flask-Restx д
 app = Flask(__name__)
 app.config.from_object(Config)
 app.secret_key = secret_key
+# jsonify использует тот же сериализатор, что и json_response (orjson, если установлен)
+app.json = JSONProvider(app)
 
 
 # Настройка API Flask-Restx
@@ -47,16 +61,115 @@ api = Api(app,
           description=f'API configuration for the Progn_Spros project\n\n{changelog}'
           )
 
+# Кэш ответов: по умолчанию в памяти процесса с ограничением по объему (CACHE_MAX_BYTES)
+app.config.setdefault('CACHE_TYPE', 'progSpros_back.functions.response_cache_ps.MemoryBoundedCache')
 cache.init_app(app)
 
-# Создание таблиц базы данных
-with app.app_context():
-    Base.metadata.create_all(bind=engine)
-
 # Настройка ведения журнала
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Проверка схемы БД по номеру миграции (при актуальной схеме create_all не выполняется).
+# По умолчанию - при первом запросе: процесс стартует без обращения к БД, в том числе когда БД недоступна
+schema_check = SchemaCheck(engine, auto_migrate=app.config.get('SCHEMA_AUTO_MIGRATE', False),
+                           retry_seconds=app.config.get('SCHEMA_CHECK_RETRY_SECONDS', 30))
+if app.config.get('SCHEMA_CHECK_ON_STARTUP', False):
+    schema_check()
+else:
+    app.before_request(schema_check)
+
+# CORS: заголовок для всех ответов, включая ошибки (CORS_ALLOW_ORIGIN, по умолчанию '*')
+@app.after_request
+def add_cors_headers(response):
+    if 'Access-Control-Allow-Origin' not in response.headers:
+        response.headers['Access-Control-Allow-Origin'] = app.config.get('CORS_ALLOW_ORIGIN', '*')
+    return response
+
+# Счетчики поиска по справочникам: сколько значений фильтров найдено в кэше, а сколько - в БД
+@app.after_request
+def add_reference_lookups_header(response):
+    lookups = get_reference_lookups()
+    if lookups['memory'] or lookups['db']:
+        response.headers['X-Reference-Lookups'] = f"memory={lookups['memory']}; db={lookups['db']}"
+        logger.debug(f"Поиск по справочникам: {lookups}")
+    return response
+
+# Метрики запроса: время SQL, обработки и сериализации в заголовке Server-Timing и в /metrics
+@app.before_request
+def start_request_metrics():
+    start_request()
+
+@app.after_request
+def add_server_timing_header(response):
+    return finish_request(response)
+
+# Гистограммы метрик запросов в формате Prometheus (по пространству имен и маршруту)
+@app.route('/metrics')
+def metrics():
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# Пересборка агрегата прогноза после загрузки: flask --app Progn_Spros_app refresh-cube [--date 01.06.2024]
+@app.cli.command('refresh-cube')
+@click.option('--date', default=None, help='Дата загрузки; по умолчанию пересобираются все даты')
+def refresh_cube_command(date):
+    """Пересобирает агрегат tab_progn_spr_gaz_cube_d314."""
+    rows = refresh_forecast_cube(to_date(date) if date else None)
+    click.echo(f"tab_progn_spr_gaz_cube_d314: {rows} строк")
+
+# Загрузка прогноза: flask --app Progn_Spros_app load-forecast data.xlsx [--mode append] [--date 01.06.2024]
+@app.cli.command('load-forecast')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--mode', type=click.Choice(MODES), default='replace', show_default=True,
+              help='replace - заменить строки дат загрузки из файла, append - добавить строки')
+@click.option('--date', default=None, help='Дата загрузки для всех строк (если в файле нет колонки date)')
+@click.option('--sheet', default=None, help='Лист Excel; по умолчанию - активный')
+@click.option('--delimiter', default=',', show_default=True, help='Разделитель CSV')
+@click.option('--chunk-size', type=int, default=None, help='Строк в пакете загрузки')
+def load_forecast_command(path, mode, date, sheet, delimiter, chunk_size):
+    """Загружает tab_progn_spr_gaz_d314 из Excel или CSV."""
+    try:
+        result = load_forecast(path, mode, to_date(date) if date else None, sheet, delimiter, chunk_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    dates = ', '.join(load_date.strftime('%d.%m.%Y') for load_date in result.dates)
+    click.echo(f"tab_progn_spr_gaz_d314: {result.rows} строк за {result.seconds:.1f} с, даты загрузки: {dates}")
+
+# Построение прироста: flask --app Progn_Spros_app build-prirost [--date 01.06.2024] [--pair 2023-2036] [--force]
+@app.cli.command('build-prirost')
+@click.option('--date', 'dates', multiple=True, help='Дата загрузки; по умолчанию - все даты')
+@click.option('--pair', 'pairs', multiple=True, help='Пара лет, например 2023-2036; по умолчанию - все пары')
+@click.option('--force', is_flag=True, help='Пересчитать уже построенные пары')
+@click.option('--chunk-pairs', type=int, default=None, help='Пар лет в одном шаге')
+def build_prirost_command(dates, pairs, force, chunk_pairs):
+    """Строит tab_prirost_d314 из tab_progn_spr_gaz_d314 (только непостроенные пары, если нет --force)."""
+    try:
+        steps = build_prirost([to_date(date) for date in dates] or None, [parse_pair(pair) for pair in pairs] or None,
+                              force, chunk_pairs)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    for step in steps:
+        click.echo(f"{step.date:%d.%m.%Y} {step.pairs[0][0]}-{step.pairs[0][1]}..{step.pairs[-1][0]}-{step.pairs[-1][1]} "
+                   f"({len(step.pairs)} пар): {step.rows} строк за {step.seconds:.1f} с")
+    click.echo(f"tab_prirost_d314: {sum(step.rows for step in steps)} строк за "
+               f"{sum(step.seconds for step in steps):.1f} с, шагов {len(steps)}")
+
+# Миграции схемы: flask --app Progn_Spros_app db-upgrade [--target N]
+@app.cli.command('db-upgrade')
+@click.option('--target', type=int, default=None, help='Номер миграции; по умолчанию - последняя')
+def db_upgrade_command(target):
+    """Применяет миграции схемы БД."""
+    applied = upgrade(engine, target)
+    for migration in applied:
+        click.echo(f"Применена миграция {migration.version}: {migration.description}")
+    if not applied:
+        click.echo("Схема БД актуальна")
+
+@app.cli.command('db-version')
+def db_version_command():
+    """Выводит номер примененной миграции схемы БД."""
+    with engine.connect() as connection:
+        click.echo(f"Версия схемы: {current_version(connection)} из {LATEST_VERSION}")
+
 # Добавить namespace в API
 api.add_namespace(ns_rf_ps,  path='')
 api.add_namespace(ns_otrasl_ps,  path='')
@@ -70,6 +183,11 @@ api.add_namespace(ns_big_invest_xls_ps,  path='')
 api.add_namespace(ns_mapping_otr_ps,  path='')
 api.add_namespace(ns_years_ps, path='')
 api.add_namespace(ns_ots_pr_spr_ps, path='')
+api.add_namespace(ns_service_ps, path='')
+
+# /swagger.json: спецификация сериализуется один раз и отдается из памяти с ETag
+swagger_spec = SwaggerSpec(api)
+app.view_functions['specs'] = swagger_spec.view
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
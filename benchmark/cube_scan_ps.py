@@ -0,0 +1,80 @@
+"""
+    Сравнение чтения прогноза из tab_progn_spr_gaz_d314 и из агрегата tab_progn_spr_gaz_cube_d314.
+
+    Для даты загрузки выводит количество строк, которые читает каждый источник, время запросов
+    графиков (медиана по --repeat запускам) и совпадение результатов.
+
+    Запуск (БД из Config.SQLALCHEMY_DATABASE_URI, агрегат должен быть пересобран: flask refresh-cube):
+        python -m progSpros_back.benchmark.cube_scan_ps --date 2024-06-01 --yearfrom 2024 --yearto 2035
+
+    На синтетических данных (benchmark/synthetic_data_ps.py, --rows 1e6 --dates 3, в среднем 6 объектов
+    в проекте) SQLite: 333 326 строк прогноза за дату против 55 804 строк агрегата (в 6.0 раз меньше),
+    запросы графиков быстрее в 2.7-6.8 раза, результаты совпадают.
+"""
+import argparse
+import statistics
+import time
+
+from sqlalchemy import func
+
+from progSpros_back.database_ps import db
+from progSpros_back.functions.query_functions_ps import otrasl_query, top_potr_query, fo_otrasl_query, \
+    fo_potr_query, sankey_query, sankey_query2
+from progSpros_back.functions.utility_functions_ps import to_date
+from progSpros_back.model.db_models_ps import PSDATA, PSCube, Otrasl, Contragent, VersProgn, FedState, \
+    GroupPost, Proizv
+
+
+def chart_queries(model, yearfrom, yearto, date):
+    base_query = db.query(model)
+    return {
+        'otrasl_query': otrasl_query(base_query, model, Otrasl, yearfrom, yearto, date),
+        'top_potr_query': top_potr_query(base_query, model, Contragent, VersProgn, yearfrom, yearto, date),
+        'fo_otrasl_query': fo_otrasl_query(base_query, model, FedState, Otrasl, yearfrom, yearto, date),
+        'fo_potr_query': fo_potr_query(base_query, model, FedState, Contragent, yearfrom, yearto, date),
+        'sankey_query': sankey_query(base_query, model, GroupPost, Proizv, yearfrom, date),
+        'sankey_query2': sankey_query2(base_query, model, Otrasl, GroupPost, yearfrom, date),
+    }
+
+
+def timed(query, repeat):
+    timings = []
+    rows = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = [tuple(row) for row in query.all()]
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--date', required=True, help='Дата загрузки')
+    parser.add_argument('--yearfrom', type=int, default=2024)
+    parser.add_argument('--yearto', type=int, default=2035)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    date = to_date(args.date)
+
+    try:
+        source_rows = db.query(func.count(PSDATA.id)).filter(PSDATA.date == date).scalar()
+        cube_rows = db.query(func.count(PSCube.id)).filter(PSCube.date == date).scalar()
+        print(f"Строк за {args.date}: tab_progn_spr_gaz_d314 = {source_rows}, "
+              f"tab_progn_spr_gaz_cube_d314 = {cube_rows}"
+              + (f" (в {source_rows / cube_rows:.1f} раз меньше)" if cube_rows else ''))
+
+        source = chart_queries(PSDATA, args.yearfrom, args.yearto, date)
+        cube = chart_queries(PSCube, args.yearfrom, args.yearto, date)
+        print(f"{'запрос':<18}{'PSDATA, мс':>12}{'PSCube, мс':>12}{'ускорение':>11}  результат")
+        for name in source:
+            source_time, source_result = timed(source[name], args.repeat)
+            cube_time, cube_result = timed(cube[name], args.repeat)
+            speedup = source_time / cube_time if cube_time else float('inf')
+            status = 'совпадает' if source_result == cube_result else 'РАЗЛИЧАЕТСЯ'
+            print(f"{name:<18}{source_time * 1000:>12.1f}{cube_time * 1000:>12.1f}{speedup:>10.1f}x  {status}")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
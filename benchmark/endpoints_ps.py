@@ -0,0 +1,184 @@
+"""
+    Бенчмарк всех зарегистрированных эндпоинтов API.
+
+    Каждый GET-эндпоинт без параметров пути вызывается через тестовый клиент Flask с параметрами
+    date (последняя дата загрузки), yearfrom и yearto. Для каждого эндпоинта выводятся:
+        - p50/p95/p99 времени ответа по --repeat запросам (после --warmup прогревочных);
+        - количество SQL-запросов и прочитанных строк в одном запросе;
+        - пик памяти Python (tracemalloc) в отдельном запросе, чтобы трассировка не искажала время.
+
+    Кэш ответов по умолчанию выключен, чтобы измерялся путь до БД (--response-cache включает его).
+    Строки считаются по cursor.rowcount (PostgreSQL) или row_factory (SQLite); строки потоковых
+    курсоров PostgreSQL (yield_per) не учитываются.
+
+    Запуск на синтетических данных (см. benchmark/synthetic_data_ps.py):
+        python -m progSpros_back.benchmark.endpoints_ps --database sqlite:////tmp/progspros_bench.db \\
+            --generate --rows 1e5 --repeat 20
+"""
+import argparse
+import json
+import math
+import os
+import resource
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import event
+
+from progSpros_back.benchmark.synthetic_data_ps import add_arguments, populate
+
+
+class SqlCounter:
+    """Счетчик SQL-запросов и прочитанных строк движка SQLAlchemy."""
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+
+    def install(self, engine):
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', self._sqlite_connect)
+        # Соединения, открытые до подключения счетчика, переоткрываются
+        engine.dispose()
+
+    def reset(self):
+        self.statements = 0
+        self.rows = 0
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        if conn.dialect.name != 'sqlite' and cursor.description is not None and cursor.rowcount > 0:
+            self.rows += cursor.rowcount
+
+    def _sqlite_connect(self, dbapi_connection, connection_record):
+        # sqlite3 не сообщает количество строк SELECT: строки считаются при чтении
+        def row_factory(cursor, row):
+            self.rows += 1
+            return row
+        dbapi_connection.row_factory = row_factory
+
+
+def percentile(values, q):
+    """Перцентиль q (0-100) методом ближайшего ранга."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def endpoints(app, pattern=None):
+    """Пути GET-эндпоинтов приложения без параметров пути."""
+    paths = []
+    for rule in app.url_map.iter_rules():
+        if 'GET' not in rule.methods or rule.arguments:
+            continue
+        if pattern and pattern not in rule.rule:
+            continue
+        paths.append(rule.rule)
+    return sorted(set(paths))
+
+
+def request(client, path, params):
+    response = client.get(path, query_string=params)
+    # Потоковые ответы (send_file) дочитываются, чтобы время включало формирование всего тела
+    size = len(response.get_data())
+    response.close()
+    return response.status_code, size
+
+
+def measure(client, counter, path, params, args):
+    for _ in range(args.warmup):
+        request(client, path, params)
+
+    timings = []
+    for _ in range(args.repeat):
+        counter.reset()
+        start = time.perf_counter()
+        status, size = request(client, path, params)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    request(client, path, params)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'path': path,
+        'status': status,
+        'bytes': size,
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+        'mean_ms': statistics.fmean(timings) * 1000,
+        'statements': counter.statements,
+        'rows': counter.rows,
+        'peak_mb': peak / 2 ** 20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database', help='Адрес БД (по умолчанию PROGSPROS_DATABASE_URI или Config)')
+    parser.add_argument('--generate', action='store_true', help='Пересоздать синтетические данные перед запуском')
+    parser.add_argument('--repeat', type=int, default=20, help='Измеряемых запросов на эндпоинт')
+    parser.add_argument('--warmup', type=int, default=1, help='Прогревочных запросов на эндпоинт')
+    parser.add_argument('--endpoint', help='Только эндпоинты, путь которых содержит строку')
+    parser.add_argument('--response-cache', action='store_true', help='Не выключать кэш ответов')
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.rows = int(args.rows)
+
+    # Адрес БД читается при импорте database_ps, поэтому приложение импортируется после его установки
+    if args.database:
+        os.environ['PROGSPROS_DATABASE_URI'] = args.database
+
+    if args.generate:
+        print(f"Генерация данных: {args.rows} строк прогноза")
+        populate(args)
+
+    from sqlalchemy import func
+
+    from progSpros_back.config_ps import Config
+    from progSpros_back.database_ps import db, engine
+
+    if not args.response_cache:
+        Config.RESPONSE_CACHE_ENABLED = False
+
+    from progSpros_back.Progn_Spros_app import app
+    from progSpros_back.model.db_models_ps import PSDATA
+
+    try:
+        last_date = db.query(func.max(PSDATA.date)).scalar()
+    finally:
+        db.close()
+    params = {'yearfrom': args.yearfrom, 'yearto': args.yearto}
+    if last_date is not None:
+        params['date'] = last_date.strftime('%Y-%m-%d')
+
+    counter = SqlCounter()
+    counter.install(engine)
+    client = app.test_client()
+
+    print(f"БД: {engine.url.render_as_string(hide_password=True)}; параметры: {params}")
+    print(f"{'эндпоинт':<40}{'код':>5}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+          f"{'SQL':>6}{'строк':>10}{'пик, МБ':>10}{'ответ, КБ':>11}")
+    results = []
+    for path in endpoints(app, args.endpoint):
+        result = measure(client, counter, path, params, args)
+        results.append(result)
+        print(f"{path:<40}{result['status']:>5}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+              f"{result['p99_ms']:>10.1f}{result['statements']:>6}{result['rows']:>10}"
+              f"{result['peak_mb']:>10.1f}{result['bytes'] / 1024:>11.1f}", flush=True)
+
+    # ru_maxrss в Linux - в килобайтах
+    print(f"Пиковый RSS процесса: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} МБ")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'params': params, 'repeat': args.repeat, 'results': results}, file,
+                      ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+    Время импорта приложения и память процесса при холодном старте (как у процесса mod_wsgi).
+
+    Каждый запуск - отдельный процесс python -X importtime, который импортирует приложение
+    и сообщает время импорта, пиковый RSS и загруженные тяжелые библиотеки. Сравниваются:
+        - старт: импорт Progn_Spros_app (все, что процесс платит до первого запроса);
+        - старт + отчет: то же и модули отчета ots_pr_spr (pandas, openpyxl), которые импортируются
+          при первом запросе отчета или выгрузки. Разница - выигрыш процесса, который отчеты не отдает.
+    По -X importtime выводится собственное время импорта по пакетам верхнего уровня.
+
+    Запуск:
+        python -m progSpros_back.benchmark.import_time_ps --repeat 5
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+APP_MODULE = 'progSpros_back.Progn_Spros_app'
+
+# Модули, которые импортируются при первом запросе отчета ots_pr_spr или выгрузки в Excel
+DEFERRED_MODULES = (
+    'progSpros_back.namespace.ots_pr_spr.data_processor',
+    'progSpros_back.namespace.ots_pr_spr.excel_generator',
+    'openpyxl',
+)
+
+HEAVY_PACKAGES = ('pandas', 'openpyxl', 'numpy')
+
+# Код дочернего процесса: импорт модулей, время, пиковый RSS (ru_maxrss в Linux - в килобайтах)
+CHILD_CODE = '''
+import json, resource, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    'seconds': elapsed,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def run_child(modules):
+    """Запускает процесс с -X importtime. Возвращает результат процесса и собственное время импорта по пакетам, мкс."""
+    code = CHILD_CODE.format(modules=tuple(modules), heavy=HEAVY_PACKAGES)
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, env=os.environ.copy(),
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Импорт завершился с ошибкой:\n{completed.stderr[-2000:]}")
+
+    packages = defaultdict(int)
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            packages[match.group(4).split('.', 1)[0]] += int(match.group(1))
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return result, packages
+
+
+def measure(modules, repeat):
+    runs = [run_child(modules) for _ in range(repeat)]
+    packages = defaultdict(list)
+    for _, run_packages in runs:
+        for name, microseconds in run_packages.items():
+            packages[name].append(microseconds)
+    return {
+        'seconds': statistics.median(result['seconds'] for result, _ in runs),
+        'rss_mb': statistics.median(result['rss_mb'] for result, _ in runs),
+        'loaded': runs[-1][0]['loaded'],
+        'packages': {name: statistics.median(values) / 1e6 for name, values in packages.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Запусков каждого варианта')
+    parser.add_argument('--top', type=int, default=12, help='Пакетов в таблице -X importtime')
+    parser.add_argument('--output', help='Сохранить результаты в JSON')
+    args = parser.parse_args()
+
+    variants = {
+        'старт': measure([APP_MODULE], args.repeat),
+        'старт + отчет': measure([APP_MODULE, *DEFERRED_MODULES], args.repeat),
+    }
+
+    print(f"{'вариант':<16}{'импорт, с':>11}{'RSS, МБ':>10}  загружены")
+    for name, result in variants.items():
+        print(f"{name:<16}{result['seconds']:>11.2f}{result['rss_mb']:>10.1f}  {', '.join(result['loaded']) or '-'}")
+    cold, full = variants['старт'], variants['старт + отчет']
+    print(f"Отложено до первого отчета: {full['seconds'] - cold['seconds']:.2f} с, "
+          f"{full['rss_mb'] - cold['rss_mb']:.1f} МБ")
+
+    print(f"\nСобственное время импорта по пакетам (-X importtime), с:")
+    print(f"{'пакет':<24}{'старт':>10}{'+ отчет':>10}")
+    names = sorted(full['packages'], key=full['packages'].get, reverse=True)[:args.top]
+    for name in names:
+        print(f"{name:<24}{cold['packages'].get(name, 0):>10.3f}{full['packages'][name]:>10.3f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'repeat': args.repeat, 'variants': variants}, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
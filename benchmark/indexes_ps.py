@@ -0,0 +1,117 @@
+"""
+    Влияние индексов FORECAST_INDEXES (миграция 2, model/migrations_ps.py) на планы и время запросов.
+
+    Для запросов графиков (tab_progn_spr_gaz_d314 и агрегат), big_invest_query_potr (tab_prirost_d314)
+    и отчета ots_pr_spr выводит план выполнения и медиану времени по --repeat запускам без индексов
+    и с индексами. Индексы удаляются и создаются заново, после чего собирается статистика (ANALYZE).
+
+    План: EXPLAIN в PostgreSQL, EXPLAIN QUERY PLAN в SQLite.
+
+    Запуск на синтетических данных (см. benchmark/synthetic_data_ps.py):
+        PROGSPROS_DATABASE_URI=sqlite:////tmp/progspros_bench.db \\
+            python -m progSpros_back.benchmark.indexes_ps --date 2024-06-01 --yearfrom 2023 --yearto 2036
+"""
+import argparse
+
+from sqlalchemy import text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from progSpros_back.benchmark.cube_scan_ps import chart_queries, timed
+from progSpros_back.database_ps import db, engine
+from progSpros_back.functions.filter_spec_ps import FilterSpec
+from progSpros_back.functions.query_functions_ps import big_invest_query_potr
+from progSpros_back.functions.utility_functions_ps import to_date
+from progSpros_back.model.db_models_ps import PSDATA, PSCube, Prirost, Otrasl, FedState, Regions, GroupPost, \
+    StPotr, StGaz, Infr, Dogovor, TU, Contragent
+from progSpros_back.model.migrations_ps import FORECAST_INDEXES, model_indexes
+from progSpros_back.namespace.ots_pr_spr.query_builder import get_query
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN для запроса SQLAlchemy: параметры передаются так же, как при выполнении запроса."""
+    inherit_cache = False
+
+    def __init__(self, statement, prefix):
+        self.statement = statement
+        self.prefix = prefix
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kw):
+    return f'{element.prefix} {compiler.process(element.statement, **kw)}'
+
+
+def plan(query):
+    prefix = 'EXPLAIN' if engine.dialect.name == 'postgresql' else 'EXPLAIN QUERY PLAN'
+    with engine.connect() as connection:
+        # Строки плана читаются из курсора DBAPI: типы колонок запроса к ним не применяются
+        rows = connection.execute(Explain(query.statement, prefix)).cursor.fetchall()
+    # PostgreSQL возвращает строки плана, SQLite - (id, parent, notused, detail)
+    return [row[-1] for row in rows]
+
+
+def queries(args):
+    date = to_date(args.date)
+    result = {
+        f'{name} [{model.__tablename__}]': query
+        for model in (PSDATA, PSCube)
+        for name, query in chart_queries(model, args.yearfrom, args.yearto, date).items()
+    }
+    result['big_invest_query_potr'] = big_invest_query_potr(
+        db.query(Prirost), Prirost, Otrasl, FedState, Regions, GroupPost, StPotr, StGaz, Infr, Dogovor, TU,
+        args.yearfrom, args.yearto, Contragent, date,
+    )
+    result['ots_pr_spr get_query'] = get_query(FilterSpec(), args.yearfrom, args.yearto)
+    return result
+
+
+def set_indexes(enabled):
+    with engine.begin() as connection:
+        indexes = model_indexes()
+        for index in (indexes[name] for name in FORECAST_INDEXES):
+            if enabled:
+                index.create(bind=connection, checkfirst=True)
+            else:
+                index.drop(bind=connection, checkfirst=True)
+        connection.execute(text('ANALYZE'))
+
+
+def run(args, label):
+    print(f"\n=== {label} ===")
+    results = {}
+    for name, query in queries(args).items():
+        elapsed, rows = timed(query, args.repeat)
+        results[name] = elapsed
+        print(f"{name}: {elapsed * 1000:.1f} мс, {len(rows)} строк")
+        if args.plans:
+            for line in plan(query):
+                print(f"    {line}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--date', required=True, help='Дата загрузки')
+    parser.add_argument('--yearfrom', type=int, default=2023)
+    parser.add_argument('--yearto', type=int, default=2036)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-plans', dest='plans', action='store_false', help='Не выводить планы')
+    args = parser.parse_args()
+
+    try:
+        set_indexes(False)
+        before = run(args, 'без индексов')
+        set_indexes(True)
+        after = run(args, 'с индексами')
+    finally:
+        db.close()
+
+    print(f"\n{'запрос':<40}{'без, мс':>10}{'с, мс':>10}{'ускорение':>11}")
+    for name in before:
+        speedup = before[name] / after[name] if after[name] else float('inf')
+        print(f"{name:<40}{before[name] * 1000:>10.1f}{after[name] * 1000:>10.1f}{speedup:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+    Память модели отчета "Оценка прогнозного спроса" (ots_pr_spr/data_models).
+
+    Сравнивает пиковый RSS и пик tracemalloc при построении модели отчета и ее сериализации
+    в JSON-структуру для двух представлений строк:
+        - tuples: RegionData со __slots__, общий заголовок и кортежи значений (текущая модель);
+        - relcolumns: объект RelColumn(name, value) на каждую ячейку (прежняя модель на dataclass).
+
+    Каждый вариант выполняется в отдельном процессе, поэтому пиковый RSS не смешивается.
+    Данные синтетические, БД не нужна.
+
+    Запуск:
+        python -m progSpros_back.benchmark.ots_pr_spr_memory_ps --regions 85 --consumers 300 --years 16
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, List
+
+from progSpros_back.namespace.ots_pr_spr.data_models import Consumers, RegionData
+
+VER_REAL = (
+    "действующие потребители",
+    "ожидаемые перспективные потребители",
+    "потенциальные перспективные потребители",
+)
+
+
+@dataclass
+class RelColumn:
+    name: str
+    value: Any
+
+
+@dataclass
+class LegacyConsumer:
+    name: str
+    rel_columns: List[RelColumn] = field(default_factory=list)
+
+    def to_dict(self):
+        return {"name": self.name, "rel_columns": [[col.name, col.value] for col in self.rel_columns]}
+
+
+def report_rows(args):
+    """Строки отчета: (регион, вероятность реализации, потребитель, значения)."""
+    values = tuple(None for _ in range(3)) + tuple(f"{year * 1.5:.1f}" for year in range(args.years + 1))
+    for region in range(args.regions):
+        for consumer in range(args.consumers):
+            yield f'Регион {region}', VER_REAL[consumer % 3], f'Потребитель {consumer}', values
+
+
+def build_tuples(args, header):
+    consumers = Consumers()
+    regions = {}
+    for region_name, ver_real, name, values in report_rows(args):
+        region = regions.get(region_name)
+        if region is None:
+            region = regions[region_name] = RegionData(region_name=region_name, header=header)
+            consumers.add_consumer(region)
+        region.add_detalization_consumers(ver_real=ver_real, name=name, values=values)
+    return consumers, consumers.to_dict()
+
+
+def build_relcolumns(args, header):
+    regions = {}
+    for region_name, ver_real, name, values in report_rows(args):
+        consumer = LegacyConsumer(name=name)
+        for col_name, col_value in dict(zip(header, values)).items():
+            consumer.rel_columns.append(RelColumn(name=col_name, value=col_value))
+        regions.setdefault(region_name, {}).setdefault(ver_real, []).append(consumer)
+    result = {
+        region_name: {ver_real: [consumer.to_dict() for consumer in items] for ver_real, items in groups.items()}
+        for region_name, groups in regions.items()
+    }
+    return regions, result
+
+
+VARIANTS = {'tuples': build_tuples, 'relcolumns': build_relcolumns}
+
+
+def measure(variant, args, queue):
+    header = ('Отрасль', 'Договор поставки газа', 'ТУ') + tuple(f'{2024 + year} год' for year in range(args.years)) \
+        + ('Прирост',)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+    model, result = VARIANTS[variant](args, header)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в Linux - в килобайтах
+    queue.put((variant, elapsed, current, peak, rss_after, rss_after - rss_before))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--regions', type=int, default=85)
+    parser.add_argument('--consumers', type=int, default=300, help='Потребителей в регионе')
+    parser.add_argument('--years', type=int, default=16)
+    args = parser.parse_args()
+
+    cells = args.regions * args.consumers * (args.years + 4)
+    print(f"Ячеек отчета: {cells}")
+    print(f"{'модель':<12}{'время, с':>10}{'модель, МБ':>12}{'пик, МБ':>10}{'пик RSS, МБ':>13}{'прирост RSS, МБ':>17}")
+
+    context = multiprocessing.get_context('spawn')
+    for variant in VARIANTS:
+        queue = context.Queue()
+        process = context.Process(target=measure, args=(variant, args, queue))
+        process.start()
+        name, elapsed, current, peak, rss, rss_delta = queue.get()
+        process.join()
+        print(f"{name:<12}{elapsed:>10.2f}{current / 2 ** 20:>12.1f}{peak / 2 ** 20:>10.1f}"
+              f"{rss / 1024:>13.1f}{rss_delta / 1024:>17.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+    Время этапов отчета "Оценка прогнозного спроса" (/OtsPrSpr/ots_pr_spr_pot_ps).
+
+    Для запроса get_query выводит медиану по --repeat запускам:
+        - SQL: выполнение запроса и чтение строк;
+        - подготовка: DataFrame из строк и preprocess_data;
+        - итоги: rollup_levels (итоги всех уровней и детализация за один проход по всем регионам);
+        - вывод: строки отчета по регионам (rows_by_region, fill_region) - get_data за вычетом
+          подготовки и итогов;
+        - pickle: сериализация результата - нижняя граница того, что пул процессов по регионам
+          добавил бы к выводу (результат возвращается из процессов пула сериализованным).
+
+    Запуск на синтетических данных (см. benchmark/synthetic_data_ps.py):
+        python -m progSpros_back.benchmark.ots_pr_spr_phases_ps --yearfrom 2024 --yearto 2036 --repeat 5
+"""
+import argparse
+import pickle
+import statistics
+import time
+
+import pandas as pd
+
+from progSpros_back.functions.filter_spec_ps import FilterSpec
+from progSpros_back.namespace.ots_pr_spr.data_processor import get_data, preprocess_data, rollup_levels
+from progSpros_back.namespace.ots_pr_spr.query_builder import get_query
+
+SHOWN_COLUMNS = ['otrasl', 'dogovor', 'tu']
+
+
+def measure(args):
+    years = [str(year) for year in range(args.yearfrom, args.yearto + 1)]
+    value_columns = [f'y{year}' for year in years] + ['prirost']
+    timings = {'SQL': [], 'подготовка': [], 'итоги': [], 'вывод': [], 'pickle': []}
+    rows = result = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        rows = get_query(FilterSpec(), args.yearfrom, args.yearto).all()
+        timings['SQL'].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        df = preprocess_data(pd.DataFrame([row._asdict() for row in rows]), years, SHOWN_COLUMNS)
+        prepared = time.perf_counter()
+        rollup_levels(df, SHOWN_COLUMNS, [], value_columns)
+        rolled = time.perf_counter()
+        timings['подготовка'].append(prepared - start)
+        timings['итоги'].append(rolled - prepared)
+
+        start = time.perf_counter()
+        result = get_data(rows, SHOWN_COLUMNS, [], args.yearfrom, args.yearto)
+        timings['вывод'].append(time.perf_counter() - start - (rolled - prepared) - timings['подготовка'][-1])
+
+        start = time.perf_counter()
+        pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        timings['pickle'].append(time.perf_counter() - start)
+    regions = {row.region for row in rows}
+    return len(rows), len(regions), {name: statistics.median(values) for name, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--yearfrom', type=int, default=2024)
+    parser.add_argument('--yearto', type=int, default=2036)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows, regions, timings = measure(args)
+    print(f"Строк запроса: {rows}, регионов: {regions}")
+    for name, seconds in timings.items():
+        print(f"{name:<12}{seconds * 1000:>10.0f} мс")
+    report = timings['подготовка'] + timings['итоги'] + timings['вывод']
+    print(f"{'отчет':<12}{report * 1000:>10.0f} мс (без SQL)")
+
+
+if __name__ == '__main__':
+    main()
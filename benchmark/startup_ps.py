@@ -0,0 +1,92 @@
+"""
+    Время до первого ответа нового процесса приложения (как у процесса mod_wsgi после запуска).
+
+    Каждый запуск - отдельный процесс, который импортирует Progn_Spros_app и выполняет через тестовый
+    клиент Flask запросы --path: первый (холодный) и второй. Для каждого варианта выводятся медианы:
+        - запуск интерпретатора и импорт приложения (в том числе проверка схемы, если она при старте);
+        - первый и второй ответ по каждому пути;
+        - время от запуска процесса до первого ответа.
+    Варианты: проверка схемы при первом запросе (по умолчанию) и при старте (SCHEMA_CHECK_ON_STARTUP).
+
+    Запуск:
+        python -m progSpros_back.benchmark.startup_ps --path /swagger.json --path /Years/years --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Код дочернего процесса: время импорта приложения и ответов (с момента запуска интерпретатора - по часам родителя)
+CHILD_CODE = '''
+import json, time
+start = time.perf_counter()
+from progSpros_back.config_ps import Config
+Config.SCHEMA_CHECK_ON_STARTUP = {startup_check!r}
+from progSpros_back.Progn_Spros_app import app
+imported = time.perf_counter()
+client = app.test_client()
+responses = []
+for path in {paths!r}:
+    for attempt in (1, 2):
+        request_start = time.perf_counter()
+        response = client.get(path)
+        response.get_data()
+        responses.append([path, attempt, response.status_code, time.perf_counter() - request_start])
+print(json.dumps({{'import': imported - start, 'responses': responses, 'finished_at': time.time()}}))
+'''
+
+
+def run_child(paths, startup_check):
+    code = CHILD_CODE.format(paths=tuple(paths), startup_check=startup_check)
+    started_at = time.time()
+    completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=os.environ.copy())
+    if completed.returncode != 0:
+        raise RuntimeError(f"Процесс завершился с ошибкой:\n{completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    # Время до первого ответа: от запуска процесса до конца первого запроса
+    responses_time = sum(seconds for *_, seconds in result['responses'])
+    first = result['responses'][0][3]
+    result['first_response'] = result['finished_at'] - started_at - responses_time + first
+    return result
+
+
+def measure(paths, startup_check, repeat):
+    runs = [run_child(paths, startup_check) for _ in range(repeat)]
+    responses = {}
+    for index, (path, attempt, status, _) in enumerate(runs[-1]['responses']):
+        responses[(path, attempt)] = {
+            'status': status,
+            'seconds': statistics.median(run['responses'][index][3] for run in runs),
+        }
+    return {
+        'import': statistics.median(run['import'] for run in runs),
+        'first_response': statistics.median(run['first_response'] for run in runs),
+        'responses': responses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', action='append', help='Путь запроса (можно несколько); по умолчанию /swagger.json')
+    parser.add_argument('--repeat', type=int, default=5, help='Процессов на вариант')
+    args = parser.parse_args()
+    paths = args.path or ['/swagger.json']
+
+    variants = {
+        'при первом запросе': measure(paths, False, args.repeat),
+        'при старте': measure(paths, True, args.repeat),
+    }
+
+    for name, result in variants.items():
+        print(f"\nПроверка схемы {name}: импорт {result['import'] * 1000:.0f} мс, "
+              f"до первого ответа {result['first_response'] * 1000:.0f} мс")
+        for (path, attempt), response in result['responses'].items():
+            print(f"    {path:<40}{'первый' if attempt == 1 else 'второй':>8}{response['status']:>5}"
+                  f"{response['seconds'] * 1000:>10.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
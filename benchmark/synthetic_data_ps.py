@@ -0,0 +1,303 @@
+"""
+    Синтетические данные прогноза для бенчмарков.
+
+    Заполняет справочники из model/db_models_ps.py, tab_progn_spr_gaz_d314 и tab_prirost_d314
+    с кардинальностями, близкими к рабочим: 8 ФО, ~90 регионов, ~20 отраслей, тысячи потребителей,
+    годы прогноза и несколько дат загрузки. Данные детерминированы (--seed).
+
+    Проект - потребитель в регионе и отрасли с вероятностью реализации, договором, ТУ и производителем.
+    У проекта --objects объектов (очередей строительства): они отличаются статусом потребителя, годом
+    начала газификации, готовностью ПГ и объемом, поэтому в агрегате прогноза (измерения проекта)
+    строки объектов одного проекта сворачиваются в одну, как в рабочих данных.
+    Строка прогноза - значение объекта за год и дату загрузки, поэтому объектов
+    --rows / (лет * дат загрузки). На каждый объект и дату загрузки приходится одна строка tab_prirost_d314.
+
+    Таблицы данных очищаются перед загрузкой. В PostgreSQL строки загружаются через COPY,
+    в остальных БД - пакетными INSERT. После загрузки пересобирается агрегат прогноза.
+
+    Запуск (БД - PROGSPROS_DATABASE_URI или Config.SQLALCHEMY_DATABASE_URI):
+        PROGSPROS_DATABASE_URI=sqlite:////tmp/progspros_bench.db \\
+            python -m progSpros_back.benchmark.synthetic_data_ps --rows 100000 --dates 3
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+from sqlalchemy import delete, insert
+
+from progSpros_back.model.db_models_ps import Base, PSDATA, Prirost, PSCube, PSCubeBuild, LoadGeneration, FedState, Regions, \
+    Otrasl, Contragent, GroupPost, VersProgn, Proizv, StPotr, StGaz, Dogovor, PG, TU, Infr
+from progSpros_back.model.mappings_ps import otr_mapping, vers_mapping, grpost_mapping, fo_mapping, region_mapping
+
+# Вероятность реализации: полное имя в формате, который ожидает отчет ots_pr_spr
+VERS_FULL_NAMES = {
+    0: '0 - действующие потребители',
+    1: '1 - высокая вероятность реализации проекта',
+    2: '2 - средняя вероятность реализации проекта',
+    3: '3 - низкая вероятность реализации проекта',
+}
+
+# Доли проектов по вероятности реализации
+VERS_WEIGHTS = (0.5, 0.2, 0.15, 0.15)
+
+# Потребители-итоги, для которых отчет не выводит отрасль
+SPECIAL_CONTRAGENTS = ('Действующие потребители', 'Прочие потребители')
+
+PROIZV_NAMES = ('ПАО "Газпром"', 'НОВАТЭК', 'Роснефть', 'Прочие производители')
+STPOTR_NAMES = ('Действующий', 'Новый', 'Перспективный')
+PG_NAMES = ('Готов', 'Строится', 'Проект')
+
+BATCH_SIZE = 10000
+
+
+def reference_rows(args, rnd):
+    """Строки справочников: модель → список словарей."""
+    fo_ids = sorted(fo_mapping)
+    rows = {
+        FedState: [
+            {'id': id_, 'name': name, 'ord': index, 'short_name': name.split()[0][:3] + 'ФО'}
+            for index, (id_, name) in enumerate(sorted(fo_mapping.items()))
+        ],
+        # Регионы распределяются по ФО равномерно: реальная привязка для нагрузки не важна
+        Regions: [
+            {'id': id_, 'name': name, 'ord': index, 'short_name': name[:12],
+             'tab_fo_d314_ids': fo_ids[index % len(fo_ids)], 'mid_name': name, 'real_name': name}
+            for index, (id_, name) in enumerate(sorted(region_mapping.items()))
+        ],
+        Otrasl: [
+            {'id': id_, 'name': name, 'ord': index, 'full_name': name}
+            for index, (id_, name) in enumerate(sorted(otr_mapping.items()))
+        ],
+        Contragent: [
+            {'id': index + 1, 'name': name, 'inn': f'{rnd.randrange(10 ** 9, 10 ** 10)}'}
+            for index, name in enumerate(
+                SPECIAL_CONTRAGENTS + tuple(f'Потребитель {number}' for number in range(1, args.contragents + 1))
+            )
+        ],
+        GroupPost: [{'id': id_, 'name': name} for id_, name in sorted(grpost_mapping.items())],
+        VersProgn: [
+            {'id': id_, 'name': name, 'full_name': VERS_FULL_NAMES[id_], 'short_name': name}
+            for id_, name in sorted(vers_mapping.items())
+        ],
+        Proizv: [{'id': index + 1, 'name': name, 'short_name': name} for index, name in enumerate(PROIZV_NAMES)],
+        StPotr: [{'id': index + 1, 'name': name} for index, name in enumerate(STPOTR_NAMES)],
+        StGaz: [
+            {'id': index + 1, 'name': str(year)} for index, year in enumerate(range(args.yearfrom, args.yearto + 1))
+        ],
+        PG: [{'id': index + 1, 'name': name} for index, name in enumerate(PG_NAMES)],
+    }
+    # Признаки да/нет хранятся как V/X
+    for model in (Dogovor, TU, Infr):
+        rows[model] = [{'id': 1, 'name': 'V'}, {'id': 2, 'name': 'X'}]
+    return rows
+
+
+def load_dates(args):
+    """Даты загрузки: последняя - --last-date, предыдущие - с шагом в три месяца."""
+    last = datetime.strptime(args.last_date, '%Y-%m-%d')
+    dates = []
+    for step in range(args.dates):
+        month = last.month - 3 * step
+        year = last.year + (month - 1) // 12
+        dates.append(last.replace(year=year, month=(month - 1) % 12 + 1))
+    return sorted(dates)
+
+
+def projects(args, references, rnd):
+    """Проекты прогноза: словари ключей справочников и объекты проекта (ключи и объем объекта)."""
+    regions = references[Regions]
+    otrasl_ids = [row['id'] for row in references[Otrasl]]
+    contragent_ids = [row['id'] for row in references[Contragent]]
+    grpost_ids = [row['id'] for row in references[GroupPost]]
+    vers_ids = [row['id'] for row in references[VersProgn]]
+    proizv_count = len(references[Proizv])
+    pg_count = len(references[PG])
+    years = args.yearto - args.yearfrom + 1
+    objects = max(1, args.rows // (years * args.dates))
+    while objects > 0:
+        region = rnd.choice(regions)
+        vers = rnd.choices(vers_ids, weights=VERS_WEIGHTS[:len(vers_ids)])[0]
+        count = min(objects, rnd.randint(1, 2 * args.objects - 1))
+        objects -= count
+        yield {
+            'tab_fo_d314_ids': region['tab_fo_d314_ids'],
+            'tab_region_d314_ids': region['id'],
+            'tab_otrasl_economy_d314_ids': rnd.choice(otrasl_ids),
+            'tab_contragent_d314_ids': rnd.choice(contragent_ids),
+            'tab_group_post_d314_ids': rnd.choice(grpost_ids),
+            'tab_dogovor_visual_d314_ids': rnd.randint(1, 2),
+            'tab_tu_visual_d314_ids': rnd.randint(1, 2),
+            'tab_infr_d314_ids': rnd.randint(1, 2),
+            'tab_ver_real_pr_d314_ids': vers,
+            'tab_proizvoditel_d314_ids': rnd.randint(1, proizv_count),
+            'objects': [
+                {
+                    'tab_status_potreb_d314_ids': rnd.randint(1, len(STPOTR_NAMES)),
+                    'tab_start_gaz_d314_ids': rnd.randint(1, years),
+                    'tab_pg_visual_d314_ids': rnd.randint(1, pg_count),
+                    # Объем в млн м3: много мелких объектов и редкие крупные
+                    'base': rnd.lognormvariate(1.0, 1.6),
+                    'growth': rnd.uniform(-0.02, 0.15),
+                    'start': rnd.randint(0, years - 1) if vers else 0,
+                }
+                for _ in range(count)
+            ],
+        }
+
+
+def data_rows(args, references, rnd):
+    """Пакеты строк (tab_progn_spr_gaz_d314, tab_prirost_d314) примерно по BATCH_SIZE строк прогноза."""
+    dates = load_dates(args)
+    project_keys = ('tab_fo_d314_ids', 'tab_region_d314_ids', 'tab_otrasl_economy_d314_ids', 'tab_contragent_d314_ids',
+                    'tab_group_post_d314_ids', 'tab_dogovor_visual_d314_ids', 'tab_tu_visual_d314_ids',
+                    'tab_infr_d314_ids', 'tab_ver_real_pr_d314_ids')
+    object_keys = ('tab_status_potreb_d314_ids', 'tab_start_gaz_d314_ids')
+    psdata_id = prirost_id = 0
+    psdata, prirost = [], []
+    for project in projects(args, references, rnd):
+        for item in project['objects']:
+            key = {name: project[name] for name in project_keys}
+            key.update((name, item[name]) for name in object_keys)
+            for date_index, date in enumerate(dates):
+                # Каждая следующая загрузка немного уточняет прогноз
+                revision = 1 + 0.03 * date_index * rnd.uniform(-1, 1)
+                first = last = Decimal(0)
+                for offset, year in enumerate(range(args.yearfrom, args.yearto + 1)):
+                    if offset < item['start']:
+                        value = 0.0
+                    else:
+                        value = item['base'] * revision * (1 + item['growth']) ** (offset - item['start'])
+                    summ = Decimal(f'{value:.4f}')
+                    if offset == 0:
+                        first = summ
+                    last = summ
+                    psdata_id += 1
+                    psdata.append({
+                        'id': psdata_id, **key,
+                        'otl_usl': rnd.randint(1, 2), 'takeorpay': rnd.randint(1, 2), 'tu308': rnd.randint(1, 2),
+                        'gen_schema': rnd.randint(1, 2), 'poruch': None,
+                        'tab_pg_visual_d314_ids': item['tab_pg_visual_d314_ids'],
+                        'year': year, 'summ': summ, 'post': key['tab_group_post_d314_ids'],
+                        'tab_proizvoditel_d314_ids': project['tab_proizvoditel_d314_ids'], 'date': date,
+                    })
+                prirost_id += 1
+                prirost.append({
+                    'id': prirost_id, **key, 'summ': last - first,
+                    'yearfrom': args.yearfrom, 'yearto': args.yearto, 'date': date,
+                })
+        if len(psdata) >= BATCH_SIZE:
+            yield psdata, prirost
+            psdata, prirost = [], []
+    if psdata:
+        yield psdata, prirost
+
+
+def copy_rows(connection, model, rows):
+    """Загружает строки в PostgreSQL через COPY ... FROM STDIN (CSV)."""
+    columns = [column.name for column in model.__table__.columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if row.get(column) is None else row[column] for column in columns])
+    buffer.seek(0)
+    table = f'{model.__table__.schema}.{model.__tablename__}'
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def insert_rows(connection, model, rows):
+    if not rows:
+        return
+    if connection.dialect.name == 'postgresql':
+        copy_rows(connection, model, rows)
+    else:
+        for start in range(0, len(rows), BATCH_SIZE):
+            connection.execute(insert(model), rows[start:start + BATCH_SIZE])
+
+
+def generate(engine, args):
+    """
+        Пересоздает синтетические данные в БД движка engine.
+
+        Возвращается:
+            dict: модель → количество загруженных строк.
+    """
+    rnd = random.Random(args.seed)
+    Base.metadata.create_all(bind=engine)
+    references = reference_rows(args, rnd)
+    counts = {}
+
+    with engine.begin() as connection:
+        for model in (PSCube, PSCubeBuild, PSDATA, Prirost, LoadGeneration, *references):
+            connection.execute(delete(model))
+        for model, rows in references.items():
+            insert_rows(connection, model, rows)
+            counts[model] = len(rows)
+
+    counts[PSDATA] = counts[Prirost] = 0
+    batches = data_rows(args, references, rnd)
+    while True:
+        # Несколько пакетов в одной транзакции: меньше фиксаций, но без одной огромной транзакции
+        chunk = list(islice(batches, 10))
+        if not chunk:
+            break
+        with engine.begin() as connection:
+            for psdata, prirost in chunk:
+                insert_rows(connection, PSDATA, psdata)
+                insert_rows(connection, Prirost, prirost)
+                counts[PSDATA] += len(psdata)
+                counts[Prirost] += len(prirost)
+        print(f"  tab_progn_spr_gaz_d314: {counts[PSDATA]} строк", flush=True)
+    return counts
+
+
+def populate(args):
+    """
+        Пересоздает данные в БД приложения, увеличивает номер загрузки и пересобирает агрегат прогноза.
+
+        Возвращается:
+            dict: модель → количество строк.
+    """
+    # Адрес БД читается при импорте database_ps: импорт здесь позволяет задать PROGSPROS_DATABASE_URI до него
+    from progSpros_back.database_ps import engine
+    from progSpros_back.functions.data_version_ps import bump_data_version
+    from progSpros_back.functions.forecast_cube_ps import refresh_forecast_cube
+
+    counts = generate(engine, args)
+    bump_data_version()
+    counts[PSCube] = refresh_forecast_cube()
+    return counts
+
+
+def add_arguments(parser):
+    parser.add_argument('--rows', type=float, default=1e5, help='Строк tab_progn_spr_gaz_d314 (1e5-1e8)')
+    parser.add_argument('--contragents', type=int, default=5000, help='Потребителей в справочнике')
+    parser.add_argument('--yearfrom', type=int, default=2023)
+    parser.add_argument('--yearto', type=int, default=2036)
+    parser.add_argument('--dates', type=int, default=3, help='Дат загрузки')
+    parser.add_argument('--objects', type=int, default=6, help='Объектов в проекте (в среднем)')
+    parser.add_argument('--last-date', default='2024-06-01', help='Последняя дата загрузки (ГГГГ-ММ-ДД)')
+    parser.add_argument('--seed', type=int, default=314)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+    args.rows = int(args.rows)
+
+    start = time.perf_counter()
+    counts = populate(args)
+    for model, count in counts.items():
+        print(f"{model.__tablename__:<28}{count:>12}")
+    print(f"Загрузка: {time.perf_counter() - start:.1f} с; даты загрузки: "
+          f"{', '.join(date.strftime('%Y-%m-%d') for date in load_dates(args))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,22 @@
+import os
+
 from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy import create_engine
 from config_ps import Config
 
+# Адрес БД можно переопределить переменной окружения (например, для стенда бенчмарков)
+SQLALCHEMY_DATABASE_URI = os.environ.get('PROGSPROS_DATABASE_URI', Config.SQLALCHEMY_DATABASE_URI)
+
+
+def engine_options(uri):
+    # SQLite (локальный стенд) не поддерживает схемы: таблицы схемы public создаются в основной БД
+    if uri.startswith('sqlite'):
+        return {'execution_options': {'schema_translate_map': {'public': None}}}
+    return {'pool_size': 30}
+
+
 # Создание движка SQLAlchemy
-engine = create_engine(Config.SQLALCHEMY_DATABASE_URI, pool_size=30)
+engine = create_engine(SQLALCHEMY_DATABASE_URI, **engine_options(SQLALCHEMY_DATABASE_URI))
 db = scoped_session(sessionmaker(bind=engine))
 
 from flask_caching import Cache
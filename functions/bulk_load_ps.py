@@ -0,0 +1,296 @@
+import csv
+import io
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import date as date_type, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, Numeric, String, Table, delete, insert, select
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+from progSpros_back.functions.data_version_ps import bump_data_version, data_version
+from progSpros_back.functions.forecast_cube_ps import invalidate_forecast_cube, refresh_forecast_cube
+from progSpros_back.functions.prirost_builder_ps import build_prirost, invalidate_prirost
+from progSpros_back.functions.utility_functions_ps import to_date
+from progSpros_back.model.db_models_ps import PSDATA, Prirost
+
+logger = logging.getLogger(__name__)
+
+# Режимы загрузки: replace - строки дат загрузки из файла заменяются, append - добавляются
+MODES = ('replace', 'append')
+
+# Сколько ошибок проверки собирается до остановки загрузки
+MAX_ERRORS = 20
+
+STAGING_TABLE = 'stage_progn_spr_gaz_d314'
+
+LoadResult = namedtuple('LoadResult', 'rows dates seconds')
+
+
+def _to_int(value):
+    if isinstance(value, str):
+        # Быстрый путь для CSV: строка с целым числом
+        try:
+            return int(value)
+        except ValueError:
+            value = value.strip().replace(',', '.')
+    if isinstance(value, bool):
+        raise ValueError(f'{value!r} не целое число')
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f'{value!r} не целое число')
+        return int(value)
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'{value!r} не целое число')
+    if number != number.to_integral_value():
+        raise ValueError(f'{value!r} не целое число')
+    return int(number)
+
+
+def _to_decimal(value):
+    if isinstance(value, str):
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            value = value.strip().replace(' ', '').replace(',', '.')
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError):
+        raise ValueError(f'{value!r} не число')
+
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date_type):
+        return datetime(value.year, value.month, value.day)
+    text = str(value).strip()
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return to_date(text)
+
+
+def _to_string(value):
+    return str(value)
+
+
+def converter(column):
+    """Функция приведения значения из файла к типу колонки модели."""
+    if isinstance(column.type, Integer):
+        return _to_int
+    if isinstance(column.type, Numeric):
+        return _to_decimal
+    if isinstance(column.type, DateTime):
+        return _to_datetime
+    if isinstance(column.type, String):
+        return _to_string
+    raise ValueError(f'Тип колонки {column.name} не поддерживается загрузчиком: {column.type}')
+
+
+def read_rows(path, sheet=None, delimiter=','):
+    """
+        Читает файл построчно: первая строка - заголовок. Excel (.xlsx, .xlsm) читается в режиме
+        read_only, CSV - модулем csv, поэтому в памяти одновременно только текущая строка.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            worksheet = workbook[sheet] if sheet else workbook.active
+            yield from worksheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    elif extension in ('.csv', '.txt'):
+        with open(path, newline='', encoding='utf-8-sig') as file:
+            yield from csv.reader(file, delimiter=delimiter)
+    else:
+        raise ValueError(f'Формат файла {extension} не поддерживается: нужен .xlsx, .xlsm или .csv')
+
+
+class RowValidator:
+    """
+        Проверка строк файла по модели PSDATA: колонки заголовка должны быть колонками модели,
+        значения приводятся к типам колонок. Пустые значения - NULL; date обязательна.
+    """
+
+    def __init__(self, header, date=None):
+        names = [str(name).strip() if name is not None else '' for name in header]
+        columns = PSDATA.__table__.columns
+        unknown = [name for name in names if name and name not in columns]
+        if unknown:
+            raise ValueError(f'Колонки отсутствуют в {PSDATA.__tablename__}: {", ".join(unknown)}')
+        duplicates = sorted({name for name in names if name and names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f'Колонки повторяются: {", ".join(duplicates)}')
+
+        # Позиция в строке файла, имя колонки и приведение типа (пустые колонки заголовка пропускаются).
+        # Если дата загрузки указана явно, колонка date файла не читается
+        self.fields = [
+            (index, name, converter(columns[name])) for index, name in enumerate(names)
+            if name and not (date is not None and name == 'date')
+        ]
+        self.date = date
+        self.columns = [name for _, name, _ in self.fields] + (['date'] if date is not None else [])
+        if 'date' not in self.columns:
+            raise ValueError('В файле нет колонки date: укажите дату загрузки')
+        self.date_index = self.columns.index('date')
+        self.errors = []
+
+    def convert(self, line, row):
+        """Возвращает кортеж значений в порядке self.columns или None, если строка с ошибкой."""
+        values = []
+        for index, name, convert in self.fields:
+            value = row[index] if index < len(row) else None
+            if value is None or value == '' or (isinstance(value, str) and value.isspace()):
+                values.append(None)
+                continue
+            try:
+                values.append(convert(value))
+            except (ValueError, ArithmeticError) as e:
+                self.errors.append(f'строка {line}, колонка {name}: {e}')
+                return None
+        if self.date is not None:
+            values.append(self.date)
+        if values[self.date_index] is None:
+            self.errors.append(f'строка {line}: не указана date')
+            return None
+        return tuple(values)
+
+
+def chunks(rows, size):
+    """Разбивает поток строк на списки по size строк."""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def staging_table(columns):
+    """Временная таблица загрузки с колонками файла (типы - как в PSDATA, без ограничений и индексов)."""
+    model_columns = PSDATA.__table__.columns
+    return Table(
+        STAGING_TABLE, MetaData(),
+        *[Column(name, model_columns[name].type) for name in columns],
+        prefixes=['TEMPORARY'],
+    )
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def copy_chunk(connection, table, columns, chunk):
+    """Загружает пакет строк во временную таблицу: COPY в PostgreSQL, пакетный INSERT в остальных БД."""
+    if connection.dialect.name == 'postgresql':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in chunk:
+            writer.writerow([_csv_value(value) for value in values])
+        buffer.seek(0)
+        statement = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        with connection.connection.cursor() as cursor:
+            if hasattr(cursor, 'copy_expert'):  # psycopg2
+                cursor.copy_expert(statement, buffer)
+            else:  # psycopg 3
+                with cursor.copy(statement) as copy:
+                    copy.write(buffer.getvalue())
+    else:
+        connection.execute(insert(table), [dict(zip(columns, values)) for values in chunk])
+
+
+def load_forecast(path, mode='replace', date=None, sheet=None, delimiter=',', chunk_size=None):
+    """
+        Загружает tab_progn_spr_gaz_d314 из Excel или CSV.
+
+        Файл читается потоком и пакетами по chunk_size строк загружается во временную таблицу
+        (COPY в PostgreSQL). Затем в одной транзакции строки дат загрузки из файла удаляются
+        (mode='replace') и переносятся из временной таблицы, а строки tab_prirost_d314 за эти даты
+        удаляются. До фиксации транзакции запросы видят прежние данные, при ошибке таблицы не меняются.
+        Индексы таблицы не удаляются.
+
+        После загрузки увеличивается номер загрузки, пересобирается агрегат прогноза и строится
+        tab_prirost_d314 за загруженные даты (если не выключено PRIROST_BUILD_ON_LOAD).
+
+        Аргументы:
+            path (str): путь к файлу .xlsx, .xlsm или .csv; первая строка - имена колонок tab_progn_spr_gaz_d314.
+            mode (str): 'replace' или 'append'.
+            date (datetime, необязательно): дата загрузки для всех строк (вместо колонки date файла).
+            sheet (str, необязательно): лист Excel; по умолчанию - активный.
+            delimiter (str): разделитель CSV.
+            chunk_size (int, необязательно): строк в пакете (по умолчанию BULK_LOAD_CHUNK_SIZE).
+
+        Возвращается:
+            LoadResult: количество строк, даты загрузки и время загрузки в секундах (без агрегата и прироста).
+    """
+    if mode not in MODES:
+        raise ValueError(f'Режим загрузки {mode} не поддерживается: {", ".join(MODES)}')
+    chunk_size = chunk_size or getattr(Config, 'BULK_LOAD_CHUNK_SIZE', 20000)
+    start = time.perf_counter()
+
+    rows = read_rows(path, sheet, delimiter)
+    header = next(rows, None)
+    if header is None:
+        raise ValueError(f'Файл {path} пуст')
+    validator = RowValidator(header, date)
+    columns = validator.columns
+    table = staging_table(columns)
+
+    loaded = 0
+    dates = set()
+    with engine.begin() as connection:
+        # Временная таблица создается в транзакции загрузки: при ошибке она удаляется откатом
+        table.create(bind=connection)
+        # Номер строки файла (заголовок - строка 1) нужен для сообщений об ошибках
+        for chunk in chunks(enumerate(rows, start=2), chunk_size):
+            values = [validator.convert(line, row) for line, row in chunk if any(
+                value is not None and value != '' for value in row
+            )]
+            if validator.errors:
+                if len(validator.errors) >= MAX_ERRORS:
+                    break
+                continue
+            copy_chunk(connection, table, columns, values)
+            dates.update(value[validator.date_index] for value in values)
+            loaded += len(values)
+            logger.info(f"{PSDATA.__tablename__}: прочитано {loaded} строк")
+
+        if validator.errors:
+            raise ValueError('Файл не загружен, ошибки в данных:\n' + '\n'.join(validator.errors[:MAX_ERRORS]))
+
+        if mode == 'replace' and dates:
+            connection.execute(delete(PSDATA).where(PSDATA.date.in_(sorted(dates))))
+        connection.execute(insert(PSDATA).from_select(columns, select(*table.columns)))
+        invalidate_prirost(connection, dates)
+        invalidate_forecast_cube(connection, dates)
+        bump_data_version(PSDATA, Prirost, connection=connection)
+        table.drop(bind=connection)
+
+    seconds = time.perf_counter() - start
+    logger.info(f"{PSDATA.__tablename__}: загружено {loaded} строк за {seconds:.1f} с ({mode})")
+
+    # Номер загрузки сброшен в bump_data_version до фиксации транзакции - версия читается заново
+    data_version.invalidate()
+    for load_date in sorted(dates):
+        refresh_forecast_cube(load_date)
+    if getattr(Config, 'PRIROST_BUILD_ON_LOAD', True):
+        build_prirost(sorted(dates))
+    return LoadResult(loaded, sorted(dates), seconds)
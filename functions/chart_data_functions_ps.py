@@ -1,9 +1,10 @@
 import re
+from collections import namedtuple
 
 from sqlalchemy import and_
 from sqlalchemy.orm.attributes import InstrumentedAttribute
-from sqlalchemy.orm.exc import NoResultFound
 from progSpros_back.config_ps import format_strings
+from progSpros_back.functions.reference_cache_ps import reference_cache, count_reference_lookups
 from flask import current_app as app
 
 """
@@ -98,9 +99,66 @@ def generate_chart_data_otrasl(query, title, format_string, version_mapping,
  ================================================== ФИЛЬТРЫ =================================================
  
 """
+def rollup_rows(rows, columns, order=None, value='summ'):
+    """
+        Группирует в памяти строки запроса на уровне идентификаторов до уровня справочников.
+
+        Результат совпадает с запросом, который соединяет таблицу данных со справочниками и группирует
+        по их name: строки с неизвестным или пустым id отбрасываются, порядок - как ORDER BY name в БД.
+
+        Аргументы:
+            rows (list): строки (id..., сумма).
+            columns (list): кортежи (метка, индекс id в строке, модель справочника).
+            order (list, необязательно): метки в порядке сортировки, по умолчанию - порядок columns.
+            value (str): метка суммы.
+
+        Возвращается:
+            list: строки с полями меток и суммы.
+    """
+    names = [reference_cache.ranked_names(model) for label, index, model in columns]
+    totals = {}
+    for row in rows:
+        key = []
+        for (label, index, model), ranked in zip(columns, names):
+            entry = ranked.get(row[index])
+            if entry is None:
+                break
+            key.append(entry)
+        else:
+            key = tuple(key)
+            summ = row[-1]
+            if key not in totals or totals[key] is None:
+                totals[key] = summ
+            elif summ is not None:
+                totals[key] += summ
+
+    labels = [label for label, index, model in columns]
+    positions = [labels.index(label) for label in (order or labels)]
+    row_class = namedtuple('Row', labels + [value])
+    return [
+        row_class(*(name for rank, name in key), total)
+        for key, total in sorted(totals.items(), key=lambda item: [item[0][position][0] for position in positions])
+    ]
+
+def append_unique(items, item, seen):
+    """
+        Добавляет словарь item в список items, если такого же словаря в нем еще нет.
+
+        Аргументы:
+            items (list): список словарей.
+            item (dict): добавляемый словарь (значения должны быть хешируемыми).
+            seen (set): ключи уже добавленных словарей - заменяет поиск `item not in items`.
+    """
+    key = tuple(item.items())
+    if key not in seen:
+        seen.add(key)
+        items.append(item)
+
 def get_related_ids(session, related_model, value):
     """
         Извлекает связанные идентификаторы из связанной модели на основе предоставленных значений.
+        Имена ищутся в индексе name → id кэша справочников, к БД запрос выполняется только
+        для значений, которых нет в кэше.
 
         Аргументы:
             session: сессия SQLAlchemy.
@@ -110,17 +168,30 @@ def get_related_ids(session, related_model, value):
         Возвращается:
             Список связанных идентификаторов.
     """
-    try:
-        if isinstance(value, list):
-            # Выполнить запрос и получить результаты
-            related_ids = session.query(related_model.id).filter(related_model.name.in_(value)).all()
-            return [rid[0] for rid in related_ids]
+    values = value if isinstance(value, list) else [value]
+
+    # Поиск в кэше справочников
+    index = reference_cache.all_ids(related_model)
+    related_ids = []
+    missing = []
+    for name in values:
+        related_id = index.get(name)
+        if related_id is None:
+            missing.append(name)
         else:
-            # Выполнить запрос и получить результаты
-            related_id = session.query(related_model.id).filter_by(name=value).one()[0]
-            return [related_id]
-    except NoResultFound:
-        return []
+            related_ids.append(related_id)
+    count_reference_lookups('memory', len(values) - len(missing))
+
+    if missing:
+        # Выполнить запрос только для отсутствующих в кэше значений
+        rows = session.query(related_model.id).filter(related_model.name.in_(missing)).all()
+        count_reference_lookups('db', len(missing))
+        if rows:
+            # Справочник изменился после последней проверки - перечитать при следующем обращении
+            reference_cache.expire()
+        related_ids.extend(row[0] for row in rows)
+
+    return related_ids
 
 def apply_filter_conditions(model, param, value, models_dict, session):
     """
@@ -199,19 +270,18 @@ def get_year_range(query, years_range=None):
         app.logger.error(f"При создании графических данных произошла ошибка: {e}")
         raise
 
-def apply_dynamic_filters(query, model, filter_params, session, models_dict):
+def build_filter_conditions(model, filter_params, session, models_dict):
     """
-    Динамически применяет фильтры к запросу SQLAlchemy на основе предоставленных параметров фильтра.
+    Создает условия фильтрации SQLAlchemy на основе предоставленных параметров фильтра.
 
         Аргументы:
-        query: объект запроса SQLAlchemy, к которому нужно применить фильтры.
         model: класс модели SQLAlchemy для фильтрации.
         filter_params: Словарь параметров фильтра из запроса.
         session: сессия SQLAlchemy.
         models_dict: Словарь, отображающий имена таблиц в классы моделей.
 
         Возвращается:
-            Отфильтрованный запрос SQLAlchemy
+            Список условий фильтрации
     """
     filter_conditions = []
 
@@ -245,6 +315,24 @@ def apply_dynamic_filters(query, model, filter_params, session, models_dict):
             # Применить условия фильтрации для каждого параметра
             filter_conditions.extend(apply_filter_conditions(model, param, value, models_dict, session))
 
+    return filter_conditions
+
+def apply_dynamic_filters(query, model, filter_params, session, models_dict):
+    """
+    Динамически применяет фильтры к запросу SQLAlchemy на основе предоставленных параметров фильтра.
+
+        Аргументы:
+        query: объект запроса SQLAlchemy, к которому нужно применить фильтры.
+        model: класс модели SQLAlchemy для фильтрации.
+        filter_params: Словарь параметров фильтра из запроса.
+        session: сессия SQLAlchemy.
+        models_dict: Словарь, отображающий имена таблиц в классы моделей.
+
+        Возвращается:
+            Отфильтрованный запрос SQLAlchemy
+    """
+    filter_conditions = build_filter_conditions(model, filter_params, session, models_dict)
+
     if filter_conditions:
         # Применить все условия фильтрации к запросу
         query = query.filter(and_(*filter_conditions))
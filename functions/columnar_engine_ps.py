@@ -0,0 +1,303 @@
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+from progSpros_back.functions.data_version_ps import data_version
+from progSpros_back.functions.forecast_cube_ps import CUBE_DIMENSIONS
+from progSpros_back.functions.reference_cache_ps import reference_cache
+from progSpros_back.model.db_models_ps import PSDATA, Otrasl, Contragent, VersProgn, FedState
+
+try:
+    import numpy as np
+except ImportError:  # Колоночный движок необязателен: без NumPy используется SQL
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Колонки снимка: измерения агрегата прогноза без даты (снимок строится на одну дату загрузки)
+SNAPSHOT_COLUMNS = tuple(name for name in CUBE_DIMENSIONS if name != 'date')
+
+# Максимальный масштаб summ, при котором суммы считаются точно в int64
+MAX_SCALE = 9
+
+# Описание запроса графика: колонки группировки (метка, колонка снимка, справочник),
+# метка суммы, годы и порядок строк ('-value' - по убыванию суммы)
+ChartQuery = namedtuple('ChartQuery', 'columns value years order')
+
+CHART_QUERIES = {
+    'otrasl_query': ChartQuery(
+        (('year', 'year', None), ('otrasl', 'tab_otrasl_economy_d314_ids', Otrasl)),
+        'total_indicator', lambda yearfrom, yearto: (yearfrom, yearto), ('otrasl', 'year', '-value')),
+    'top_potr_query': ChartQuery(
+        (('year', 'year', None), ('vers', 'tab_ver_real_pr_d314_ids', VersProgn),
+         ('contragent', 'tab_contragent_d314_ids', Contragent)),
+        'total_indicator', lambda yearfrom, yearto: range(yearfrom, yearto + 1),
+        ('year', 'vers', '-value', 'contragent')),
+    'fo_otrasl_query': ChartQuery(
+        (('fo', 'tab_fo_d314_ids', FedState), ('otrasl', 'tab_otrasl_economy_d314_ids', Otrasl)),
+        'total_indicator', lambda yearfrom, yearto: (yearto,), ('fo', '-value', 'otrasl')),
+    'fo_potr_query': ChartQuery(
+        (('fo', 'tab_fo_d314_ids', FedState), ('potr', 'tab_contragent_d314_ids', Contragent)),
+        'total_indicator', lambda yearfrom, yearto: (yearto,), ('fo', '-value', 'potr')),
+}
+
+
+class Snapshot:
+    """
+        Снимок tab_progn_spr_gaz_d314 за дату загрузки в массивах NumPy.
+
+        Измерения хранятся как коды int32 (NULL → -1), summ - как целые int64 в единицах
+        10^-scale, поэтому суммы совпадают с SUM(numeric) в БД точно.
+    """
+
+    def __init__(self, date):
+        self.date = date
+        statement = select(*(getattr(PSDATA, name) for name in SNAPSHOT_COLUMNS), PSDATA.summ).where(
+            PSDATA.date == date
+        )
+        with engine.connect() as connection:
+            rows = connection.execute(statement).all()
+
+        self.size = len(rows)
+        self.columns = {
+            name: np.fromiter((-1 if row[i] is None else row[i] for row in rows), dtype=np.int32, count=self.size)
+            for i, name in enumerate(SNAPSHOT_COLUMNS)
+        }
+
+        values = [row[-1] for row in rows]
+        self.scale = max([-Decimal(value).as_tuple().exponent for value in values if value is not None] + [0])
+        self.exact = self.scale <= MAX_SCALE
+        if self.exact:
+            units = [0 if value is None else int(Decimal(value).scaleb(self.scale)) for value in values]
+            # Сумма всех значений должна помещаться в int64
+            self.exact = sum(abs(unit) for unit in units) < 2 ** 62
+        self.units = np.array(units, dtype=np.int64) if self.exact else None
+        self.notnull = np.fromiter((value is not None for value in values), dtype=bool, count=self.size)
+
+    def mask(self, conditions, years):
+        """
+            Маска строк по условиям FilterSpec и годам. Возвращает None, если условие не поддерживается.
+        """
+        mask = np.isin(self.columns['year'], list(years))
+        for condition in conditions:
+            if not isinstance(condition, BinaryExpression) or not isinstance(condition.right, BindParameter):
+                return None
+            key = getattr(condition.left, 'key', None)
+            value = condition.right.effective_value
+            if condition.operator is operators.eq:
+                values = [value]
+            elif condition.operator is operators.in_op:
+                values = list(value)
+            else:
+                return None
+
+            if key == 'date':
+                if self.date not in values:
+                    mask &= False
+            elif key in self.columns:
+                try:
+                    codes = [int(str(v)) for v in values]
+                except ValueError:
+                    return None  # Значение не является целым id - условие вычисляет SQL
+                mask &= np.isin(self.columns[key], codes)
+            else:
+                return None
+        return mask
+
+    def group_sum(self, group_columns, mask):
+        """
+            Группирует отобранные строки по колонкам и суммирует summ.
+
+            Возвращается:
+                list: кортежи (коды колонок, сумма Decimal или None, если все summ в группе NULL).
+        """
+        if not mask.any():
+            return []
+        keys = np.stack([self.columns[name][mask] for name in group_columns], axis=1)
+        groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        sums = np.zeros(len(groups), dtype=np.int64)
+        np.add.at(sums, inverse, self.units[mask])
+        notnull = np.bincount(inverse, weights=self.notnull[mask], minlength=len(groups))
+
+        return [
+            (tuple(int(code) for code in group), Decimal(int(total)).scaleb(-self.scale) if count else None)
+            for group, total, count in zip(groups, sums, notnull)
+        ]
+
+
+class ColumnarEngine:
+    """
+        Вычисление запросов графиков (CHART_QUERIES) по снимку данных в памяти.
+
+        Снимки хранятся по (дата загрузки, версия данных) - при новой загрузке снимок строится
+        заново. Хранится не больше max_snapshots снимков (вместе со строящимися).
+    """
+
+    def __init__(self, max_snapshots=2):
+        self._max_snapshots = max_snapshots
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def snapshot(self, date):
+        """
+            Снимок за дату загрузки для текущей версии данных. Снимок строится вне блокировки:
+            в словаре хранится Future, и запросы за тот же ключ ждут его, не блокируя другие даты.
+        """
+        key = (date, data_version.token(PSDATA))
+        with self._lock:
+            future = self._snapshots.get(key)
+            build = future is None
+            if build:
+                future = Future()
+                self._snapshots[key] = future
+                while len(self._snapshots) > self._max_snapshots:
+                    self._snapshots.popitem(last=False)
+            else:
+                self._snapshots.move_to_end(key)
+
+        if build:
+            try:
+                future.set_result(Snapshot(date))
+            except BaseException as error:
+                with self._lock:
+                    if self._snapshots.get(key) is future:
+                        del self._snapshots[key]
+                future.set_exception(error)
+                raise
+        return future.result()
+
+    def id_rows(self, group_columns, conditions, date, years):
+        """
+            Строки (id колонок группировки..., сумма) для отобранных строк снимка, как при GROUP BY
+            по колонкам-идентификаторам. Возвращается None, если запрос не может быть вычислен в памяти.
+        """
+        snapshot = self.snapshot(date)
+        if not snapshot.exact:
+            return None
+        mask = snapshot.mask(conditions, years)
+        if mask is None:
+            return None
+        return [
+            tuple(None if code == -1 else code for code in codes) + (total,)
+            for codes, total in snapshot.group_sum(group_columns, mask)
+        ]
+
+    def rows(self, name, conditions, date, yearfrom, yearto):
+        """
+            Строки запроса графика name так же, как их возвращает SQL (группировка по name
+            справочников, соединения отбрасывают неизвестные id, тот же порядок).
+
+            Возвращается None, если запрос не может быть вычислен в памяти.
+        """
+        spec = CHART_QUERIES[name]
+        snapshot = self.snapshot(date)
+        if not snapshot.exact:
+            return None
+        mask = snapshot.mask(conditions, spec.years(yearfrom, yearto))
+        if mask is None:
+            return None
+
+        labels = [label for label, column, model in spec.columns]
+        names = [reference_cache.ranked_names(model) if model is not None else None
+                 for label, column, model in spec.columns]
+
+        totals = {}
+        for codes, total in snapshot.group_sum([column for label, column, model in spec.columns], mask):
+            key = []
+            for code, mapping in zip(codes, names):
+                if mapping is None:
+                    key.append((code, code))
+                elif code in mapping:
+                    key.append(mapping[code])
+                else:
+                    break  # Нет строки справочника - строка не проходит соединение
+            else:
+                key = tuple(key)
+                if key in totals and totals[key] is not None:
+                    totals[key] = totals[key] + total if total is not None else totals[key]
+                else:
+                    totals[key] = total
+
+        positions = {label: i for i, label in enumerate(labels)}
+
+        def sort_key(item):
+            key, total = item
+            result = []
+            for field in spec.order:
+                if field == '-value':
+                    # NULL первыми, как при ORDER BY ... DESC
+                    result.append((0, 0) if total is None else (1, -total))
+                else:
+                    result.append(key[positions[field]][0])
+            return result
+
+        row_class = namedtuple('Row', labels + [spec.value])
+        return [
+            row_class(*(sort_rank_name[1] for sort_rank_name in key), total)
+            for key, total in sorted(totals.items(), key=sort_key)
+        ]
+
+
+columnar_engine = ColumnarEngine(max_snapshots=getattr(Config, 'COLUMNAR_ENGINE_MAX_SNAPSHOTS', 2))
+
+
+def chart_rows(name, sql_query, filter_spec, date, yearfrom=None, yearto=None):
+    """
+        Возвращает строки запроса графика name.
+
+        Если включен COLUMNAR_ENGINE и запрос читается из tab_progn_spr_gaz_d314 за дату загрузки,
+        строки вычисляются в памяти; иначе (или если фильтры не поддерживаются) выполняется sql_query.
+        При COLUMNAR_ENGINE_VERIFY результат сравнивается с SQL, при расхождении возвращается SQL.
+    """
+    return evaluate(
+        name, sql_query, date,
+        lambda: columnar_engine.rows(name, filter_spec.conditions(PSDATA), date, yearfrom, yearto),
+    )
+
+
+def id_rows(name, sql_query, group_columns, filter_spec, date, years):
+    """
+        Возвращает строки (id колонок group_columns..., сумма summ) за годы years - из колоночного
+        движка или, как и chart_rows, выполнением sql_query.
+    """
+    return evaluate(
+        name, sql_query, date,
+        lambda: columnar_engine.id_rows(group_columns, filter_spec.conditions(PSDATA), date, years),
+    )
+
+
+def evaluate(name, sql_query, date, compute):
+    if np is None or date is None or not getattr(Config, 'COLUMNAR_ENGINE', False):
+        return sql_query.all()
+
+    try:
+        rows = compute()
+    except Exception:
+        logger.exception(f"Колоночный движок: ошибка вычисления {name}")
+        rows = None
+    if rows is None:
+        return sql_query.all()
+
+    if getattr(Config, 'COLUMNAR_ENGINE_VERIFY', False):
+        sql_rows = sql_query.all()
+        if not rows_equal(rows, sql_rows):
+            logger.warning(f"Колоночный движок: результат {name} не совпадает с SQL")
+            return sql_rows
+    return rows
+
+
+def rows_equal(rows, sql_rows):
+    """Сравнивает строки без учета порядка внутри групп с одинаковым ключом сортировки."""
+    def normalize(data):
+        return sorted((tuple(row) for row in data), key=repr)
+    return normalize(rows) == normalize(sql_rows)
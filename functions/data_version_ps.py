@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, insert, select, text, update
+from sqlalchemy.exc import DBAPIError
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+from progSpros_back.model.db_models_ps import LoadGeneration, PSDATA, Prirost
+
+logger = logging.getLogger(__name__)
+
+# Таблицы данных, версия которых отслеживается
+DATA_MODELS = (PSDATA, Prirost)
+
+
+class DataVersion:
+    """
+        Версия данных таблиц прогноза (tab_progn_spr_gaz_d314, tab_prirost_d314).
+
+        Версия - номер загрузки в tab_load_generation_d314: строки таблиц создает миграция схемы,
+        номер увеличивает загрузчик (bump_data_version). Если строки нет (миграция не применена),
+        в PostgreSQL версия берется из счетчиков изменений pg_stat_user_tables, в других СУБД -
+        из наибольшего id и количества строк таблицы.
+        Результат пробы хранится ttl секунд, поэтому в запросе версия читается из памяти;
+        пока один поток обновляет версию, остальные получают предыдущую.
+    """
+
+    def __init__(self, models, ttl=5):
+        self._models = {model.__tablename__: model for model in models}
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._checked_at = None
+        self._warned = set()
+
+    def versions(self):
+        """Возвращает словарь имя таблицы → версия."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self._ttl:
+            return self._versions
+
+        # Первая проба (или после invalidate) ждет блокировку, следующие не ждут чужую пробу
+        if not self._lock.acquire(blocking=self._checked_at is None):
+            return self._versions
+        try:
+            if self._checked_at is None or now - self._checked_at >= self._ttl:
+                self._versions = self._probe()
+                self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+        return self._versions
+
+    def token(self, *models):
+        """
+            Возвращает строку версии для указанных моделей (по умолчанию - для всех таблиц данных).
+        """
+        versions = self.versions()
+        tables = [model.__tablename__ for model in models] or sorted(self._models)
+        return '|'.join(f'{table}:{versions.get(table)}' for table in tables)
+
+    def invalidate(self):
+        """Сбрасывает сохраненную версию: при следующем обращении она будет прочитана заново."""
+        self._checked_at = None
+
+    def _probe(self):
+        versions = {}
+        generations = self._generations()
+        missing = []
+        for table_name in self._models:
+            if table_name in generations:
+                versions[table_name] = f'g{generations[table_name]}'
+            else:
+                missing.append(table_name)
+
+        if missing:
+            versions.update(self._statistics(missing))
+        return versions
+
+    def _statistics(self, table_names):
+        """
+            Версия таблиц без номера загрузки: счетчики изменений PostgreSQL (без чтения самих таблиц),
+            в других СУБД - наибольший id и количество строк (_counters).
+        """
+        new = set(table_names) - self._warned
+        if new:
+            self._warned |= new
+            logger.warning(f"Нет номера загрузки для {sorted(new)}: выполните flask --app Progn_Spros_app db-upgrade")
+        if engine.dialect.name != 'postgresql':
+            return self._counters(table_names)
+        statement = text(
+            "SELECT relname, n_tup_ins + n_tup_upd + n_tup_del AS changes FROM pg_stat_user_tables "
+            "WHERE schemaname = 'public' AND relname IN :table_names"
+        ).bindparams(bindparam('table_names', expanding=True))
+        try:
+            with engine.connect() as connection:
+                rows = connection.execute(statement, {'table_names': list(table_names)}).all()
+        except DBAPIError as e:
+            logger.warning(f"Статистика таблиц недоступна: {e}")
+            return {}
+        return {row.relname: f's{row.changes}' for row in rows}
+
+    def _counters(self, table_names):
+        """Версия таблиц в других СУБД: наибольший id и количество строк (меняются при загрузке и удалении строк)."""
+        versions = {}
+        try:
+            with engine.connect() as connection:
+                for table_name in table_names:
+                    model = self._models[table_name]
+                    last_id, rows = connection.execute(select(func.max(model.id), func.count(model.id))).one()
+                    versions[table_name] = f'c{last_id}-{rows}'
+        except DBAPIError as e:
+            logger.warning(f"Счетчики строк таблиц недоступны: {e}")
+            return {}
+        return versions
+
+    def _generations(self):
+        statement = select(LoadGeneration.table_name, LoadGeneration.generation).where(
+            LoadGeneration.table_name.in_(list(self._models))
+        )
+        try:
+            with engine.connect() as connection:
+                return {row.table_name: row.generation for row in connection.execute(statement)}
+        except DBAPIError as e:
+            # Таблица номеров загрузки может отсутствовать в БД только для чтения
+            logger.warning(f"Номера загрузки недоступны: {e}")
+            return {}
+
+
+def bump_data_version(*models, connection=None):
+    """
+        Увеличивает номер загрузки таблиц данных. Вызывается загрузчиком после загрузки.
+
+        Аргументы:
+            models: модели загруженных таблиц (по умолчанию - все таблицы данных).
+            connection (необязательно): соединение SQLAlchemy, в транзакции которого идет загрузка.
+    """
+    tables = [model.__tablename__ for model in models] or [model.__tablename__ for model in DATA_MODELS]
+
+    def bump(conn):
+        now = datetime.now()
+        for table_name in tables:
+            result = conn.execute(
+                update(LoadGeneration)
+                .where(LoadGeneration.table_name == table_name)
+                .values(generation=LoadGeneration.generation + 1, updated_at=now)
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(LoadGeneration).values(table_name=table_name, generation=1, updated_at=now))
+
+    if connection is None:
+        with engine.begin() as conn:
+            bump(conn)
+    else:
+        bump(connection)
+    data_version.invalidate()
+
+
+data_version = DataVersion(DATA_MODELS, ttl=getattr(Config, 'DATA_VERSION_TTL', 5))
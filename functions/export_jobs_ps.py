@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import db, engine
+from progSpros_back.functions.data_version_ps import data_version
+
+logger = logging.getLogger(__name__)
+
+# Состояния задания выгрузки
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{40}$')
+
+
+def start_method():
+    """
+        Способ запуска процессов пула: EXPORT_JOBS_START_METHOD или forkserver (spawn, если forkserver
+        недоступен). Процесс WSGI многопоточный, поэтому fork по умолчанию не используется: копия процесса
+        получает захваченные другими потоками блокировки и пул соединений SQLAlchemy.
+    """
+    method = getattr(Config, 'EXPORT_JOBS_START_METHOD', None)
+    if method is None:
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return method
+
+
+def _init_worker(method):
+    # Соединения процесса пула создаются заново. При fork пул соединений - копия родительского:
+    # его соединения не используются и не закрываются (их закроет родитель)
+    engine.dispose(close=method != 'fork')
+    db.registry.clear()
+
+
+def _write_status(directory, job_id, status):
+    path = os.path.join(directory, f'{job_id}.json')
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump(status, file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def run_export_job(export, job_id, directory, params, filename):
+    """
+        Выполняет задание в процессе пула: export(params, path, progress) пишет файл в path,
+        progress(stage, percent) сохраняет ход выполнения в файл состояния задания.
+    """
+    status = {'job': job_id, 'state': RUNNING, 'stage': None, 'progress': 0, 'filename': filename,
+              'error': None, 'updated_at': time.time()}
+
+    def progress(stage, percent):
+        status.update(stage=stage, progress=percent, updated_at=time.time())
+        _write_status(directory, job_id, status)
+
+    progress('start', 0)
+    tmp_path = os.path.join(directory, f'{job_id}.{os.getpid()}.part.xlsx')
+    try:
+        export(params, tmp_path, progress)
+        os.replace(tmp_path, os.path.join(directory, f'{job_id}.xlsx'))
+    except Exception as e:
+        logger.exception(f"Выгрузка {job_id}: ошибка")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        status.update(state=FAILED, error=str(e), updated_at=time.time())
+        _write_status(directory, job_id, status)
+        return
+    status.update(state=DONE, stage='done', progress=100, updated_at=time.time())
+    _write_status(directory, job_id, status)
+
+
+class ExportJobs:
+    """
+        Задания выгрузки в Excel, выполняемые в ограниченном пуле процессов.
+
+        Идентификатор задания - хэш имени выгрузки, параметров и версии данных, поэтому одинаковые
+        запросы при одной версии данных получают одно задание, а готовый файл используется повторно.
+        Состояние и файлы заданий хранятся в каталоге directory и видны всем процессам WSGI.
+    """
+
+    def __init__(self, directory, max_workers=2, ttl=24 * 3600, timeout=600):
+        self.directory = directory
+        self._max_workers = max_workers
+        self._ttl = ttl
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                os.makedirs(self.directory, exist_ok=True)
+                method = start_method()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._max_workers, mp_context=multiprocessing.get_context(method),
+                    initializer=_init_worker, initargs=(method,),
+                )
+            return self._executor
+
+    @staticmethod
+    def job_id(name, params):
+        canonical = json.dumps(
+            {'export': name, 'params': params, 'version': data_version.token()},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+    def submit(self, name, export, params, filename='output.xlsx'):
+        """
+            Ставит выгрузку в очередь или возвращает уже существующее задание с теми же параметрами.
+
+            Аргументы:
+                name (str): имя выгрузки.
+                export: функция export(params, path, progress) уровня модуля (передается в процесс пула).
+                params (dict): сериализуемые (JSON) параметры выгрузки.
+                filename (str): имя файла для скачивания.
+
+            Возвращается:
+                dict: состояние задания.
+        """
+        executor = self.executor()
+        self.cleanup()
+        job_id = self.job_id(name, params)
+
+        status = self.status(job_id)
+        if status is not None and not self._expired(status):
+            return status
+
+        status = {'job': job_id, 'state': QUEUED, 'stage': None, 'progress': 0, 'filename': filename,
+                  'error': None, 'updated_at': time.time()}
+        if not self._claim(job_id, status):
+            # Задание одновременно поставлено другим процессом
+            return self.status(job_id)
+
+        future = executor.submit(run_export_job, export, job_id, self.directory, params, filename)
+        future.add_done_callback(lambda f: self._done(job_id, f))
+        return status
+
+    def run(self, export, params):
+        """
+            Выполняет выгрузку в текущем процессе (синхронный запрос) тем же способом, что и задание:
+            export(params, path, progress) пишет временный файл в каталоге заданий.
+
+            Возвращается:
+                bytes: содержимое файла.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix='.part.xlsx')
+        os.close(fd)
+        try:
+            export(params, path, lambda stage, percent: None)
+            with open(path, 'rb') as file:
+                return file.read()
+        finally:
+            os.remove(path)
+
+    def status(self, job_id):
+        """Возвращает состояние задания или None, если задание не найдено."""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f'{job_id}.json'), encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def path(self, job_id, status=None):
+        """Возвращает путь к готовому файлу задания или None (status - уже прочитанное состояние задания)."""
+        status = status or self.status(job_id)
+        if status is None or status['state'] != DONE:
+            return None
+        path = os.path.join(self.directory, f'{job_id}.xlsx')
+        return path if os.path.exists(path) else None
+
+    def cleanup(self):
+        """Удаляет файлы заданий старше ttl секунд."""
+        expire = time.time() - self._ttl
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.stat().st_mtime < expire:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def _expired(self, status):
+        if status['state'] == FAILED:
+            return True
+        if status['state'] == DONE:
+            return not os.path.exists(os.path.join(self.directory, f"{status['job']}.xlsx"))
+        # Задание в очереди или выполняется, но давно не обновлялось (процесс завершился аварийно)
+        return time.time() - status['updated_at'] > self._timeout
+
+    def _claim(self, job_id, status):
+        path = os.path.join(self.directory, f'{job_id}.json')
+        current = self.status(job_id)
+        if current is not None and self._expired(current):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(status, file, ensure_ascii=False)
+        return True
+
+    def _done(self, job_id, future):
+        # Ошибки внутри выгрузки записывает run_export_job; здесь - падение процесса пула
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            if isinstance(error, BrokenProcessPool):
+                # Пул непригоден для новых заданий - следующий submit создаст новый
+                with self._lock:
+                    self._executor = None
+            logger.error(f"Выгрузка {job_id}: процесс пула завершился с ошибкой: {error}")
+            status = self.status(job_id) or {'job': job_id, 'filename': None}
+            status.update(state=FAILED, error=str(error), updated_at=time.time())
+            _write_status(self.directory, job_id, status)
+
+
+export_jobs = ExportJobs(
+    getattr(Config, 'EXPORT_JOBS_DIR', os.path.join(tempfile.gettempdir(), 'progSpros_exports')),
+    max_workers=getattr(Config, 'EXPORT_JOBS_WORKERS', 2),
+    ttl=getattr(Config, 'EXPORT_JOBS_TTL', 24 * 3600),
+    timeout=getattr(Config, 'EXPORT_JOBS_TIMEOUT', 600),
+)
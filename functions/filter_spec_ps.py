@@ -0,0 +1,191 @@
+import hashlib
+import json
+
+from flask import g, has_request_context, request, session
+from sqlalchemy import and_
+
+from progSpros_back.database_ps import db
+from progSpros_back.functions.chart_data_functions_ps import build_filter_conditions
+from progSpros_back.functions.reference_cache_ps import reference_cache, count_reference_lookups
+from progSpros_back.functions.utility_functions_ps import create_filter_params
+from progSpros_back.model.db_models_ps import reference_models, Otrasl, VersProgn, GroupPost, FedState, Regions
+from progSpros_back.model.mappings_ps import yn_mapping
+
+# Параметры фильтров запроса: параметр → (колонка в таблицах данных, справочник или статический мэппинг)
+FILTER_PARAMS = {
+    'otrasl': ('tab_otrasl_economy_d314_ids', Otrasl),
+    'vers': ('tab_ver_real_pr_d314_ids', VersProgn),
+    'grpost': ('tab_group_post_d314_ids', GroupPost),
+    'fo': ('tab_fo_d314_ids', FedState),
+    'region': ('tab_region_d314_ids', Regions),
+    'dogovor': ('tab_dogovor_visual_d314_ids', yn_mapping),
+    'tu': ('tab_tu_visual_d314_ids', yn_mapping),
+    'infr': ('tab_infr_d314_ids', yn_mapping),
+}
+
+
+def parse_list_param(args, name):
+    """Разбирает параметр запроса вида ?name=a,b&name=c в список значений без пустых строк."""
+    return [value.strip() for item in args.getlist(name) for value in item.split(',') if value.strip()]
+
+
+def _reverse_index(source):
+    """Возвращает пару (name → id, casefold(name) → id) для справочника или статического мэппинга."""
+    if isinstance(source, dict):
+        reverse = {value: key for key, value in source.items()}
+    else:
+        reverse = reference_cache.reverse(source)
+    return reverse, {name.casefold(): id_ for name, id_ in reverse.items()}
+
+
+def _sort_key(value):
+    return (not isinstance(value, int), str(value))
+
+
+class FilterSpec:
+    """
+        Каноническое описание фильтров запроса (otrasl, vers, grpost, fo, region, dogovor, tu, infr
+        и global_filters с запасным значением из session).
+
+        Значения фильтров переводятся в идентификаторы справочников без учета регистра, сортируются
+        и очищаются от дубликатов, поэтому запросы, отличающиеся порядком или регистром значений,
+        дают одинаковый ключ. Условия SQLAlchemy строятся один раз на модель.
+    """
+
+    def __init__(self, values=None, global_filters=None):
+        # values: параметр → отсортированный кортеж идентификаторов (или исходных строк, если имя не найдено)
+        self.values = {param: tuple(ids) for param, ids in (values or {}).items() if ids}
+        self.global_filters = global_filters or {}
+        self._key = None
+        self._conditions = {}
+
+    @classmethod
+    def from_args(cls, args, global_filters=None):
+        """Создает спецификацию из аргументов запроса (MultiDict)."""
+        values = {}
+        for param, (column_name, source) in FILTER_PARAMS.items():
+            names = parse_list_param(args, param)
+            if not names:
+                continue
+            reverse, reverse_casefold = _reverse_index(source)
+            ids = set()
+            for name in names:
+                id_ = reverse.get(name)
+                if id_ is None:
+                    id_ = reverse_casefold.get(name.casefold())
+                # Неизвестные значения передаются в фильтр как есть (например, идентификаторы)
+                ids.add(name if id_ is None else id_)
+            if not isinstance(source, dict):
+                count_reference_lookups('memory', len(names))
+            values[param] = sorted(ids, key=_sort_key)
+
+        return cls(values, normalize_global_filters(global_filters))
+
+    @classmethod
+    def from_request(cls, req=None):
+        """Создает спецификацию из запроса Flask; global_filters при отсутствии берутся из session."""
+        req = req or request
+        filter_params = create_filter_params(req)
+        # Если не заданы глобальные параметры, взять их из session
+        if not filter_params:
+            filter_params = session.get('filter_params')
+        return cls.from_args(req.args, filter_params)
+
+    @classmethod
+    def current(cls):
+        """Возвращает спецификацию текущего запроса, создавая ее один раз на запрос."""
+        if not has_request_context():
+            return cls()
+        if 'filter_spec' not in g:
+            g.filter_spec = cls.from_request()
+        return g.filter_spec
+
+    @classmethod
+    def from_dict(cls, data):
+        """Восстанавливает спецификацию из результата to_dict()."""
+        return cls(data.get('values'), data.get('global_filters'))
+
+    def to_dict(self):
+        """Сериализуемое (JSON) представление спецификации."""
+        return {
+            'values': {param: list(ids) for param, ids in sorted(self.values.items())},
+            'global_filters': self.global_filters,
+        }
+
+    @property
+    def key(self):
+        """Стабильный ключ спецификации (sha1 канонического JSON)."""
+        if self._key is None:
+            canonical = json.dumps(self.to_dict(), sort_keys=True, ensure_ascii=False, default=str)
+            self._key = hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+        return self._key
+
+    def __eq__(self, other):
+        return isinstance(other, FilterSpec) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f'FilterSpec({self.to_dict()!r})'
+
+    def get(self, param):
+        """Возвращает идентификаторы фильтра param (пустой кортеж, если фильтр не задан)."""
+        return self.values.get(param, ())
+
+    def conditions(self, model, columns=None):
+        """
+            Возвращает список условий SQLAlchemy для модели (строится один раз на модель).
+
+            Аргументы:
+                model: класс модели SQLAlchemy с колонками tab_*_ids.
+                columns (dict, необязательно): переопределение колонок параметр → колонка модели.
+                    Если передан, применяются только перечисленные параметры.
+        """
+        # Ключ - сами колонки: одинаковые параметры могут указывать на колонки разных сущностей (aliased)
+        cache_key = (model, None if columns is None else tuple(sorted(columns.items(), key=lambda item: item[0])))
+        if cache_key not in self._conditions:
+            conditions = build_filter_conditions(model, self.global_filters, db, reference_models)
+            for param, ids in self.values.items():
+                if columns is not None:
+                    column = columns.get(param)
+                else:
+                    column = getattr(model, FILTER_PARAMS[param][0], None)
+                if column is not None:
+                    conditions.append(column.in_(ids))
+            self._conditions[cache_key] = conditions
+        return self._conditions[cache_key]
+
+    def apply(self, query, model, columns=None):
+        """Применяет фильтры спецификации к запросу SQLAlchemy."""
+        conditions = self.conditions(model, columns)
+        if conditions:
+            query = query.filter(and_(*conditions))
+        return query
+
+
+def normalize_global_filters(filter_params):
+    """
+        Приводит global_filters к каноническому виду, как и параметры фильтров: значения очищаются
+        от пробелов и дубликатов, имена справочников приводятся к написанию в справочнике (без учета
+        регистра), списки сортируются, список из одного значения заменяется значением.
+    """
+    if not filter_params:
+        return {}
+    normalized = {}
+    for param, value in filter_params.items():
+        values = value if isinstance(value, (list, tuple)) else [value]
+        model = reference_models.get(param)
+        exact = reference_cache.all_ids(model) if model is not None else {}
+        names = reference_cache.canonical_names(model) if model is not None else {}
+        canonical = set()
+        for item in values:
+            if isinstance(item, str):
+                item = item.strip()
+                if item not in exact:
+                    item = names.get(item.casefold(), item)
+            canonical.add(item)
+        canonical = sorted(canonical, key=str)
+        if canonical:
+            normalized[param] = canonical if len(canonical) > 1 else canonical[0]
+    return normalized
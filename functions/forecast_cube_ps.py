@@ -0,0 +1,158 @@
+import logging
+import threading
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import DBAPIError
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+from progSpros_back.functions.data_version_ps import data_version
+from progSpros_back.functions.filter_spec_ps import FilterSpec
+from progSpros_back.model.db_models_ps import PSCube, PSCubeBuild, PSDATA
+
+logger = logging.getLogger(__name__)
+
+# Измерения агрегата: колонки, по которым группируют и фильтруют запросы графиков
+CUBE_DIMENSIONS = (
+    'tab_fo_d314_ids',
+    'tab_region_d314_ids',
+    'tab_otrasl_economy_d314_ids',
+    'tab_contragent_d314_ids',
+    'tab_group_post_d314_ids',
+    'tab_dogovor_visual_d314_ids',
+    'tab_tu_visual_d314_ids',
+    'tab_infr_d314_ids',
+    'tab_ver_real_pr_d314_ids',
+    'tab_proizvoditel_d314_ids',
+    'year',
+    'date',
+)
+
+
+def cube_select(date=None):
+    """Запрос агрегации tab_progn_spr_gaz_d314 до измерений CUBE_DIMENSIONS."""
+    dimensions = [getattr(PSDATA, name) for name in CUBE_DIMENSIONS]
+    statement = select(
+        *dimensions,
+        func.sum(PSDATA.summ).label('summ'),
+        func.count().label('row_count'),
+    ).group_by(*dimensions)
+    if date is not None:
+        statement = statement.where(PSDATA.date == date)
+    return statement
+
+
+def refresh_forecast_cube(date=None):
+    """
+        Пересобирает tab_progn_spr_gaz_cube_d314 в одной транзакции.
+
+        В той же транзакции в журнал tab_progn_spr_gaz_cube_build_d314 записываются количество строк
+        и сумма summ tab_progn_spr_gaz_d314 по датам загрузки: с ними CubeCoverage сверяет агрегат.
+
+        Аргументы:
+            date (datetime, необязательно): дата загрузки; по умолчанию пересобираются все даты.
+
+        Возвращается:
+            int: количество строк агрегата.
+    """
+    statements = [delete(PSCube), delete(PSCubeBuild)]
+    source = select(PSDATA.date, func.count(), func.sum(PSDATA.summ)).group_by(PSDATA.date)
+    if date is not None:
+        statements = [statements[0].where(PSCube.date == date), statements[1].where(PSCubeBuild.date == date)]
+        source = source.where(PSDATA.date == date)
+
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.execute(statement)
+        result = connection.execute(
+            insert(PSCube).from_select([*CUBE_DIMENSIONS, 'summ', 'row_count'], cube_select(date))
+        )
+        connection.execute(insert(PSCubeBuild).from_select(['date', 'row_count', 'summ'], source))
+    cube_coverage.invalidate()
+    return result.rowcount
+
+
+def invalidate_forecast_cube(connection, dates):
+    """
+        Удаляет записи журнала пересборки агрегата за даты загрузки: вызывается в транзакции загрузки
+        tab_progn_spr_gaz_d314. Пока агрегат за дату не пересобран, запросы читают tab_progn_spr_gaz_d314.
+    """
+    connection.execute(delete(PSCubeBuild).where(PSCubeBuild.date.in_(list(dates))))
+
+
+class CubeCoverage:
+    """
+        Проверка актуальности агрегата для даты загрузки.
+
+        Агрегат считается актуальным, если в журнале пересборки есть запись за дату, а количество строк
+        и сумма summ агрегата совпадают с записанными в журнал итогами tab_progn_spr_gaz_d314.
+        Сама tab_progn_spr_gaz_d314 не читается: загрузчик удаляет запись журнала за загружаемые даты
+        в своей транзакции. Результат хранится до смены версии данных.
+    """
+
+    def __init__(self, max_entries=64):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._covered = {}
+
+    def covers(self, date):
+        key = (data_version.token(PSDATA), date)
+        covered = self._covered.get(key)
+        if covered is None:
+            covered = self._probe(date)
+            with self._lock:
+                if len(self._covered) >= self._max_entries:
+                    self._covered.clear()
+                self._covered[key] = covered
+        return covered
+
+    def invalidate(self):
+        with self._lock:
+            self._covered = {}
+
+    @staticmethod
+    def _probe(date):
+        statement = select(
+            PSCubeBuild.row_count,
+            PSCubeBuild.summ,
+            select(func.sum(PSCube.row_count)).where(PSCube.date == date).scalar_subquery(),
+            select(func.sum(PSCube.summ)).where(PSCube.date == date).scalar_subquery(),
+        ).where(PSCubeBuild.date == date)
+        with engine.connect() as connection:
+            row = connection.execute(statement).first()
+        if row is None:
+            return False
+        rows, summ, cube_rows, cube_summ = row
+        return bool(rows) and rows == cube_rows and summ == cube_summ
+
+
+cube_coverage = CubeCoverage()
+
+
+def cube_supports(filter_spec):
+    """Проверяет, что все фильтры спецификации ссылаются на измерения агрегата."""
+    for condition in filter_spec.conditions(PSDATA):
+        column = getattr(condition, 'left', None)
+        if getattr(column, 'key', None) not in CUBE_DIMENSIONS:
+            return False
+    return True
+
+
+def forecast_source(date, filter_spec=None):
+    """
+        Возвращает модель, из которой читать прогноз: агрегат PSCube или исходную таблицу PSDATA.
+
+        PSDATA используется, если агрегат выключен (FORECAST_CUBE_ENABLED), не актуален для даты
+        или глобальные фильтры ссылаются на колонки, которых нет в агрегате.
+    """
+    if date is None or not getattr(Config, 'FORECAST_CUBE_ENABLED', True):
+        return PSDATA
+    filter_spec = filter_spec or FilterSpec.current()
+    if not cube_supports(filter_spec):
+        return PSDATA
+    try:
+        covered = cube_coverage.covers(date)
+    except DBAPIError as e:
+        logger.warning(f"Агрегат прогноза недоступен: {e}")
+        return PSDATA
+    return PSCube if covered else PSDATA
@@ -0,0 +1,100 @@
+import dataclasses
+import decimal
+import json
+import time
+from datetime import date
+
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+from progSpros_back.config_ps import Config
+from progSpros_back.functions.request_metrics_ps import record_serialization
+
+try:
+    import orjson
+except ImportError:  # Без orjson используется стандартный json
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def default(obj):
+    """
+        Типы, которых нет в JSON. Представление совпадает с jsonify: Decimal - строкой,
+        даты - в формате HTTP; скаляры и массивы NumPy - числами и списками.
+    """
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, date):
+        return http_date(obj)
+    if np is not None:
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_orjson(data):
+    # Даты передаются в default, чтобы формат не отличался от jsonify
+    return orjson.dumps(
+        data, default=default,
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        | orjson.OPT_PASSTHROUGH_DATETIME,
+    )
+
+
+def dumps_json(data):
+    return json.dumps(data, default=default, sort_keys=True, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+# Сериализаторы ответов: имя (Config.JSON_SERIALIZER) → функция data → bytes
+SERIALIZERS = {'json': dumps_json}
+if orjson is not None:
+    SERIALIZERS['orjson'] = dumps_orjson
+
+
+def get_serializer():
+    name = getattr(Config, 'JSON_SERIALIZER', 'orjson' if orjson is not None else 'json')
+    return SERIALIZERS.get(name, dumps_json)
+
+
+def dumps(data):
+    """Сериализует данные ответа в JSON (bytes) выбранным сериализатором."""
+    start = time.perf_counter()
+    body = get_serializer()(data)
+    record_serialization(time.perf_counter() - start)
+    return body
+
+
+def json_response(data=None, status=200, body=None):
+    """
+        Ответ JSON вместо jsonify.
+
+        Аргументы:
+            data: данные ответа.
+            status (int): код ответа.
+            body (bytes, необязательно): уже сериализованный JSON (например, из кэша) - отдается как есть.
+    """
+    if body is None:
+        body = dumps(data)
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Провайдер JSON приложения: jsonify и app.json используют тот же сериализатор, что и json_response."""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        data = self._prepare_response_obj(args, kwargs)
+        return json_response(data)
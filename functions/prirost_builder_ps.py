@@ -0,0 +1,305 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import Integer, case, delete, exists, func, insert, literal, null, or_, select, tuple_, union_all
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import aliased
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+from progSpros_back.functions.data_version_ps import bump_data_version, data_version
+from progSpros_back.model.db_models_ps import PSDATA, Prirost, PrirostBuild
+
+logger = logging.getLogger(__name__)
+
+# Ключ строки tab_prirost_d314: проект (потребитель с атрибутами), для которого считается прирост
+PRIROST_KEYS = (
+    'tab_fo_d314_ids',
+    'tab_region_d314_ids',
+    'tab_otrasl_economy_d314_ids',
+    'tab_contragent_d314_ids',
+    'tab_status_potreb_d314_ids',
+    'tab_group_post_d314_ids',
+    'tab_dogovor_visual_d314_ids',
+    'tab_tu_visual_d314_ids',
+    'tab_infr_d314_ids',
+    'tab_ver_real_pr_d314_ids',
+    'tab_start_gaz_d314_ids',
+)
+
+# Пары лет по умолчанию: значения yearfrom/yearto по умолчанию карты и графиков (2023-2034)
+# и отчета ots_pr_spr (2024-2036)
+DEFAULT_YEAR_PAIRS = ((2023, 2034), (2024, 2036))
+
+# Выбор года на странице отраслей: пары от DEFAULT_YEARFROM до каждого года по DEFAULT_YEARTO
+DEFAULT_YEARFROM = 2023
+DEFAULT_YEARTO = 2034
+
+# Шаг построения: дата загрузки, пары лет, строк tab_prirost_d314 и время в секундах
+BuildStep = namedtuple('BuildStep', 'date pairs rows seconds')
+
+
+def parse_pair(text):
+    """Пара лет из строки '2023-2036'."""
+    try:
+        yearfrom, yearto = (int(year) for year in text.split('-'))
+    except ValueError:
+        raise ValueError(f'{text} не пара лет: нужен формат 2023-2036')
+    if yearfrom >= yearto:
+        raise ValueError(f'{text}: год начала должен быть меньше года окончания')
+    return yearfrom, yearto
+
+
+def year_pairs(connection, date):
+    """
+        Пары лет, для которых строится прирост: PRIROST_YEAR_PAIRS из конфигурации или, если не задано,
+        пары, которые запрашивают страницы приложения (DEFAULT_YEAR_PAIRS и от DEFAULT_YEARFROM до каждого
+        года до DEFAULT_YEARTO) из лет прогноза за дату загрузки. Прочие пары строятся по первому запросу
+        (PrirostBuildQueue) или командой build-prirost --pair.
+    """
+    pairs = getattr(Config, 'PRIROST_YEAR_PAIRS', None)
+    if pairs:
+        return sorted(tuple(pair) for pair in pairs)
+    years = set(connection.execute(
+        select(PSDATA.year).distinct().where(PSDATA.date == date, PSDATA.year.is_not(None))
+    ).scalars().all())
+    pairs = set(DEFAULT_YEAR_PAIRS) | {(DEFAULT_YEARFROM, year) for year in range(DEFAULT_YEARFROM + 1, DEFAULT_YEARTO + 1)}
+    return sorted(pair for pair in pairs if pair[0] in years and pair[1] in years)
+
+
+def prirost_select(date, pairs):
+    """
+        Запрос строк tab_prirost_d314 за дату загрузки для набора пар лет одним запросом:
+        summ = сумма за yearto - сумма за yearfrom (как колонка prirost отчета ots_pr_spr).
+    """
+    pairs_cte = union_all(*[
+        select(literal(yearfrom).label('yearfrom'), literal(yearto).label('yearto')) for yearfrom, yearto in pairs
+    ]).cte('pairs')
+    keys = [getattr(PSDATA, name) for name in PRIROST_KEYS]
+    growth = (
+        func.sum(case((PSDATA.year == pairs_cte.c.yearto, PSDATA.summ), else_=0))
+        - func.sum(case((PSDATA.year == pairs_cte.c.yearfrom, PSDATA.summ), else_=0))
+    )
+    return (
+        select(*keys, growth.label('summ'), pairs_cte.c.yearfrom, pairs_cte.c.yearto, PSDATA.date)
+        .select_from(PSDATA)
+        .join(pairs_cte, or_(PSDATA.year == pairs_cte.c.yearfrom, PSDATA.year == pairs_cte.c.yearto))
+        .where(PSDATA.date == date)
+        .group_by(*keys, pairs_cte.c.yearfrom, pairs_cte.c.yearto, PSDATA.date)
+    )
+
+
+def build_step(date, pairs, bump=True):
+    """
+        Пересчитывает строки tab_prirost_d314 за дату загрузки и пары лет в одной транзакции
+        и отмечает пары построенными в tab_prirost_build_d314. Без bump версия данных Prirost
+        не меняется: так строятся пары, которых в таблице не было (ответы по ним не меняются).
+    """
+    start = time.perf_counter()
+    condition = tuple_(Prirost.yearfrom, Prirost.yearto).in_(pairs)
+    with engine.begin() as connection:
+        connection.execute(delete(Prirost).where(Prirost.date == date, condition))
+        connection.execute(delete(PrirostBuild).where(
+            PrirostBuild.date == date, tuple_(PrirostBuild.yearfrom, PrirostBuild.yearto).in_(pairs)
+        ))
+        connection.execute(
+            insert(Prirost).from_select([*PRIROST_KEYS, 'summ', 'yearfrom', 'yearto', 'date'], prirost_select(date, pairs))
+        )
+        counts = {
+            (yearfrom, yearto): count for yearfrom, yearto, count in connection.execute(
+                select(Prirost.yearfrom, Prirost.yearto, func.count())
+                .where(Prirost.date == date, condition)
+                .group_by(Prirost.yearfrom, Prirost.yearto)
+            )
+        }
+        connection.execute(insert(PrirostBuild), [
+            {'date': date, 'yearfrom': yearfrom, 'yearto': yearto, 'row_count': counts.get((yearfrom, yearto), 0)}
+            for yearfrom, yearto in pairs
+        ])
+        if bump:
+            bump_data_version(Prirost, connection=connection)
+    return BuildStep(date, pairs, sum(counts.values()), time.perf_counter() - start)
+
+
+def invalidate_prirost(connection, dates):
+    """
+        Удаляет прирост за даты загрузки: вызывается в транзакции загрузки tab_progn_spr_gaz_d314.
+
+        Удаляются и отметки построения, и строки tab_prirost_d314 (в том числе рассчитанные вне проекта):
+        пока прирост не построен заново, он рассчитывается из новых данных (derived_prirost).
+    """
+    dates = list(dates)
+    connection.execute(delete(Prirost).where(Prirost.date.in_(dates)))
+    connection.execute(delete(PrirostBuild).where(PrirostBuild.date.in_(dates)))
+
+
+def build_prirost(dates=None, pairs=None, force=False, chunk_pairs=None, bump=True):
+    """
+        Строит tab_prirost_d314 из tab_progn_spr_gaz_d314.
+
+        Работа делится на шаги (дата загрузки, PRIROST_BUILD_CHUNK_PAIRS пар лет), каждый шаг - один
+        запрос INSERT ... SELECT в своей транзакции. Построенные пары записываются в tab_prirost_build_d314,
+        поэтому повторный запуск пропускает их: для новой даты загрузки считаются только ее строки,
+        а прерванное построение продолжается с первого непостроенного шага. При force отметки
+        дат сбрасываются до начала построения, поэтому прерванный пересчет тоже продолжается без force.
+
+        Аргументы:
+            dates (list, необязательно): даты загрузки; по умолчанию - все даты tab_progn_spr_gaz_d314.
+            pairs (list, необязательно): пары лет (yearfrom, yearto); по умолчанию - year_pairs.
+            force (bool): пересчитать уже построенные пары.
+            chunk_pairs (int, необязательно): пар лет в одном шаге.
+            bump (bool): менять версию данных Prirost (сбрасывает кэш ответов).
+
+        Возвращается:
+            list[BuildStep]: выполненные шаги.
+    """
+    chunk_pairs = chunk_pairs or getattr(Config, 'PRIROST_BUILD_CHUNK_PAIRS', 8)
+    if dates is None:
+        with engine.connect() as connection:
+            dates = connection.execute(
+                select(PSDATA.date).distinct().where(PSDATA.date.is_not(None)).order_by(PSDATA.date)
+            ).scalars().all()
+
+    if force and dates:
+        with engine.begin() as connection:
+            statement = delete(PrirostBuild).where(PrirostBuild.date.in_(list(dates)))
+            if pairs:
+                statement = statement.where(tuple_(PrirostBuild.yearfrom, PrirostBuild.yearto).in_(list(pairs)))
+            connection.execute(statement)
+
+    with engine.connect() as connection:
+        todo = []
+        for date in dates:
+            date_pairs = sorted(pairs) if pairs else year_pairs(connection, date)
+            built = set(connection.execute(
+                select(PrirostBuild.yearfrom, PrirostBuild.yearto).where(PrirostBuild.date == date)
+            ).tuples().all())
+            date_pairs = [pair for pair in date_pairs if pair not in built]
+            todo.extend((date, date_pairs[i:i + chunk_pairs]) for i in range(0, len(date_pairs), chunk_pairs))
+
+    steps = []
+    for number, (date, step_pairs) in enumerate(todo, start=1):
+        step = build_step(date, step_pairs, bump)
+        steps.append(step)
+        logger.info(f"{Prirost.__tablename__}: шаг {number}/{len(todo)}, дата {date:%d.%m.%Y}, "
+                    f"пары {step_pairs[0]}..{step_pairs[-1]}: {step.rows} строк за {step.seconds:.1f} с")
+    return steps
+
+
+class PrirostCoverage:
+    """
+        Проверка наличия в tab_prirost_d314 пары лет за дату загрузки: по журналу построения
+        или по строкам, рассчитанным вне проекта. Результат хранится до смены версии данных.
+    """
+
+    def __init__(self, max_entries=256):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._covered = {}
+
+    def covers(self, date, yearfrom, yearto):
+        key = (data_version.token(PSDATA, Prirost), date, yearfrom, yearto)
+        covered = self._covered.get(key)
+        if covered is None:
+            covered = self._probe(date, yearfrom, yearto)
+            with self._lock:
+                if len(self._covered) >= self._max_entries:
+                    self._covered.clear()
+                self._covered[key] = covered
+        return covered
+
+    def invalidate(self):
+        with self._lock:
+            self._covered = {}
+
+    @staticmethod
+    def _probe(date, yearfrom, yearto):
+        statement = select(
+            exists().where(
+                PrirostBuild.date == date, PrirostBuild.yearfrom == yearfrom, PrirostBuild.yearto == yearto
+            ) | exists().where(Prirost.date == date, Prirost.yearfrom == yearfrom, Prirost.yearto == yearto)
+        )
+        with engine.connect() as connection:
+            return bool(connection.execute(statement).scalar())
+
+
+prirost_coverage = PrirostCoverage()
+
+
+def derived_prirost(date, yearfrom, yearto):
+    """
+        Сущность с колонками tab_prirost_d314, рассчитанная из tab_progn_spr_gaz_d314 запросом
+        prirost_select: используется в запросах вместо Prirost, если пара лет не построена.
+    """
+    statement = prirost_select(date, [(yearfrom, yearto)]).add_columns(null().cast(Integer).label('id'))
+    return aliased(Prirost, statement.subquery(Prirost.__tablename__), adapt_on_names=True)
+
+
+class PrirostBuildQueue:
+    """
+        Построение недостающих пар лет вне запроса: одна фоновая задача процесса на пару.
+
+        Строятся только пары, которых нет в tab_prirost_d314, поэтому версия данных не меняется,
+        а в этом процессе сбрасывается только проверка наличия пары. Если пару одновременно строит
+        другой процесс, его транзакция завершится ошибкой вставки в tab_prirost_build_d314 и откатится.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._executor = None
+
+    def submit(self, date, yearfrom, yearto):
+        """Ставит пару в очередь, если она еще не стоит. Возвращает True, если поставлена."""
+        key = (date, yearfrom, yearto)
+        with self._lock:
+            if key in self._pending:
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prirost-build')
+            self._pending.add(key)
+        self._executor.submit(self._build, key)
+        return True
+
+    def _build(self, key):
+        date, yearfrom, yearto = key
+        try:
+            steps = build_prirost([date], [(yearfrom, yearto)], bump=False)
+            prirost_coverage.invalidate()
+            logger.info(f"Прирост {yearfrom}-{yearto} за {date:%d.%m.%Y} построен: "
+                        f"{sum(step.rows for step in steps)} строк")
+        except DBAPIError as e:
+            logger.warning(f"Не удалось построить прирост {yearfrom}-{yearto} за {date:%d.%m.%Y}: {e}")
+        except Exception:
+            logger.exception(f"Ошибка построения прироста {yearfrom}-{yearto} за {date:%d.%m.%Y}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+
+prirost_build_queue = PrirostBuildQueue()
+
+
+def prirost_source(date, yearfrom, yearto):
+    """
+        Возвращает сущность, из которой читать прирост: Prirost или derived_prirost.
+
+        Если пары лет за дату нет в tab_prirost_d314, прирост рассчитывается в запросе (derived_prirost).
+        Запрос ничего не пишет в БД: при включенном PRIROST_WRITE_BACK пара ставится в фоновую очередь
+        построения (prirost_build_queue), и следующие запросы после построения читают ее из Prirost.
+    """
+    if date is None or yearfrom is None or yearto is None or yearfrom >= yearto:
+        return Prirost
+    try:
+        if prirost_coverage.covers(date, yearfrom, yearto):
+            return Prirost
+    except DBAPIError as e:
+        logger.warning(f"Журнал построения прироста недоступен: {e}")
+        return Prirost
+
+    if getattr(Config, 'PRIROST_WRITE_BACK', False):
+        prirost_build_queue.submit(date, yearfrom, yearto)
+    return derived_prirost(date, yearfrom, yearto)
@@ -1,6 +1,9 @@
-﻿from sqlalchemy import func, and_, case
+﻿from sqlalchemy import func, and_, or_, case, false
+
+from progSpros_back.functions.slow_query_ps import query_origin
 
 # Округа и регионы
+@query_origin
 def fo_region_query(base_query, tab_region_d314, tab_fo_d314):
     """
     Генерирует запрос для "Прогнозный спрос по отраслям" на основе указанного столбца.
@@ -25,6 +28,7 @@ def fo_region_query(base_query, tab_region_d314, tab_fo_d314):
     )
     )
 
+@query_origin
 def region_fo_query(base_query, tab_region_d314, tab_fo_d314):
     """
     Генерирует запрос для "Прогнозный спрос по отраслям" на основе указанного столбца.
@@ -50,6 +54,7 @@ def region_fo_query(base_query, tab_region_d314, tab_fo_d314):
     )
 
 # Общий запрос для всех данных
+@query_origin
 def all_data_query(base_query, tab_progn_spr_gaz_d314, tab_contragent_d314, tab_otrasl_economy_d314, tab_fo_d314,
                      tab_region_d314, tab_group_post_d314, tab_status_potreb_d314, tab_start_gaz_d314, tab_pg_visual_d314,
                      tab_dogovor_visual_d314, tab_tu_visual_d314, yearfrom, yearto):
@@ -125,6 +130,7 @@ def all_data_query(base_query, tab_progn_spr_gaz_d314, tab_contragent_d314, tab_
     )
 
 # Прогнозный спрос по отраслям
+@query_origin
 def otrasl_query(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, yearfrom, yearto, date):
     """
     Генерирует запрос для "Прогнозный спрос по отраслям" на основе указанного столбца.
@@ -152,6 +158,7 @@ def otrasl_query(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, ye
         (func.sum(tab_progn_spr_gaz_d314.summ).desc())
     )
     )
+@query_origin
 def query_prirost(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, otrasl_name, year_par):
     return (base_query.with_entities(
                 func.sum(tab_progn_spr_gaz_d314.summ).label('sum_par')
@@ -162,6 +169,7 @@ def query_prirost(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, o
     )
     )
 # Прогнозный спрос РФ топ-5 потребителей
+@query_origin
 def top_potr_query(base_query, tab_progn_spr_gaz_d314, tab_contragent_d314, tab_ver_real_pr_d314, yearfrom, yearto, date):
     """
     Генерирует запрос для "Крупные инвестиционные проекты" на основе указанного столбца.
@@ -196,6 +204,7 @@ def top_potr_query(base_query, tab_progn_spr_gaz_d314, tab_contragent_d314, tab_
     )
 
 # =======================  ЗАПРОСЫ ДЛЯ SANKEY ====================
+@query_origin
 def sankey_query(base_query, tab_progn_spr_gaz_d314, tab_group_post_d314, tab_proizvoditel_d314, yearfrom, date):
     """
     Генерирует запрос для "Sankey" на основе указанного столбца.
@@ -224,6 +233,7 @@ def sankey_query(base_query, tab_progn_spr_gaz_d314, tab_group_post_d314, tab_pr
         tab_group_post_d314.name,
     )
     )
+@query_origin
 def sankey_query2(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, tab_group_post_d314, yearfrom, date):
     """
     Генерирует запрос для "Sankey" на основе указанного столбца.
@@ -256,6 +266,7 @@ def sankey_query2(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, t
     )
     )
 
+@query_origin
 def sankey_query3(base_query, tab_progn_spr_gaz_d314, tab_proizvoditel_d314, yearfrom, date):
     """
     Генерирует запрос для "Крупные инвестиционные проекты" на основе указанного столбца.
@@ -279,6 +290,7 @@ def sankey_query3(base_query, tab_progn_spr_gaz_d314, tab_proizvoditel_d314, yea
         tab_proizvoditel_d314.name,
     )
     )
+@query_origin
 def sankey_query4(base_query, tab_progn_spr_gaz_d314, tab_group_post_d314, yearfrom, date):
     """
     Генерирует запрос для "Крупные инвестиционные проекты" на основе указанного столбца.
@@ -302,6 +314,7 @@ def sankey_query4(base_query, tab_progn_spr_gaz_d314, tab_group_post_d314, yearf
         tab_group_post_d314.name
     )
     )
+@query_origin
 def sankey_query5(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, yearfrom, date):
     """
     Генерирует запрос для "Крупные инвестиционные проекты" на основе указанного столбца.
@@ -326,7 +339,34 @@ def sankey_query5(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, y
     )
     )
 
+@query_origin
+def sankey_flow_query(base_query, tab_progn_spr_gaz_d314, yearfrom, date):
+    """
+    Генерирует запрос для "Sankey" за один проход: сумма по идентификаторам производителя,
+    группы поставщиков и отрасли. Узлы и связи sankey получаются из него группировкой в памяти.
+    Аргументы:
+        base_query (Запрос): Базовый объект запроса SQLAlchemy.
+        progn_spros_data (База): Объект таблицы SQLAlchemy, содержащий данные ресурса.
+    Возвращается:
+        QUERY: объект запроса SQLAlchemy, который группирует и суммирует поле "СУММА" по полям:
+                отфильтрованными по `году и дате загрузки`.
+    """
+    return (base_query.with_entities(
+        tab_progn_spr_gaz_d314.tab_proizvoditel_d314_ids.label('proizv'),
+        tab_progn_spr_gaz_d314.tab_group_post_d314_ids.label('grpost'),
+        tab_progn_spr_gaz_d314.tab_otrasl_economy_d314_ids.label('otrasl'),
+        func.sum(tab_progn_spr_gaz_d314.summ).label('summ')
+    ).filter(tab_progn_spr_gaz_d314.year == yearfrom
+    ).filter(tab_progn_spr_gaz_d314.date == date
+    ).group_by(
+        tab_progn_spr_gaz_d314.tab_proizvoditel_d314_ids,
+        tab_progn_spr_gaz_d314.tab_group_post_d314_ids,
+        tab_progn_spr_gaz_d314.tab_otrasl_economy_d314_ids,
+    )
+    )
+
 # Карта по отраслям
+@query_origin
 def fo_otrasl_query(base_query, tab_progn_spr_gaz_d314, tab_fo_d314, tab_otrasl_economy_d314, yearfrom, yearto, date):
     """
     Генерирует запрос для "Карта по отраслям" на основе указанного столбца.
@@ -354,6 +394,7 @@ def fo_otrasl_query(base_query, tab_progn_spr_gaz_d314, tab_fo_d314, tab_otrasl_
     )
     )
 # Карта по потребителям
+@query_origin
 def fo_potr_query(base_query, tab_progn_spr_gaz_d314, tab_fo_d314, tab_contragent_d314, yearfrom, yearto, date):
     """
     Генерирует запрос для "Карта" на основе указанного столбца.
@@ -382,6 +423,7 @@ def fo_potr_query(base_query, tab_progn_spr_gaz_d314, tab_fo_d314, tab_contragen
     )
     )
 
+@query_origin
 def big_invest_query(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, tab_fo_d314,
                      tab_region_d314, tab_group_post_d314, tab_status_potreb_d314, tab_start_gaz_d314, tab_infr_d314,
                      tab_dogovor_visual_d314, tab_tu_visual_d314, yearfrom, yearto):
@@ -450,6 +492,7 @@ def big_invest_query(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314
     )
     )
 
+@query_origin
 def query_prirost_table(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, tab_fo_d314,
                      tab_region_d314, tab_group_post_d314, tab_status_potreb_d314, tab_start_gaz_d314, tab_infr_d314,
                      tab_dogovor_visual_d314, tab_tu_visual_d314, otr_name, fo_name, reg_name, grp_name, stp_name, stg_name,
@@ -487,6 +530,7 @@ def query_prirost_table(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d
     )
     )
 
+@query_origin
 def query_prirost_potr_table(base_query, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, tab_fo_d314,
                      tab_region_d314, tab_group_post_d314, tab_contragent_d314, tab_status_potreb_d314, tab_start_gaz_d314, tab_infr_d314,
                      tab_dogovor_visual_d314, tab_tu_visual_d314, otr_name, fo_name, reg_name, grp_name, contragent_name, stp_name, stg_name,
@@ -528,6 +572,7 @@ def query_prirost_potr_table(base_query, tab_progn_spr_gaz_d314, tab_otrasl_econ
     )
     )
 
+@query_origin
 def big_invest_query_potr(base_query, tab_prirost_d314, tab_otrasl_economy_d314, tab_fo_d314,
                      tab_region_d314, tab_group_post_d314, tab_status_potreb_d314, tab_start_gaz_d314, tab_infr_d314,
                      tab_dogovor_visual_d314, tab_tu_visual_d314, yearfrom, yearto, tab_contragent_d314, date):
@@ -588,20 +633,58 @@ def big_invest_query_potr(base_query, tab_prirost_d314, tab_otrasl_economy_d314,
         tab_contragent_d314.name
     ).order_by(
         (func.sum(tab_prirost_d314.summ).desc()),
-        tab_otrasl_economy_d314.name,
-        tab_fo_d314.name,
-        tab_region_d314.name,
-        tab_group_post_d314.name,
-        tab_contragent_d314.name,
-        tab_status_potreb_d314.name,
-        tab_start_gaz_d314.name,
-        tab_infr_d314.name,
-        tab_dogovor_visual_d314.name,
-        tab_tu_visual_d314.name,
-        tab_contragent_d314.name
+        tab_otrasl_economy_d314.name.asc().nulls_last(),
+        tab_fo_d314.name.asc().nulls_last(),
+        tab_region_d314.name.asc().nulls_last(),
+        tab_group_post_d314.name.asc().nulls_last(),
+        tab_contragent_d314.name.asc().nulls_last(),
+        tab_status_potreb_d314.name.asc().nulls_last(),
+        tab_start_gaz_d314.name.asc().nulls_last(),
+        tab_infr_d314.name.asc().nulls_last(),
+        tab_dogovor_visual_d314.name.asc().nulls_last(),
+        tab_tu_visual_d314.name.asc().nulls_last()
     )
     )
 
+# Порядок строк big_invest_query_potr и ключ курсора страницы: прирост и все колонки группировки,
+# поэтому ключ уникален. Первые колонки - в прежнем порядке сортировки отчета (отрасль, ФО, регион,
+# группа поставщиков, потребитель), остальные колонки группировки добавлены после них
+BIG_INVEST_ORDER = ('prirost', 'otrasl', 'fo', 'region', 'grpost', 'contragent', 'stpotr', 'stgaz', 'infr',
+                    'dogovor', 'tu')
+
+def big_invest_page(query, tab_prirost_d314, sum_pr, limit, after=None):
+    """
+    Ограничивает запрос big_invest_query_potr порогом прироста и страницей (keyset-пагинация).
+    Аргументы:
+        query (Запрос): запрос big_invest_query_potr.
+        sum_pr (число): минимальный прирост; строки с нулевым приростом исключаются.
+        limit (int): количество строк.
+        after (tuple, необязательно): значения BIG_INVEST_ORDER последней строки предыдущей страницы.
+    Возвращается:
+        QUERY: запрос с условиями HAVING и LIMIT.
+    """
+    prirost = func.sum(tab_prirost_d314.summ)
+    query = query.having(prirost >= sum_pr).having(prirost != 0)
+    if after is not None:
+        # Строки после курсора в порядке ORDER BY: (prirost DESC, имена ASC NULLS LAST) больше курсора
+        columns = {column['name']: column['expr'] for column in query.column_descriptions}
+        conditions, equal = [], []
+        for name, value in zip(BIG_INVEST_ORDER, after):
+            if name == 'prirost':
+                conditions.append(and_(*equal, prirost < value))
+                equal.append(prirost == value)
+                continue
+            column = columns[name]
+            if value is None:
+                conditions.append(false())
+                equal.append(column.is_(None))
+            else:
+                conditions.append(and_(*equal, or_(column > value, column.is_(None))))
+                equal.append(column == value)
+        query = query.having(or_(*conditions))
+    return query.limit(limit)
+
+@query_origin
 def mapping_otrasl_query(base_query, tab_otrasl_economy_d314):
     """
         запрос мэппинга по отраслям из таблицы tab_otrasl_economy_d314
@@ -617,6 +700,7 @@ def mapping_otrasl_query(base_query, tab_otrasl_economy_d314):
     ).filter(tab_otrasl_economy_d314.id.not_in([19])
     )
     )
+@query_origin
 def year_query(base_query, tab_progn_spr_gaz_d314):
     return (base_query.with_entities(
         tab_progn_spr_gaz_d314.year.label('year')
@@ -627,6 +711,7 @@ def year_query(base_query, tab_progn_spr_gaz_d314):
     )
     )
 
+@query_origin
 def yearto_query(base_query, tab_progn_spr_gaz_d314):
     """
         запрос мэппинга по отраслям из таблицы tab_otrasl_economy_d314
@@ -640,6 +725,7 @@ def yearto_query(base_query, tab_progn_spr_gaz_d314):
     )
 
 # Запрос для мэппингов
+@query_origin
 def mapping_query(base_query, tab):
     return (base_query.with_entities(
         tab.name.label('name'),
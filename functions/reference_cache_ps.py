@@ -0,0 +1,185 @@
+import hashlib
+import threading
+import time
+
+from flask import g, has_app_context
+from sqlalchemy import Text, cast, func, literal, literal_column, union_all, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+from progSpros_back.model.db_models_ps import reference_models
+
+# Идентификаторы, которые исключаются из мэппингов (как в mapping_query)
+EXCLUDED_IDS = (19,)
+
+
+class ReferenceCache:
+    """
+        Кэш справочников уровня процесса.
+
+        Загружает таблицы reference_models и хранит для каждой прямой (id → name) и обратный
+        (name → id) мэппинги. Справочник перечитывается только если изменился его отпечаток -
+        хэш всех пар (id, name), поэтому замечается и переименование. Отпечатки всех справочников
+        снимаются одним запросом и не чаще, чем раз в check_interval секунд: в PostgreSQL хэш
+        считает БД (md5 от string_agg), в других СУБД - процесс по прочитанным id и name.
+    """
+
+    def __init__(self, models, check_interval=60):
+        self._models = {model.__tablename__: model for model in models.values()}
+        self._check_interval = check_interval
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._token = None
+        self._checked_at = None
+
+    def token(self):
+        """Возвращает отпечаток всех справочников: меняется при любом изменении их строк."""
+        self._refresh_if_needed()
+        return self._token
+
+    def forward(self, model):
+        """Возвращает мэппинг id → name (без EXCLUDED_IDS), упорядоченный по name."""
+        return self._get(model)['forward']
+
+    def reverse(self, model):
+        """Возвращает обратный мэппинг name → id (без EXCLUDED_IDS)."""
+        return self._get(model)['reverse']
+
+    def all_ids(self, model):
+        """Возвращает мэппинг name → id по всем строкам справочника, включая EXCLUDED_IDS."""
+        return self._get(model)['all_ids']
+
+    def canonical_names(self, model):
+        """Возвращает мэппинг casefold(name) → name по всем строкам справочника, включая EXCLUDED_IDS."""
+        return self._get(model)['canonical']
+
+    def ranked_names(self, model):
+        """
+            Возвращает мэппинг id → (порядковый номер name в сортировке БД, name) по всем строкам
+            справочника, включая EXCLUDED_IDS. Используется для группировки и сортировки в памяти так же,
+            как при соединении со справочником и ORDER BY name.
+        """
+        return self._get(model)['ranked']
+
+    def invalidate(self):
+        """Сбрасывает кэш: при следующем обращении справочники будут перечитаны."""
+        with self._lock:
+            self._tables = {}
+            self._checked_at = None
+
+    def expire(self):
+        """Помечает отпечатки устаревшими: при следующем обращении они будут сняты заново."""
+        self._checked_at = None
+
+    def _get(self, model):
+        self._refresh_if_needed()
+        table = self._tables.get(model.__tablename__)
+        if table is None:
+            # Справочник не входит в reference_models - загрузить отдельно
+            with self._lock:
+                table = self._tables.get(model.__tablename__)
+                if table is None:
+                    table = self._load(model, None)
+                    self._tables[model.__tablename__] = table
+        return table
+
+    def _refresh_if_needed(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self._check_interval:
+            return
+
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self._check_interval:
+                return
+
+            fingerprints = self._fingerprints()
+            tables = dict(self._tables)
+            for table_name, model in self._models.items():
+                fingerprint = fingerprints.get(table_name)
+                cached = tables.get(table_name)
+                if cached is None or cached['fingerprint'] != fingerprint:
+                    tables[table_name] = self._load(model, fingerprint)
+
+            # Словари заменяются целиком, поэтому читатели без блокировки видят согласованное состояние
+            self._tables = tables
+            self._token = hashlib.sha1(repr(sorted(fingerprints.items())).encode('utf-8')).hexdigest()
+            self._checked_at = time.monotonic()
+
+    def _fingerprints(self):
+        """Снимает отпечатки всех справочников одним запросом."""
+        # Отдельное соединение, чтобы не вмешиваться в транзакцию сессии запроса
+        if engine.dialect.name == 'postgresql':
+            probes = [
+                select(
+                    literal(table_name).label('table_name'),
+                    func.md5(func.string_agg(
+                        cast(model.id, Text) + ':' + func.coalesce(model.name, ''),
+                        aggregate_order_by(literal_column("','"), model.id),
+                    )).label('digest'),
+                )
+                for table_name, model in self._models.items()
+            ]
+            with engine.connect() as connection:
+                rows = connection.execute(union_all(*probes)).all()
+            return {row.table_name: row.digest for row in rows}
+
+        probes = [
+            select(literal(table_name).label('table_name'), model.id, model.name)
+            for table_name, model in self._models.items()
+        ]
+        digests = {table_name: hashlib.sha1() for table_name in self._models}
+        with engine.connect() as connection:
+            rows = connection.execute(union_all(*probes).order_by('table_name', 'id')).all()
+        for row in rows:
+            digests[row.table_name].update(f'{row.id}:{row.name or ""},'.encode('utf-8'))
+        return {table_name: digest.hexdigest() for table_name, digest in digests.items()}
+
+    @staticmethod
+    def _load(model, fingerprint):
+        with engine.connect() as connection:
+            rows = connection.execute(select(model.id, model.name).order_by(model.name)).all()
+
+        forward = {}
+        all_ids = {}
+        for row in rows:
+            all_ids.setdefault(row.name, row.id)
+            if row.id not in EXCLUDED_IDS and row.id not in forward:
+                forward[row.id] = row.name
+        ranks = {name: rank for rank, name in enumerate(all_ids)}
+
+        return {
+            'fingerprint': fingerprint,
+            'forward': forward,
+            'reverse': {name: id_ for id_, name in forward.items()},
+            'all_ids': all_ids,
+            'canonical': {name.casefold(): name for name in reversed(all_ids) if isinstance(name, str)},
+            'ranked': {row.id: (ranks[row.name], row.name) for row in rows},
+        }
+
+
+def count_reference_lookups(source, count=1):
+    """
+        Увеличивает счетчик поиска по справочникам в рамках текущего запроса.
+
+        Аргументы:
+            source (str): 'memory' - значение найдено в кэше, 'db' - потребовался запрос к БД.
+            count (int): количество найденных значений.
+    """
+    if not count or not has_app_context():
+        return
+    lookups = g.setdefault('reference_lookups', {'memory': 0, 'db': 0})
+    lookups[source] += count
+
+
+def get_reference_lookups():
+    """Возвращает счетчики поиска по справочникам текущего запроса."""
+    if not has_app_context():
+        return {'memory': 0, 'db': 0}
+    return g.get('reference_lookups', {'memory': 0, 'db': 0})
+
+
+reference_cache = ReferenceCache(
+    reference_models,
+    check_interval=getattr(Config, 'REFERENCE_CACHE_CHECK_INTERVAL', 60),
+)
@@ -0,0 +1,184 @@
+import threading
+import time
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+
+# Границы корзин гистограмм
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STATEMENTS_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+ROWS_BUCKETS = (0, 10, 100, 1000, 10000, 100000, 1000000)
+BYTES_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+
+# Этапы обработки запроса в Server-Timing и в метке stage
+STAGES = ('db', 'transform', 'serialize', 'total')
+
+LABELS = ('namespace', 'route')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus: накопительные корзины, сумма и количество по набору меток."""
+
+    def __init__(self, name, documentation, buckets, labels):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}  # значения меток → [счетчики корзин..., +Inf], сумма
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for label_values, counts, total in series:
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{_format_number(bound)}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {_format_number(total)}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class RequestMetrics:
+    """
+        Метрики запросов уровня процесса: время этапов, SQL-запросы, прочитанные строки и размер ответа
+        по пространству имен и маршруту. При нескольких процессах WSGI каждый процесс отдает свои метрики.
+    """
+
+    def __init__(self):
+        self.seconds = Histogram(
+            'progspros_request_stage_seconds', 'Время этапа обработки запроса, с',
+            SECONDS_BUCKETS, LABELS + ('stage',),
+        )
+        self.statements = Histogram(
+            'progspros_request_sql_statements', 'SQL-запросов за запрос', STATEMENTS_BUCKETS, LABELS,
+        )
+        self.rows = Histogram('progspros_request_sql_rows', 'Строк, прочитанных из БД за запрос', ROWS_BUCKETS, LABELS)
+        self.response_bytes = Histogram('progspros_response_bytes', 'Размер ответа, байт', BYTES_BUCKETS, LABELS)
+
+    def observe(self, labels, timings, statements, rows, size):
+        for stage in STAGES:
+            self.seconds.observe(labels + (stage,), timings[stage])
+        self.statements.observe(labels, statements)
+        self.rows.observe(labels, rows)
+        if size is not None:
+            self.response_bytes.observe(labels, size)
+
+    def render(self):
+        """Возвращает метрики в текстовом формате Prometheus."""
+        lines = []
+        for histogram in (self.seconds, self.statements, self.rows, self.response_bytes):
+            lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+def _current():
+    if not has_app_context():
+        return None
+    return g.get('request_timings')
+
+
+def start_request():
+    """Начинает учет запроса: вызывается в before_request (если не выключено REQUEST_METRICS_ENABLED)."""
+    if not getattr(Config, 'REQUEST_METRICS_ENABLED', True):
+        return
+    g.request_timings = {'start': time.perf_counter(), 'statements': 0, 'db': 0.0, 'rows': 0, 'serialize': 0.0}
+
+
+def record_serialization(elapsed):
+    """Добавляет время сериализации ответа к текущему запросу."""
+    timings = _current()
+    if timings is not None:
+        timings['serialize'] += elapsed
+
+
+def route_labels():
+    """Метки запроса: пространство имен (первый сегмент маршрута) и маршрут."""
+    if request.url_rule is None:
+        return 'unmatched', 'unmatched'
+    rule = request.url_rule.rule
+    return rule.strip('/').split('/', 1)[0] or 'root', rule
+
+
+def finish_request(response):
+    """
+        Завершает учет запроса: добавляет заголовок Server-Timing и записывает метрики.
+        Вызывается в after_request.
+    """
+    timings = _current()
+    if timings is None:
+        return response
+
+    total = time.perf_counter() - timings['start']
+    stages = {
+        'db': timings['db'],
+        'serialize': timings['serialize'],
+        # Все, что не SQL и не сериализация: обработка данных в Python, pandas, формирование структуры
+        'transform': max(total - timings['db'] - timings['serialize'], 0.0),
+        'total': total,
+    }
+    size = response.calculate_content_length()
+
+    response.headers['Server-Timing'] = ', '.join([
+        f'db;dur={stages["db"] * 1000:.1f};desc="{timings["statements"]} statements, {timings["rows"]} rows"',
+        f'transform;dur={stages["transform"] * 1000:.1f}',
+        f'serialize;dur={stages["serialize"] * 1000:.1f}',
+        f'total;dur={total * 1000:.1f}',
+    ])
+    response.headers['Access-Control-Expose-Headers'] = ', '.join(filter(None, (
+        response.headers.get('Access-Control-Expose-Headers'), 'Server-Timing'
+    )))
+
+    request_metrics.observe(route_labels(), stages, timings['statements'], timings['rows'], size)
+    return response
+
+
+# Учет SQL: события движка database_ps.engine. Запросы вне контекста Flask (CLI, процессы выгрузки) не учитываются
+@event.listens_for(engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.request_metrics_start = time.perf_counter()
+
+
+@event.listens_for(engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current()
+    start = getattr(context, 'request_metrics_start', None)
+    if timings is None or start is None:
+        return
+    timings['statements'] += 1
+    timings['db'] += time.perf_counter() - start
+    # Для SELECT драйвер PostgreSQL сообщает количество строк; sqlite3 возвращает -1
+    if cursor.description is not None and cursor.rowcount > 0:
+        timings['rows'] += cursor.rowcount
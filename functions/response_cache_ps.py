@@ -0,0 +1,270 @@
+import hashlib
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+
+from flask import current_app, request
+from flask_caching.backends.base import BaseCache
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import cache
+from progSpros_back.functions.data_version_ps import data_version
+from progSpros_back.functions.filter_spec_ps import FILTER_PARAMS, FilterSpec
+from progSpros_back.functions.reference_cache_ps import reference_cache
+
+logger = logging.getLogger(__name__)
+
+# Параметры, которые уже учтены в FilterSpec.key
+FILTER_ARGS = set(FILTER_PARAMS) | {'global_filters'}
+
+# Заголовки, которые не сохраняются вместе с ответом
+SKIPPED_HEADERS = {'content-length', 'set-cookie', 'vary', 'etag'}
+
+
+def source_version():
+    """
+        Отпечаток исходного кода приложения по метаданным файлов (путь, размер, время изменения):
+        меняется при обновлении кода, в том числе формата ответов. Содержимое файлов не читается.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digest = hashlib.sha1()
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(name for name in dirs if not name.startswith(('.', '__')))
+        for name in sorted(files):
+            if name.endswith('.py'):
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                digest.update(f'{os.path.relpath(path, root)}:{stat.st_size}:{stat.st_mtime_ns}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def build_version():
+    """
+        Версия сборки в ключе кэша и ETag: BUILD_VERSION из конфигурации (задается при развертывании),
+        иначе отпечаток исходного кода. Вычисляется один раз, при первом кэшируемом запросе.
+    """
+    return getattr(Config, 'BUILD_VERSION', None) or source_version()
+
+
+class MemoryBoundedCache(BaseCache):
+    """
+        Бэкенд Flask-Caching в памяти процесса с вытеснением по объему (LRU).
+
+        Значения хранятся сериализованными (pickle), поэтому их размер известен точно.
+        Когда суммарный объем превышает max_bytes, вытесняются давно не использованные записи.
+        Прочие параметры бэкенда, которые передает Flask-Caching (CACHE_OPTIONS), не используются.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, default_timeout=300, ignore_delete_many_errors=False, **kwargs):
+        super().__init__(default_timeout=default_timeout, ignore_delete_many_errors=ignore_delete_many_errors)
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()  # key → (expires, data)
+        self._bytes = 0
+        self._evictions = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(dict(max_bytes=config.get('CACHE_MAX_BYTES', 256 * 1024 * 1024)))
+        kwargs.setdefault('default_timeout', config.get('CACHE_DEFAULT_TIMEOUT', 300))
+        return cls(*args, **kwargs)
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else 0
+
+    def _remove(self, key):
+        expires, data = self._entries.pop(key)
+        self._bytes -= len(data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires and expires <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key, value, timeout=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self._max_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._expires(timeout), data)
+            self._bytes += len(data)
+            while self._bytes > self._max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._evictions += 1
+        return True
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return False
+            self._remove(key)
+        return True
+
+    def has(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (not entry[0] or entry[0] > time.time())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        return True
+
+    def stats(self):
+        """Возвращает количество записей, занятый и максимальный объем, число вытеснений."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self._max_bytes,
+                'evictions': self._evictions,
+            }
+
+
+class ResponseCacheStats:
+    """Счетчики попаданий, промахов кэша ответов и ответов 304 (по маршрутам)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def count(self, route, outcome):
+        with self._lock:
+            counters = self._routes.setdefault(route, {'hit': 0, 'miss': 0, 'not_modified': 0})
+            counters[outcome] += 1
+
+    def to_dict(self):
+        with self._lock:
+            routes = {route: dict(counters) for route, counters in self._routes.items()}
+        hits = sum(counters['hit'] for counters in routes.values())
+        misses = sum(counters['miss'] for counters in routes.values())
+        return {
+            'hits': hits,
+            'misses': misses,
+            'not_modified': sum(counters['not_modified'] for counters in routes.values()),
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            'routes': routes,
+        }
+
+
+response_cache_stats = ResponseCacheStats()
+
+
+def response_cache_key(version):
+    """
+        Ключ кэша ответа: маршрут, FilterSpec.key, прочие параметры запроса, версия данных,
+        отпечаток справочников (имена в ответах берутся из них) и версия сборки.
+
+        Порядок значений прочих параметров сохраняется (например, shown_columns задает порядок колонок).
+    """
+    other_args = sorted(
+        (name, tuple(values)) for name, values in request.args.lists() if name not in FILTER_ARGS
+    )
+    raw = repr((request.path, FilterSpec.current().key, other_args, version, reference_cache.token(), build_version()))
+    return 'response:' + hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def cached_response(timeout=None):
+    """
+        Декоратор метода get() ресурса: кэширует ответ 200 во Flask-Caching и поддерживает ETag.
+
+        ETag строится из того же ключа, что и запись кэша, поэтому при совпадении If-None-Match
+        ответ 304 возвращается до выполнения SQL.
+
+        Аргументы:
+            timeout (int, необязательно): время жизни записи, по умолчанию CACHE_DEFAULT_TIMEOUT.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            route = request.url_rule.rule if request.url_rule else request.path
+            try:
+                key = response_cache_key(data_version.token())
+            except Exception:
+                logger.exception('Не удалось построить ключ кэша ответов')
+                return method(*args, **kwargs)
+            etag = key.split(':', 1)[1]
+
+            if request.if_none_match.contains(etag):
+                response_cache_stats.count(route, 'not_modified')
+                response = current_app.response_class(status=304)
+                return with_etag(response, etag)
+
+            cached = None
+            use_cache = getattr(Config, 'RESPONSE_CACHE_ENABLED', True)
+            if use_cache:
+                try:
+                    cached = cache.get(key)
+                except Exception:
+                    logger.exception('Кэш ответов недоступен')
+
+            if cached is not None:
+                response_cache_stats.count(route, 'hit')
+                response = current_app.response_class(
+                    cached['body'], status=cached['status'], headers=cached['headers'],
+                    mimetype=cached['mimetype'],
+                )
+                response.headers['X-Cache'] = 'HIT'
+                return with_etag(response, etag)
+
+            response_cache_stats.count(route, 'miss')
+            response = method(*args, **kwargs)
+            if getattr(response, 'status_code', None) == 200 and not response.direct_passthrough:
+                if use_cache:
+                    entry = {
+                        'status': response.status_code,
+                        'mimetype': response.mimetype,
+                        'headers': [(name, value) for name, value in response.headers.items()
+                                    if name.lower() not in SKIPPED_HEADERS],
+                        'body': response.get_data(),
+                    }
+                    try:
+                        cache.set(key, entry, timeout=timeout)
+                    except Exception:
+                        logger.exception('Не удалось сохранить ответ в кэш')
+                    response.headers['X-Cache'] = 'MISS'
+                with_etag(response, etag)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def with_etag(response, etag):
+    """Добавляет к ответу строгий ETag и заголовки, с которыми клиент перепроверяет ответ."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Access-Control-Expose-Headers'] = 'ETag'
+    return response
+
+
+def get_cache_stats():
+    """Возвращает счетчики кэша ответов и, если бэкенд их поддерживает, его заполненность."""
+    stats = response_cache_stats.to_dict()
+    backend = getattr(cache, 'cache', None)
+    if hasattr(backend, 'stats'):
+        stats['backend'] = backend.stats()
+    return stats
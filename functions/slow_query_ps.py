@@ -0,0 +1,239 @@
+import hashlib
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import wraps
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+
+logger = logging.getLogger(__name__)
+
+# Режимы SLOW_QUERY_EXPLAIN: 'plan' - план запроса (EXPLAIN без выполнения) при записи в журнал,
+# 'analyze' - кроме того, EXPLAIN (ANALYZE, BUFFERS) в фоновом потоке, один раз на отпечаток
+EXPLAIN_MODES = ('plan', 'analyze')
+
+# Нормализация текста запроса для отпечатка: параметры и литералы заменяются на ?, списки IN - на (...)
+FINGERPRINT_RULES = (
+    (re.compile(r'%\(\w+\)s|%s|:\w+|\$\d+'), '?'),
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+# Модули, которые пропускаются при поиске места выполнения запроса в стеке
+SKIPPED_MODULES = ('progSpros_back.functions.slow_query_ps', 'progSpros_back.functions.request_metrics_ps')
+
+
+def query_origin(function):
+    """
+        Декоратор функции, строящей запрос: запоминает имя функции в execution_options запроса
+        (query_origin), чтобы медленный запрос можно было связать с функцией, которая его построила.
+        Если запрос уже помечен (функция дополняет запрос другой функции), метка не меняется.
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        query = function(*args, **kwargs)
+        if hasattr(query, 'execution_options') and 'query_origin' not in query.get_execution_options():
+            query = query.execution_options(query_origin=function.__name__)
+        return query
+    return wrapper
+
+
+def fingerprint(statement):
+    """Отпечаток запроса: одинаков для запросов, которые отличаются только параметрами."""
+    normalized = statement
+    for pattern, replacement in FINGERPRINT_RULES:
+        normalized = pattern.sub(replacement, normalized)
+    return hashlib.sha1(normalized.strip().encode('utf-8')).hexdigest()[:16]
+
+
+def bound_sql(cursor, statement, parameters, context):
+    """Текст запроса с подставленными параметрами."""
+    # psycopg2 подставляет параметры так же, как при выполнении
+    mogrify = getattr(cursor, 'mogrify', None)
+    if mogrify is not None:
+        try:
+            sql = mogrify(statement, parameters)
+            return sql.decode('utf-8') if isinstance(sql, bytes) else sql
+        except Exception:
+            pass
+    compiled = getattr(context, 'compiled', None)
+    if compiled is not None and getattr(compiled, 'statement', None) is not None:
+        try:
+            return str(compiled.statement.compile(dialect=context.dialect, compile_kwargs={'literal_binds': True}))
+        except Exception:
+            pass
+    return f'{statement}\n-- parameters: {parameters!r}'
+
+
+def caller():
+    """Ближайшая функция проекта в стеке вызова (модуль.функция)."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get('__name__', '')
+        if module.startswith('progSpros_back.') and not module.startswith(SKIPPED_MODULES):
+            return f"{module.rsplit('.', 1)[-1]}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def explain(conn, cursor, statement, parameters):
+    """
+        Выполняет EXPLAIN запроса (без выполнения самого запроса) на том же соединении.
+
+        В открытой транзакции EXPLAIN выполняется в точке сохранения: ошибка не прерывает транзакцию
+        запроса. В режиме autocommit точка сохранения не нужна (и недоступна).
+    """
+    savepoint = conn.in_transaction() and not getattr(cursor.connection, 'autocommit', False)
+    with cursor.connection.cursor() as explain_cursor:
+        if savepoint:
+            explain_cursor.execute('SAVEPOINT slow_query_explain')
+        try:
+            explain_cursor.execute(f'EXPLAIN {statement}', parameters)
+            plan = '\n'.join(row[0] for row in explain_cursor.fetchall())
+        except Exception:
+            if savepoint:
+                explain_cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+            raise
+        if savepoint:
+            explain_cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+    return plan
+
+
+def explain_analyze(statement, parameters):
+    """
+        Выполняет EXPLAIN (ANALYZE, BUFFERS) запроса на отдельном соединении: запрос выполняется еще раз,
+        транзакция откатывается. Сам EXPLAIN в журнал медленных запросов не попадает.
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(slow_query_skip=True).exec_driver_sql(
+            f'EXPLAIN (ANALYZE, BUFFERS) {statement}', parameters
+        )
+        plan = '\n'.join(row[0] for row in result)
+        connection.rollback()
+    return plan
+
+
+class SlowQueryLog:
+    """
+        Журнал медленных запросов: кольцевой буфер последних max_entries запросов дольше threshold_ms.
+
+        Для каждого запроса хранятся отпечаток, текст с параметрами, функция, построившая запрос
+        (query_origin или ближайшая функция проекта в стеке), маршрут запроса Flask и, если включено
+        SLOW_QUERY_EXPLAIN, план выполнения. В режиме 'analyze' план с фактическим временем (analyze)
+        дописывается фоновым потоком. Журнал свой у каждого процесса.
+    """
+
+    def __init__(self, threshold_ms=1000, max_entries=200, explain_mode=None):
+        self.threshold_ms = threshold_ms
+        self.explain_mode = explain_mode
+        self._max_entries = max_entries
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+        self._analyzed = set()  # Отпечатки, для которых EXPLAIN ANALYZE уже поставлен в очередь
+        self._executor = None
+
+    def record(self, conn, cursor, statement, parameters, context, duration_ms):
+        origin = (context.execution_options.get('query_origin') if context is not None else None) or caller()
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(duration_ms, 1),
+            'fingerprint': fingerprint(statement),
+            'origin': origin,
+            'route': request.path if has_request_context() else None,
+            'rows': cursor.rowcount if cursor.description is not None else None,
+            'sql': bound_sql(cursor, statement, parameters, context),
+            'plan': None,
+            'analyze': None,
+        }
+        explainable = self.explain_mode in EXPLAIN_MODES and conn.dialect.name == 'postgresql' \
+            and statement.lstrip().upper().startswith(('SELECT', 'WITH'))
+        if explainable:
+            try:
+                entry['plan'] = explain(conn, cursor, statement, parameters)
+            except Exception as e:
+                logger.warning(f"Не удалось получить план медленного запроса {entry['fingerprint']}: {e}")
+        with self._lock:
+            self._entries.append(entry)
+            analyze = explainable and self.explain_mode == 'analyze' and entry['fingerprint'] not in self._analyzed
+            if analyze:
+                if len(self._analyzed) >= self._max_entries:
+                    self._analyzed.clear()
+                self._analyzed.add(entry['fingerprint'])
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-analyze')
+        if analyze:
+            self._executor.submit(self._analyze, entry, statement, parameters)
+        logger.warning(f"Медленный запрос {entry['fingerprint']} ({origin}): {entry['duration_ms']} мс")
+
+    def _analyze(self, entry, statement, parameters):
+        """Фоновая задача: EXPLAIN ANALYZE медленного запроса, результат дописывается в запись журнала."""
+        try:
+            plan = explain_analyze(statement, parameters)
+        except Exception as e:
+            logger.warning(f"Не удалось выполнить EXPLAIN ANALYZE медленного запроса {entry['fingerprint']}: {e}")
+            return
+        with self._lock:
+            entry['analyze'] = plan
+
+    def entries(self, fingerprint=None):
+        """Возвращает записи журнала, новые первыми (при указании отпечатка - только его записи)."""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        if fingerprint:
+            entries = [entry for entry in entries if entry['fingerprint'] == fingerprint]
+        return entries
+
+    def summary(self):
+        """Возвращает сводку по отпечаткам: количество, максимальное и суммарное время, функция."""
+        summary = {}
+        for entry in self.entries():
+            item = summary.setdefault(entry['fingerprint'], {
+                'origin': entry['origin'], 'count': 0, 'max_ms': 0, 'total_ms': 0,
+            })
+            item['count'] += 1
+            item['max_ms'] = max(item['max_ms'], entry['duration_ms'])
+            item['total_ms'] = round(item['total_ms'] + entry['duration_ms'], 1)
+        return summary
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=getattr(Config, 'SLOW_QUERY_THRESHOLD_MS', 1000),
+    max_entries=getattr(Config, 'SLOW_QUERY_BUFFER_SIZE', 200),
+    explain_mode=getattr(Config, 'SLOW_QUERY_EXPLAIN', None),
+)
+
+
+@event.listens_for(engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.slow_query_start = time.perf_counter()
+
+
+@event.listens_for(engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, 'slow_query_start', None)
+    if start is None or executemany or context.execution_options.get('slow_query_skip'):
+        return
+    duration_ms = (time.perf_counter() - start) * 1000
+    if duration_ms < slow_query_log.threshold_ms:
+        return
+    try:
+        slow_query_log.record(conn, cursor, statement, parameters, context, duration_ms)
+    except Exception:
+        logger.exception('Не удалось записать медленный запрос')
@@ -0,0 +1,48 @@
+import hashlib
+import logging
+import threading
+
+from flask import current_app, request
+
+from progSpros_back.functions.json_response_ps import dumps, json_response
+from progSpros_back.functions.response_cache_ps import with_etag
+
+logger = logging.getLogger(__name__)
+
+
+class SwaggerSpec:
+    """
+        Спецификация Swagger API Flask-RESTX, сериализованная один раз.
+
+        Flask-RESTX хранит спецификацию словарем и сериализует ее при каждом запросе /swagger.json.
+        Здесь JSON строится при первом запросе (после регистрации всех пространств имен)
+        и отдается из памяти с ETag: повторный запрос браузера получает 304.
+    """
+
+    def __init__(self, api):
+        self.api = api
+        self._lock = threading.Lock()
+        self._body = None
+        self._etag = None
+
+    def build(self):
+        """Строит JSON спецификации (в контексте запроса: базовый путь берется из запроса)."""
+        with self._lock:
+            if self._body is None:
+                schema = self.api.__schema__
+                if 'error' in schema:
+                    # Ошибка построения не сохраняется: следующий запрос построит спецификацию заново
+                    return None
+                self._body = dumps(schema)
+                self._etag = hashlib.sha1(self._body).hexdigest()
+                logger.info(f"Спецификация Swagger: {len(self._body)} байт")
+        return self._body
+
+    def view(self):
+        """Обработчик /swagger.json вместо SwaggerView Flask-RESTX."""
+        body = self._body if self._body is not None else self.build()
+        if body is None:
+            return json_response(self.api.__schema__, 500)
+        if request.if_none_match.contains(self._etag):
+            return with_etag(current_app.response_class(status=304), self._etag)
+        return with_etag(json_response(body=body), self._etag)
@@ -4,7 +4,7 @@ from datetime import datetime
 from sqlalchemy import inspect
 from progSpros_back.database_ps import db
 from flask import g
-from progSpros_back.functions.query_functions_ps import mapping_query
+from progSpros_back.functions.reference_cache_ps import reference_cache
 
 def create_filter_params(request):
     """
@@ -108,21 +108,24 @@ def find_max_value(data):
 def create_structure(name, data, version_mapping, result=None):
     if result is None:
         result = {}
-    # Получить структуру
-    initialize_structure(name, data, result)
-    # Обновить по меппингу ключи версий
-    result = substitute_in_json(result, version_mapping)
+    # Получить структуру; ключи версий и имена заменяются по меппингу при заполнении,
+    # без обхода готовой структуры (substitute_in_json)
+    initialize_structure(name, data, result, version_mapping)
     return result
-def initialize_structure(name, data, result):
+def initialize_structure(name, data, result, mapping=None):
     """Инициализация структуры со значениями по умолчанию
 
     Аргументы:
         name (str):  базовое имя для записей в структуре
         data (list): Список, содержащих записи данных.
         result (dict): Данные, которые должны быть заполнены значениями.
+        mapping (dict, необязательно): замена строковых значений (как в substitute_in_json).
 
     """
+    mapping = mapping or {}
     for year, vers, potr, summ in data:
+        vers = mapping.get(vers, vers) if isinstance(vers, str) else vers
+        potr = mapping.get(potr, potr) if isinstance(potr, str) else potr
         if year not in result:
             result[year] = {'sum_year': 0}
         if vers not in result[year]:
@@ -141,21 +144,23 @@ def initialize_structure(name, data, result):
 def create_structure_fo(name, name_cat, data, version_mapping, result=None):
     if result is None:
         result = {}
-    # Получить структуру
-    initialize_structure_fo(name, data, result, name_cat)
-    # Обновить по меппингу ключи версий
-    result = substitute_in_json(result, version_mapping)
+    # Получить структуру; значения заменяются по меппингу при заполнении
+    initialize_structure_fo(name, data, result, name_cat, version_mapping)
     return result
-def initialize_structure_fo(name, data, result, name_cat):
+def initialize_structure_fo(name, data, result, name_cat, mapping=None):
     """Инициализация структуры со значениями по умолчанию
 
     Аргументы:
         name (str):  базовое имя для записей в структуре
         data (list): Список, содержащих записи данных.
         result (dict): Данные, которые должны быть заполнены значениями.
+        mapping (dict, необязательно): замена строковых значений (как в substitute_in_json).
 
     """
+    mapping = mapping or {}
     for fo, otr, summ in data:
+        fo = mapping.get(fo, fo) if isinstance(fo, str) else fo
+        otr = mapping.get(otr, otr) if isinstance(otr, str) else otr
         if fo not in result:
             result[fo] = {'sum_fo': 0, name_cat: []}
             i = 0
@@ -203,13 +208,21 @@ def set_db_connection():
     return g.session
 
 def mapping(map):
-    # db = set_db_connection()
-    base_query = db.query(map)
-    query = mapping_query(base_query, map)
-
-    result = {}
-    for row in query:
-        if row.id not in result:
-            result[row.id] = row.name
-    return result
+    """
+        Возвращает мэппинг справочника id → name из кэша справочников процесса.
+
+        Аргументы:
+            map: класс модели справочника (Otrasl, VersProgn, ...).
+
+        Возвращается:
+            dict: Словарь id → name (без служебного id 19), упорядоченный по name.
+    """
+    return dict(reference_cache.forward(map))
+
+def reverse_mapping(map):
+    """
+        Возвращает обратный мэппинг справочника name → id из кэша справочников процесса.
+        Словарь общий для всех запросов и не должен изменяться.
+    """
+    return reference_cache.reverse(map)
 
@@ -0,0 +1,77 @@
+from collections import namedtuple
+from tempfile import SpooledTemporaryFile
+
+from progSpros_back.config_ps import Config
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Колонка выгрузки: заголовок, ширина и формат числа (None - формат по умолчанию)
+XlsxColumn = namedtuple('XlsxColumn', 'title width number_format', defaults=(None, None))
+
+
+def write_xlsx(columns, rows, sheet_title='Sheet1'):
+    """
+        Записывает строки в книгу Excel за один проход (режим write-only openpyxl).
+
+        Строки не хранятся в памяти: openpyxl пишет лист во временный файл, а итоговая книга
+        собирается в SpooledTemporaryFile, который уходит на диск после XLSX_SPOOL_MAX_BYTES.
+
+        Аргументы:
+            columns (list): колонки XlsxColumn.
+            rows (iterable): последовательности значений в порядке колонок.
+            sheet_title (str): имя листа.
+
+        Возвращается:
+            SpooledTemporaryFile: книга, позиция в начале файла.
+    """
+    # openpyxl импортируется при первой выгрузке: процессам, которые отдают только JSON, он не нужен
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_title)
+
+    # В режиме write-only ширины задаются до записи строк
+    for index, column in enumerate(columns, start=1):
+        if column.width is not None:
+            sheet.column_dimensions[get_column_letter(index)].width = column.width
+
+    # Стиль заголовка как у DataFrame.to_excel: жирный, по центру, в тонкой рамке
+    header_font = Font(bold=True)
+    header_alignment = Alignment(horizontal='center', vertical='top')
+    header_border = Border(*(Side(style='thin'),) * 4)
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(sheet, value=column.title)
+        cell.font = header_font
+        cell.alignment = header_alignment
+        cell.border = header_border
+        header.append(cell)
+    sheet.append(header)
+
+    formats = [column.number_format for column in columns]
+    if any(formats):
+        for row in rows:
+            cells = []
+            for value, number_format in zip(row, formats):
+                if number_format is None:
+                    cells.append(value)
+                else:
+                    cell = WriteOnlyCell(sheet, value=value)
+                    cell.number_format = number_format
+                    cells.append(cell)
+            sheet.append(cells)
+    else:
+        for row in rows:
+            sheet.append(list(row))
+
+    buffer = SpooledTemporaryFile(max_size=getattr(Config, 'XLSX_SPOOL_MAX_BYTES', 8 * 1024 * 1024))
+    try:
+        workbook.save(buffer)
+    except Exception:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
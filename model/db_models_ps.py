@@ -1,7 +1,6 @@
 from datetime import datetime
 
-from sqlalchemy import Column, Integer, String, Numeric, Text, PrimaryKeyConstraint
-from sqlalchemy.dialects.mysql import DATETIME
+from sqlalchemy import Column, Integer, String, Numeric, Text, PrimaryKeyConstraint, Index, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 
 # Создание основного класса
@@ -9,7 +8,13 @@ Base = declarative_base()
 
 class PSDATA(Base):
     __tablename__ = 'tab_progn_spr_gaz_d314'
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        # Запросы графиков: date = и year =/BETWEEN/IN, фильтр по вероятности реализации
+        Index('ix_tab_progn_spr_gaz_d314_date_year_vers', 'date', 'year', 'tab_ver_real_pr_d314_ids'),
+        # Отчет ots_pr_spr (диапазон лет без даты) и список лет
+        Index('ix_tab_progn_spr_gaz_d314_year', 'year'),
+        {'schema': 'public'},
+    )
 
     # Поля описываются точно как в QUERY:
     id = Column(Integer, primary_key=True)
@@ -34,11 +39,15 @@ class PSDATA(Base):
     post = Column(Integer)  # Ключ к Поставщик
     tab_proizvoditel_d314_ids = Column(Integer)  # Ключ к Производитель
     tab_start_gaz_d314_ids = Column(Integer)  # Ключ к Начало отбора
-    date = Column(DATETIME)
+    date = Column(DateTime)
 
 class Prirost(Base):
     __tablename__ = 'tab_prirost_d314'
-    __table_args__ = {'schema': 'public'}
+    __table_args__ = (
+        # big_invest_query_potr: yearfrom =, yearto =, date =
+        Index('ix_tab_prirost_d314_yearfrom_yearto_date', 'yearfrom', 'yearto', 'date'),
+        {'schema': 'public'},
+    )
 
     # Поля описываются точно как в QUERY:
     id = Column(Integer, primary_key=True)
@@ -56,7 +65,40 @@ class Prirost(Base):
     tab_start_gaz_d314_ids = Column(Integer)  # Ключ к Начало отбора
     yearfrom = Column(Integer)  # Ключ к Год
     yearto = Column(Integer)  # Ключ к Год
-    date = Column(DATETIME)
+    date = Column(DateTime)
+
+class PSCube(Base):
+    # Агрегат tab_progn_spr_gaz_d314 по измерениям запросов графиков (пересобирается после загрузки)
+    __tablename__ = 'tab_progn_spr_gaz_cube_d314'
+    __table_args__ = (
+        Index('ix_tab_progn_spr_gaz_cube_d314_date_year_vers', 'date', 'year', 'tab_ver_real_pr_d314_ids'),
+        {'schema': 'public'},
+    )
+
+    id = Column(Integer, primary_key=True)
+    tab_fo_d314_ids = Column(Integer)  # Ключ к Федеральный округ
+    tab_region_d314_ids = Column(Integer)  # Ключ к Регион
+    tab_otrasl_economy_d314_ids = Column(Integer)  # Ключ к Отрасль
+    tab_contragent_d314_ids = Column(Integer)  # Ключ к Потребитель
+    tab_group_post_d314_ids = Column(Integer)  # Ключ к Группа поставщиков
+    tab_dogovor_visual_d314_ids = Column(Integer)  # Ключ к Договор
+    tab_tu_visual_d314_ids = Column(Integer)  # Ключ к ТУ
+    tab_infr_d314_ids = Column(Integer)  # Ключ к Наличие инфраструктуры
+    tab_ver_real_pr_d314_ids = Column(Integer)  # Ключ к Вероятность реализации проекта
+    tab_proizvoditel_d314_ids = Column(Integer)  # Ключ к Производитель
+    year = Column(Integer)  # Ключ к Год
+    date = Column(DateTime)
+    summ = Column(Numeric)  # Сумма по строкам tab_progn_spr_gaz_d314
+    row_count = Column(Integer)  # Количество строк tab_progn_spr_gaz_d314
+
+class PSCubeBuild(Base):
+    # Журнал пересборки tab_progn_spr_gaz_cube_d314: итоги tab_progn_spr_gaz_d314 за дату загрузки на момент пересборки
+    __tablename__ = 'tab_progn_spr_gaz_cube_build_d314'
+    __table_args__ = {'schema': 'public'}
+    date = Column(DateTime, primary_key=True)  # Дата загрузки
+    row_count = Column(Integer)  # Строк tab_progn_spr_gaz_d314
+    summ = Column(Numeric)  # Сумма summ tab_progn_spr_gaz_d314
+    built_at = Column(DateTime, default=datetime.now)  # Время пересборки
 
 class FedState(Base):
     __tablename__ = 'tab_fo_d314'
@@ -148,6 +190,35 @@ class Infr(Base):
     id = Column(Integer, primary_key=True)
     name = Column(Text, unique=True)
 
+class LoadGeneration(Base):
+    # Номер загрузки таблиц данных: увеличивается загрузчиком после каждой загрузки
+    __tablename__ = 'tab_load_generation_d314'
+    __table_args__ = {'schema': 'public'}
+    table_name = Column(String, primary_key=True)  # Имя таблицы данных
+    generation = Column(Integer, nullable=False, default=0)  # Номер загрузки
+    updated_at = Column(DateTime, default=datetime.now)  # Время последней загрузки
+
+class PrirostBuild(Base):
+    # Журнал построения tab_prirost_d314 из tab_progn_spr_gaz_d314: построенные пары лет по датам загрузки
+    __tablename__ = 'tab_prirost_build_d314'
+    __table_args__ = (
+        PrimaryKeyConstraint('date', 'yearfrom', 'yearto'),
+        {'schema': 'public'},
+    )
+    date = Column(DateTime)  # Дата загрузки
+    yearfrom = Column(Integer)  # Год начала
+    yearto = Column(Integer)  # Год окончания
+    row_count = Column(Integer)  # Строк tab_prirost_d314
+    built_at = Column(DateTime, default=datetime.now)  # Время построения
+
+class SchemaVersion(Base):
+    # Примененные миграции схемы (model/migrations_ps.py)
+    __tablename__ = 'tab_schema_version_d314'
+    __table_args__ = {'schema': 'public'}
+    version = Column(Integer, primary_key=True)  # Номер миграции
+    description = Column(Text)  # Описание миграции
+    applied_at = Column(DateTime, default=datetime.now)  # Время применения
+
 # Определить эталонные модели и их атрибуты. Поля можно задать без _ids
 reference_models = {
     'TAB_FO_D314': FedState,
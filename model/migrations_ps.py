@@ -0,0 +1,208 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import insert, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+
+from progSpros_back.model.db_models_ps import Base, LoadGeneration, PSDATA, Prirost, PrirostBuild, PSCube, PSCubeBuild, SchemaVersion
+
+logger = logging.getLogger(__name__)
+
+# Миграция схемы: номер, описание, функция apply(connection) и признак выполнения в транзакции.
+# Миграция без транзакции получает соединение в режиме autocommit и должна быть повторяемой
+Migration = namedtuple('Migration', 'version description apply transactional', defaults=(True,))
+
+
+def create_tables(connection):
+    Base.metadata.create_all(bind=connection)
+
+
+def create_model_tables(*models):
+    """Миграция, создающая таблицы моделей (уже существующие таблицы пропускаются)."""
+    def apply(connection):
+        for model in models:
+            model.__table__.create(bind=connection, checkfirst=True)
+    return apply
+
+
+def model_indexes():
+    """Индексы, объявленные в моделях таблиц прогноза: имя → Index."""
+    return {index.name: index for model in (PSDATA, Prirost, PSCube) for index in model.__table__.indexes}
+
+
+def create_index(connection, index):
+    """
+        Создает индекс, если его нет. В PostgreSQL - CREATE INDEX CONCURRENTLY: запись в таблицу
+        (в том числе загрузка прогноза) не блокируется на время построения. Соединение должно быть
+        в режиме autocommit; недостроенный (invalid) индекс прерванного построения удаляется и строится заново.
+    """
+    if connection.dialect.name != 'postgresql':
+        index.create(bind=connection, checkfirst=True)
+        return
+    schema = connection.schema_for_object(index.table)
+    invalid = connection.execute(text(
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE c.relname = :name AND n.nspname = :schema AND NOT i.indisvalid"
+    ), {'name': index.name, 'schema': schema or 'public'}).first()
+    if invalid:
+        logger.warning(f"Индекс {index.name} не достроен: удаляется и строится заново")
+        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema or "public"}"."{index.name}"'))
+    options = index.dialect_options['postgresql']
+    options['concurrently'] = True
+    try:
+        index.create(bind=connection, checkfirst=True)
+    finally:
+        options['concurrently'] = False
+
+
+def create_indexes(*names):
+    """Миграция (без транзакции), создающая индексы моделей по именам (существующие индексы пропускаются)."""
+    def apply(connection):
+        indexes = model_indexes()
+        for name in names:
+            logger.info(f"Создание индекса {name}")
+            create_index(connection, indexes[name])
+    return apply
+
+
+def seed_load_generations(*models):
+    """Миграция, создающая номера загрузки таблиц данных (версия данных читается без сканирования таблиц)."""
+    def apply(connection):
+        LoadGeneration.__table__.create(bind=connection, checkfirst=True)
+        existing = set(connection.execute(select(LoadGeneration.table_name)).scalars())
+        rows = [
+            {'table_name': model.__tablename__, 'generation': 1, 'updated_at': datetime.now()}
+            for model in models if model.__tablename__ not in existing
+        ]
+        if rows:
+            connection.execute(insert(LoadGeneration), rows)
+    return apply
+
+
+# Индексы под фильтры запросов: графики (date, year), отчет ots_pr_spr (year), big_invest (yearfrom, yearto, date)
+FORECAST_INDEXES = (
+    'ix_tab_progn_spr_gaz_d314_date_year_vers',
+    'ix_tab_progn_spr_gaz_d314_year',
+    'ix_tab_prirost_d314_yearfrom_yearto_date',
+    'ix_tab_progn_spr_gaz_cube_d314_date_year_vers',
+)
+
+# Миграции применяются по возрастанию номера; примененную миграцию не изменяют - добавляют новую
+MIGRATIONS = (
+    Migration(1, 'Таблицы моделей', create_tables),
+    Migration(2, 'Индексы таблиц прогноза под фильтры date, year и yearfrom/yearto', create_indexes(*FORECAST_INDEXES),
+              transactional=False),
+    Migration(3, 'Журнал построения tab_prirost_d314', create_model_tables(PrirostBuild)),
+    Migration(4, 'Номера загрузки tab_progn_spr_gaz_d314 и tab_prirost_d314', seed_load_generations(PSDATA, Prirost)),
+    Migration(5, 'Журнал пересборки tab_progn_spr_gaz_cube_d314', create_model_tables(PSCubeBuild)),
+)
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(connection):
+    """Возвращает номер последней примененной миграции (0 - схема не управлялась)."""
+    # Схема с учетом schema_translate_map движка (в SQLite схемы public нет)
+    schema = connection.schema_for_object(SchemaVersion.__table__)
+    if not inspect(connection).has_table(SchemaVersion.__tablename__, schema=schema):
+        return 0
+    versions = connection.execute(select(SchemaVersion.version)).scalars().all()
+    return max(versions, default=0)
+
+
+def pending_migrations(engine):
+    """Возвращает миграции, которые еще не применены."""
+    with engine.connect() as connection:
+        version = current_version(connection)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+def upgrade(engine, target=None):
+    """
+        Применяет миграции до версии target (по умолчанию - до последней).
+
+        Каждая миграция выполняется в своей транзакции вместе с записью в tab_schema_version_d314,
+        поэтому прерванное обновление продолжается с первой непримененной миграции. Миграция без
+        транзакции (CREATE INDEX CONCURRENTLY) выполняется в соединении autocommit, а ее номер
+        записывается после нее: прерванная миграция выполняется повторно.
+
+        Возвращается:
+            list: примененные миграции.
+    """
+    target = LATEST_VERSION if target is None else target
+    applied = []
+    for migration in pending_migrations(engine):
+        if migration.version > target:
+            break
+        logger.info(f"Миграция {migration.version}: {migration.description}")
+        if not migration.transactional:
+            with engine.connect() as connection:
+                migration.apply(connection.execution_options(isolation_level='AUTOCOMMIT'))
+        with engine.begin() as connection:
+            SchemaVersion.__table__.create(bind=connection, checkfirst=True)
+            if migration.transactional:
+                migration.apply(connection)
+            connection.execute(insert(SchemaVersion).values(
+                version=migration.version, description=migration.description, applied_at=datetime.now(),
+            ))
+        applied.append(migration)
+    return applied
+
+
+def ensure_schema(engine, auto_migrate=False):
+    """
+        Проверяет схему БД по номеру миграции в tab_schema_version_d314.
+
+        Если схема актуальна, больше ничего не выполняется (без create_all и чтения каталога по таблицам).
+        Иначе применяются миграции (auto_migrate) или, как раньше, создаются недостающие таблицы
+        и выводится предупреждение о непримененных миграциях.
+
+        Возвращается:
+            list: непримененные миграции до проверки.
+    """
+    pending = pending_migrations(engine)
+    if not pending:
+        return pending
+    if auto_migrate:
+        upgrade(engine)
+    else:
+        Base.metadata.create_all(bind=engine)
+        logger.warning(f"Схема БД отстает: не применены миграции {[migration.version for migration in pending]}. "
+                       f"Выполните flask --app Progn_Spros_app db-upgrade")
+    return pending
+
+
+class SchemaCheck:
+    """
+        Отложенная проверка схемы (ensure_schema): выполняется один раз при первом запросе,
+        поэтому процесс стартует без обращения к БД. Если БД недоступна, запрос обрабатывается
+        как обычно, а проверка повторяется не чаще, чем раз в retry_seconds.
+    """
+
+    def __init__(self, engine, auto_migrate=False, retry_seconds=30):
+        self.engine = engine
+        self.auto_migrate = auto_migrate
+        self.retry_seconds = retry_seconds
+        self.done = False
+        self._failed_at = None
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        if self.done:
+            return
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_seconds:
+            return
+        with self._lock:
+            if self.done:
+                return
+            try:
+                ensure_schema(self.engine, self.auto_migrate)
+            except DBAPIError as e:
+                self._failed_at = time.monotonic()
+                logger.error(f"Проверка схемы БД не выполнена, повтор через {self.retry_seconds} с: {e}")
+                return
+            self.done = True
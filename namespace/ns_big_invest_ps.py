@@ -1,21 +1,49 @@
-﻿from decimal import Decimal
+﻿import base64
+import binascii
+import json
+from decimal import Decimal, InvalidOperation
 from datetime import datetime
 from sqlalchemy import func, select, and_, distinct, or_
-from flask import jsonify, session, request
+from flask import session, request
 from flask_restx import Namespace, Resource
 # Import the database session
 from progSpros_back.database_ps import db, cache, errorhandler
-from progSpros_back.functions.chart_data_functions_ps import apply_dynamic_filters
-from progSpros_back.functions.query_functions_ps import big_invest_query_potr, query_prirost_potr_table
-from progSpros_back.functions.utility_functions_ps import create_filter_params, substitute_in_json, sum_prirost, \
-    set_db_connection, mapping, to_date
+from progSpros_back.functions.json_response_ps import json_response
+from progSpros_back.functions.response_cache_ps import cached_response
+from progSpros_back.functions.filter_spec_ps import FilterSpec
+from progSpros_back.functions.prirost_builder_ps import prirost_source
+from progSpros_back.functions.query_functions_ps import BIG_INVEST_ORDER, big_invest_query_potr, big_invest_page, \
+    query_prirost_potr_table
+from progSpros_back.functions.utility_functions_ps import substitute_in_json, sum_prirost, \
+    set_db_connection, to_date
 from progSpros_back.model.db_models_ps import Prirost, reference_models, Otrasl, FedState, Regions, GroupPost, \
     Contragent, StPotr, StGaz, PG, Dogovor, TU, Infr, VersProgn
-from progSpros_back.model.mappings_ps import yn_mapping
 
 # Define the namespace
 ns_big_invest_ps = Namespace('BigInvest', description='Крупные инвестиционные проекты')
 
+# Количество проектов на странице
+PAGE_SIZE = 101
+
+
+def page_cursor(row):
+    """Курсор следующей страницы: значения BIG_INVEST_ORDER последней строки (JSON в base64url)."""
+    values = [str(row.prirost), *(getattr(row, name) for name in BIG_INVEST_ORDER[1:])]
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode('utf-8')).decode('ascii')
+
+
+def parse_after(after):
+    """Разбирает курсор страницы, построенный page_cursor."""
+    if not after:
+        return None
+    try:
+        prirost, *names = json.loads(base64.urlsafe_b64decode(after.encode('ascii')))
+        if len(names) != len(BIG_INVEST_ORDER) - 1 or not all(name is None or isinstance(name, str) for name in names):
+            raise ValueError
+        return (Decimal(prirost), *names)
+    except (ValueError, TypeError, UnicodeError, binascii.Error, InvalidOperation):
+        raise ValueError(f"after: {after}")
+
 # Рут для очистки данных сессии
 @ns_big_invest_ps.route('/clear_session_flask')
 @ns_big_invest_ps.response(200, 'True: session cleared')  # Ответ при успешной очистке
@@ -39,10 +67,12 @@ class ClearSession(Resource):
     'dogovor': {'description': 'Договор', 'in': 'query', 'type': 'string'},
     'tu': {'description': 'ТУ', 'in': 'query', 'type': 'string'},
     'infr': {'description': 'Инфраструктура', 'in': 'query', 'type': 'string'},
-    'date': {'description': 'Дата загрузки', 'in': 'query', 'type': 'to_date'}
+    'date': {'description': 'Дата загрузки', 'in': 'query', 'type': 'to_date'},
+    'after': {'description': 'Следующая страница: значение next предыдущего ответа', 'in': 'query', 'type': 'string'}
     })
 
 class BigInvest(Resource):
+    @cached_response()
     def get(self):
         """
         Возвращает данные для карты
@@ -51,94 +81,36 @@ class BigInvest(Resource):
         """
         try:
             #db = set_db_connection()
-            # Получить фильтр-параметры из запроса
-            filter_params = create_filter_params(request)
-            # Если не заданы глобальные параметры, взять их из session
-            if not filter_params:
-                filter_params = session.get('filter_params')
-
-            # Определите базовый запрос с помощью динамических фильтров
-            base_query = db.query(Prirost)
-            base_query = apply_dynamic_filters(base_query, Prirost, filter_params, db, reference_models)
-
-            # Мэппинги из справочников
-            otr_mapping = mapping(Otrasl)
-            vers_mapping = mapping(VersProgn)
-            grpost_mapping = mapping(GroupPost)
-            fo_mapping = mapping(FedState)
-            region_mapping = mapping(Regions)
+            # Фильтры запроса (global_filters, session и параметры otrasl, vers, grpost, fo, region, ...)
+            filter_spec = FilterSpec.current()
 
             yearfrom = request.args.get('yearfrom', 2023, type=int)
             yearto = request.args.get('yearto', 2034, type=int)
             sum_pr = request.args.get('sum_pr', 0, type=int)
-
             date = request.args.get('date', type=to_date)
 
-            # Параметры Отрасль
-            reverse_otr_mapping = {value: key for key, value in otr_mapping.items()}
-            otr = [company.strip() for item in request.args.getlist('otrasl', None) for company in item.split(',')]
-            mapped_otr = [reverse_otr_mapping.get(company, company) for company in otr]
-            if otr:
-                base_query = base_query.filter((Prirost.tab_otrasl_economy_d314_ids.in_(mapped_otr)))
-
-            # Параметры Версия прогноза
-            reverse_vers_mapping = {value: key for key, value in vers_mapping.items()}
-            vers = [company.strip() for item in request.args.getlist('vers', None) for company in item.split(',')]
-            mapped_vers = [reverse_vers_mapping.get(company, company) for company in vers]
-            if vers:
-                base_query = base_query.filter((Prirost.tab_ver_real_pr_d314_ids.in_(mapped_vers)))
-
-            # Параметры Группа поставщиков
-            reverse_grpost_mapping = {value: key for key, value in grpost_mapping.items()}
-            grpost = [company.strip() for item in request.args.getlist('grpost', None) for company in item.split(',')]
-            mapped_grpost = [reverse_grpost_mapping.get(company, company) for company in grpost]
-            if grpost:
-                base_query = base_query.filter((Prirost.tab_group_post_d314_ids.in_(mapped_grpost)))
-
-            # Параметры Федеральный округ
-            reverse_fo_mapping = {value: key for key, value in fo_mapping.items()}
-            fo = [company.strip() for item in request.args.getlist('fo', None) for company in item.split(',')]
-            mapped_fo = [reverse_fo_mapping.get(company, company) for company in fo]
-            if fo:
-                base_query = base_query.filter((Prirost.tab_fo_d314_ids.in_(mapped_fo)))
-
-            # Параметры Регион
-            reverse_region_mapping = {value: key for key, value in region_mapping.items()}
-            region = [company.strip() for item in request.args.getlist('region', None) for company in item.split(',')]
-            mapped_region = [reverse_region_mapping.get(company, company) for company in region]
-            if region:
-                base_query = base_query.filter((Prirost.tab_region_d314_ids.in_(mapped_region)))
-
-            # Параметры Договор
-            reverse_dog_mapping = {value: key for key, value in yn_mapping.items()}
-            dogovor = [company.strip() for item in request.args.getlist('dogovor', None) for company in item.split(',')]
-            mapped_dog = [reverse_dog_mapping.get(company, company) for company in dogovor]
-            if dogovor:
-                base_query = base_query.filter((Prirost.tab_dogovor_visual_d314_ids.in_(mapped_dog)))
-
-            # Параметры ТУ
-            reverse_tu_mapping = {value: key for key, value in yn_mapping.items()}
-            tu = [company.strip() for item in request.args.getlist('tu', None) for company in item.split(',')]
-            mapped_tu = [reverse_tu_mapping.get(company, company) for company in tu]
-            if tu:
-                base_query = base_query.filter((Prirost.tab_tu_visual_d314_ids.in_(mapped_tu)))
-
-            # Параметры Инфраструктура
-            reverse_infr_mapping = {value: key for key, value in yn_mapping.items()}
-            infr = [company.strip() for item in request.args.getlist('infr', None) for company in item.split(',')]
-            mapped_infr = [reverse_infr_mapping.get(company, company) for company in infr]
-            if infr:
-                base_query = base_query.filter((Prirost.tab_infr_d314_ids.in_(mapped_infr)))
-                from sqlalchemy.dialects import postgresql
+            # Прирост из tab_prirost_d314 или, если пара лет не построена, рассчитанный из tab_progn_spr_gaz_d314
+            prirost = prirost_source(date, yearfrom, yearto)
+
+            # Определите базовый запрос с помощью фильтров
+            base_query = filter_spec.apply(db.query(prirost), prirost)
+
+            after = parse_after(request.args.get('after'))
 
             # Продолжить создавать основной запрос
-            query = big_invest_query_potr(base_query, Prirost, Otrasl, FedState, Regions, GroupPost, StPotr, StGaz, Infr,
+            query = big_invest_query_potr(base_query, prirost, Otrasl, FedState, Regions, GroupPost, StPotr, StGaz, Infr,
                                      Dogovor, TU, yearfrom, yearto, Contragent, date)
+            # Порог прироста и страница применяются в SQL; лишняя строка показывает, есть ли следующая страница
+            rows = big_invest_page(query, prirost, sum_pr, PAGE_SIZE + 1, after).all()
+            next_after = None
+            if len(rows) > PAGE_SIZE:
+                rows = rows[:PAGE_SIZE]
+                next_after = page_cursor(rows[-1])
+
             title = f"Крупные инвестиционные проекты"
             # Создать структуру вывода для Json
             result = []
-            i = 0
-            for row in query:
+            for row in rows:
 
                 if row.dogovor == 'V':
                     dog = True
@@ -155,38 +127,29 @@ class BigInvest(Resource):
                 else:
                     tu = False
 
-                if float(row.prirost) >= sum_pr and float(row.prirost) != 0:
-                    result_dict ={'fo': row.fo,
-                                  'reg': row.region,
-                                  'grp': row.grpost,
-                                  'otrasl': row.otrasl,
-                                  'stp': row.stpotr,
-                                  'st': row.stgaz,
-                                  'pg': infr,
-                                  'dog': dog,
-                                  'tu': tu,
-                                  'prirost': float(row.prirost),
-                                  'contragent': row.contragent
-                             }
-
-                    result.append(result_dict)
-                    i += 1
-                if i > 100:
-                    break
-
-            def get_prirost(element):
-                return element['prirost']
-            
-            result.sort(key=get_prirost, reverse=True)
-            
+                result_dict ={'fo': row.fo,
+                              'reg': row.region,
+                              'grp': row.grpost,
+                              'otrasl': row.otrasl,
+                              'stp': row.stpotr,
+                              'st': row.stgaz,
+                              'pg': infr,
+                              'dog': dog,
+                              'tu': tu,
+                              'prirost': float(row.prirost),
+                              'contragent': row.contragent
+                         }
+
+                result.append(result_dict)
+
             graph_data = {
                 "title": title,
-                "data": result
+                "data": result,
+                "next": next_after
                 }
 
                 #            return jsonify(graph_data)
-            response = jsonify(graph_data)
-            response.headers.add('Access-Control-Allow-Origin', '*')
+            response = json_response(graph_data)
 
             return response
 
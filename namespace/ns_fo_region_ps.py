@@ -1,13 +1,14 @@
 ﻿from decimal import Decimal
 from datetime import datetime
 from sqlalchemy import func, select, and_, distinct, or_
-from flask import jsonify, session, request
+from flask import session, request
 from flask_restx import Namespace, Resource
 # Import the database session
 from progSpros_back.database_ps import db, cache, errorhandler
-from progSpros_back.functions.chart_data_functions_ps import apply_dynamic_filters
+from progSpros_back.functions.json_response_ps import json_response
+from progSpros_back.functions.filter_spec_ps import FilterSpec
 from progSpros_back.functions.query_functions_ps import fo_region_query
-from progSpros_back.functions.utility_functions_ps import create_filter_params, set_db_connection, mapping
+from progSpros_back.functions.utility_functions_ps import set_db_connection
 from progSpros_back.model.db_models_ps import PSDATA, reference_models, FedState, Regions
 
 # Define the namespace
@@ -25,28 +26,12 @@ class FORegionDATA(Resource):
         Возвращает регионы в зависимости от выбранного округа
         """
         try:
-            # Мэппинги из справочников
-            fo_mapping = mapping(FedState)
-            region_mapping = mapping(Regions)
-
             #db = set_db_connection()
-            # Получить фильтр-параметры из запроса
-            filter_params = create_filter_params(request)
-
-            # Если не заданы глобальные параметры, взять их из session
-            if not filter_params:
-                filter_params = session.get('filter_params')
-
-            # Определите базовый запрос с помощью динамических фильтров
-            base_query = db.query(Regions)
-            base_query = apply_dynamic_filters(base_query, Regions, filter_params, db, reference_models)
+            # Фильтры запроса (global_filters, session и параметры otrasl, vers, grpost, fo, region, ...)
+            filter_spec = FilterSpec.current()
 
-            # Параметры Федеральный округ
-            reverse_fo_mapping = {value: key for key, value in fo_mapping.items()}
-            fo = [company.strip() for item in request.args.getlist('fo', None) for company in item.split(',')]
-            mapped_fo = [reverse_fo_mapping.get(company, company) for company in fo]
-            if fo:
-                base_query = base_query.filter((Regions.tab_fo_d314_ids.in_(mapped_fo)))
+            # Определите базовый запрос с помощью фильтров
+            base_query = filter_spec.apply(db.query(Regions), Regions, columns={'fo': Regions.tab_fo_d314_ids})
 
             # Продолжить создавать основной запрос
             query = fo_region_query(base_query, Regions, FedState)
@@ -64,8 +49,7 @@ class FORegionDATA(Resource):
 
             #            return jsonify(graph_data)
 
-            response = jsonify(graph_data)
-            response.headers.add('Access-Control-Allow-Origin', '*');
+            response = json_response(graph_data)
             return response
 
         except Exception as e:
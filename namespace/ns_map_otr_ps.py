@@ -1,16 +1,19 @@
 ﻿from decimal import Decimal
 from datetime import datetime
 from sqlalchemy import func, select, and_, distinct, or_
-from flask import jsonify, session, request
+from flask import session, request
 from flask_restx import Namespace, Resource
 # Import the database session
 from progSpros_back.database_ps import db, cache, errorhandler
-from progSpros_back.functions.chart_data_functions_ps import apply_dynamic_filters
+from progSpros_back.functions.json_response_ps import json_response
+from progSpros_back.functions.response_cache_ps import cached_response
+from progSpros_back.functions.filter_spec_ps import FilterSpec
+from progSpros_back.functions.forecast_cube_ps import forecast_source
+from progSpros_back.functions.columnar_engine_ps import chart_rows
 from progSpros_back.functions.query_functions_ps import fo_otrasl_query
-from progSpros_back.functions.utility_functions_ps import create_filter_params, create_structure_fo, set_db_connection, \
-    mapping, to_date
+from progSpros_back.functions.utility_functions_ps import create_structure_fo, set_db_connection, \
+    to_date
 from progSpros_back.model.db_models_ps import PSDATA, reference_models, FedState, Otrasl, VersProgn, GroupPost, Regions
-from progSpros_back.model.mappings_ps import yn_mapping
 
 # Define the namespace
 ns_map_otr_ps = Namespace('MapOtrasl', description='Карта по отраслям')
@@ -33,6 +36,7 @@ ns_map_otr_ps = Namespace('MapOtrasl', description='Карта по отрасл
 })
 
 class MapRF(Resource):
+    @cached_response()
     def get(self):
         """
         Возвращает обратно данные для карты
@@ -43,84 +47,21 @@ class MapRF(Resource):
         """
         try:
             #db = set_db_connection()
-            # Мэппинги из справочников
-            otr_mapping = mapping(Otrasl)
-            vers_mapping = mapping(VersProgn)
-            grpost_mapping = mapping(GroupPost)
-            fo_mapping = mapping(FedState)
-            region_mapping = mapping(Regions)
-
-            # Получить фильтр-параметры из запроса
-            filter_params = create_filter_params(request)
-            if not filter_params:
-                filter_params = session.get('filter_params')
-
-            # Определите базовый запрос с помощью динамических фильтров
-            base_query = db.query(PSDATA)
-            base_query = apply_dynamic_filters(base_query, PSDATA, filter_params, db, reference_models)
+            # Фильтры запроса (global_filters, session и параметры otrasl, vers, grpost, fo, region, ...)
+            filter_spec = FilterSpec.current()
 
             yearfrom = request.args.get('yearfrom', 2023, type=int)
             yearto = request.args.get('yearto', 2034, type=int)
             date = request.args.get('date', type=to_date)
 
-            # Параметры отраслей
-            reverse_otr_mapping = {value: key for key, value in otr_mapping.items()}
-            otr = [company.strip() for item in request.args.getlist('otrasl', None) for company in item.split(',')]
-            mapped_otr = [reverse_otr_mapping.get(company, company) for company in otr]
-            if otr:
-                base_query = base_query.filter((PSDATA.tab_otrasl_economy_d314_ids.in_(mapped_otr)))
-
-            # Параметры версий
-            reverse_vers_mapping = {value: key for key, value in vers_mapping.items()}
-            vers = [company.strip() for item in request.args.getlist('vers', None) for company in item.split(',')]
-            mapped_vers = [reverse_vers_mapping.get(company, company) for company in vers]
-            if vers:
-                base_query = base_query.filter((PSDATA.tab_ver_real_pr_d314_ids.in_(mapped_vers)))
-
-            # Параметры Группа поставщиков
-            reverse_grpost_mapping = {value: key for key, value in grpost_mapping.items()}
-            grpost = [company.strip() for item in request.args.getlist('grpost', None) for company in item.split(',')]
-            mapped_grpost = [reverse_grpost_mapping.get(company, company) for company in grpost]
-            if grpost:
-                base_query = base_query.filter((PSDATA.tab_group_post_d314_ids.in_(mapped_grpost)))
-
-            # Параметры Федеральный округ
-            reverse_fo_mapping = {value: key for key, value in fo_mapping.items()}
-            fo = [company.strip() for item in request.args.getlist('fo', None) for company in item.split(',')]
-            mapped_fo = [reverse_fo_mapping.get(company, company) for company in fo]
-            if fo:
-                base_query = base_query.filter((PSDATA.tab_fo_d314_ids.in_(mapped_fo)))
-
-            # Параметры Регион
-            reverse_region_mapping = {value: key for key, value in region_mapping.items()}
-            region = [company.strip() for item in request.args.getlist('region', None) for company in item.split(',')]
-            mapped_region = [reverse_region_mapping.get(company, company) for company in region]
-            if region:
-                base_query = base_query.filter((PSDATA.tab_region_d314_ids.in_(mapped_region)))
-
-            # Параметры Договор
-            reverse_dog_mapping = {value: key for key, value in yn_mapping.items()}
-            dogovor = [company.strip() for item in request.args.getlist('dogovor', None) for company in item.split(',')]
-            mapped_dog = [reverse_dog_mapping.get(company, company) for company in dogovor]
-            if dogovor:
-                base_query = base_query.filter((PSDATA.tab_dogovor_visual_d314_ids.in_(mapped_dog)))
-
-            # Параметры ТУ
-            reverse_tu_mapping = {value: key for key, value in yn_mapping.items()}
-            tu = [company.strip() for item in request.args.getlist('tu', None) for company in item.split(',')]
-            mapped_tu = [reverse_tu_mapping.get(company, company) for company in tu]
-            if tu:
-                base_query = base_query.filter((PSDATA.tab_tu_visual_d314_ids.in_(mapped_tu)))
-
-            # Параметры Инфраструктура
-            reverse_infr_mapping = {value: key for key, value in yn_mapping.items()}
-            infr = [company.strip() for item in request.args.getlist('infr', None) for company in item.split(',')]
-            mapped_infr = [reverse_infr_mapping.get(company, company) for company in infr]
-            if infr:
-                base_query = base_query.filter((PSDATA.tab_infr_d314_ids.in_(mapped_infr)))
+            # Определите базовый запрос с помощью фильтров: из агрегата tab_progn_spr_gaz_cube_d314,
+            # если он актуален для даты загрузки, иначе из tab_progn_spr_gaz_d314
+            forecast = forecast_source(date, filter_spec)
+            base_query = filter_spec.apply(db.query(forecast), forecast)
 
             # Продолжить создавать основной запрос
-            query = fo_otrasl_query(base_query, PSDATA, FedState, Otrasl, yearfrom, yearto, date)
+            query = chart_rows('fo_otrasl_query', fo_otrasl_query(base_query, forecast, FedState, Otrasl, yearfrom, yearto, date),
+                               filter_spec, date, yearfrom, yearto)
             title = f"Карта по отраслям"
             version_mapping = {
                 'Дальневосточный федеральный округ': 'DFO',
@@ -135,7 +76,7 @@ class MapRF(Resource):
 
             # Создать структуру вывода для Json
             structure = {}
-            results = query.all()
+            results = query
             structure = create_structure_fo('Карта по отраслям', 'otrasl_list', results, version_mapping, structure)
             structure = {version_mapping.get(year, year): versions for year, versions in structure.items()}
 
@@ -145,8 +86,7 @@ class MapRF(Resource):
             }
 
             #            return jsonify(graph_data)
-            response = jsonify(graph_data)
-            response.headers.add('Access-Control-Allow-Origin', '*');
+            response = json_response(graph_data)
             return response
 
         except Exception as e:
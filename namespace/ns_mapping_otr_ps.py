@@ -1,12 +1,13 @@
 from decimal import Decimal
 from datetime import datetime
 from sqlalchemy import func, select, and_, distinct, or_
-from flask import jsonify, session, request
+from flask import session, request
 from flask_restx import Namespace, Resource
 # Import the database session
 from progSpros_back.database_ps import db, cache, errorhandler
+from progSpros_back.functions.json_response_ps import json_response
 from progSpros_back.functions.query_functions_ps import mapping_otrasl_query
-from progSpros_back.functions.utility_functions_ps import set_db_connection, mapping
+from progSpros_back.functions.utility_functions_ps import set_db_connection
 from progSpros_back.model.db_models_ps import reference_models, Otrasl, VersProgn, GroupPost, FedState, Regions
 
 # Define the namespace
@@ -23,14 +24,6 @@ class FORegionDATA(Resource):
         """
         try:
             #db = set_db_connection()
-
-            # Мэппинги из справочников
-            otr_mapping = mapping(Otrasl)
-            vers_mapping = mapping(VersProgn)
-            grpost_mapping = mapping(GroupPost)
-            fo_mapping = mapping(FedState)
-            region_mapping = mapping(Regions)
-
             # Определите базовый запрос с помощью динамических фильтров
             base_query = db.query(Otrasl)
 
@@ -53,8 +46,7 @@ class FORegionDATA(Resource):
 
             #            return jsonify(graph_data)
 
-            response = jsonify(graph_data)
-            response.headers.add('Access-Control-Allow-Origin', '*');
+            response = json_response(graph_data)
             return response
 
         except Exception as e:
@@ -1,13 +1,14 @@
 ﻿from decimal import Decimal
 from datetime import datetime
 from sqlalchemy import func, select, and_, distinct, or_
-from flask import jsonify, session, request
+from flask import session, request
 from flask_restx import Namespace, Resource
 # Import the database session
 from progSpros_back.database_ps import db, cache, errorhandler
-from progSpros_back.functions.chart_data_functions_ps import apply_dynamic_filters
+from progSpros_back.functions.json_response_ps import json_response
+from progSpros_back.functions.filter_spec_ps import FilterSpec
 from progSpros_back.functions.query_functions_ps import region_fo_query
-from progSpros_back.functions.utility_functions_ps import create_filter_params, set_db_connection, mapping
+from progSpros_back.functions.utility_functions_ps import set_db_connection
 from progSpros_back.model.db_models_ps import PSDATA, reference_models, FedState, Regions
 
 # Define the namespace
@@ -26,28 +27,11 @@ class FORegionDATA(Resource):
         """
         try:
             #db = set_db_connection()
+            # Фильтры запроса (global_filters, session и параметры otrasl, vers, grpost, fo, region, ...)
+            filter_spec = FilterSpec.current()
 
-            # Мэппинги из справочников
-            fo_mapping = mapping(FedState)
-            region_mapping = mapping(Regions)
-
-            # Получить фильтр-параметры из запроса
-            filter_params = create_filter_params(request)
-
-            # Если не заданы глобальные параметры, взять их из session
-            if not filter_params:
-                filter_params = session.get('filter_params')
-
-            # Определите базовый запрос с помощью динамических фильтров
-            base_query = db.query(Regions)
-            base_query = apply_dynamic_filters(base_query, Regions, filter_params, db, reference_models)
-
-            # Параметры Регион
-            reverse_region_mapping = {value: key for key, value in region_mapping.items()}
-            region = [company.strip() for item in request.args.getlist('region', None) for company in item.split(',')]
-            mapped_region = [reverse_region_mapping.get(company, company) for company in region]
-            if region:
-                base_query = base_query.filter((Regions.id.in_(mapped_region)))
+            # Определите базовый запрос с помощью фильтров
+            base_query = filter_spec.apply(db.query(Regions), Regions, columns={'region': Regions.id})
 
             # Продолжить создавать основной запрос
             query = region_fo_query(base_query, Regions, FedState)
@@ -65,8 +49,7 @@ class FORegionDATA(Resource):
 
             #            return jsonify(graph_data)
 
-            response = jsonify(graph_data)
-            response.headers.add('Access-Control-Allow-Origin', '*');
+            response = json_response(graph_data)
             return response
 
         except Exception as e:
@@ -1,17 +1,21 @@
 from decimal import Decimal
 from datetime import datetime
 from sqlalchemy import func, select, and_, distinct, or_
-from flask import jsonify, session, request
+from flask import session, request
 from flask_restx import Namespace, Resource
 # Import the database session
 from progSpros_back.database_ps import db, cache, errorhandler
-from progSpros_back.functions.chart_data_functions_ps import apply_dynamic_filters
-from progSpros_back.functions.query_functions_ps import sankey_query, sankey_query2, sankey_query3, sankey_query4, sankey_query5
-from progSpros_back.functions.utility_functions_ps import create_filter_params, create_structure, set_db_connection, \
-    mapping, to_date
+from progSpros_back.functions.json_response_ps import json_response
+from progSpros_back.functions.response_cache_ps import cached_response
+from progSpros_back.functions.filter_spec_ps import FilterSpec
+from progSpros_back.functions.forecast_cube_ps import forecast_source
+from progSpros_back.functions.columnar_engine_ps import id_rows
+from progSpros_back.functions.chart_data_functions_ps import rollup_rows, append_unique
+from progSpros_back.functions.query_functions_ps import sankey_flow_query
+from progSpros_back.functions.utility_functions_ps import create_structure, set_db_connection, \
+    to_date
 from progSpros_back.model.db_models_ps import PSDATA, reference_models, Otrasl, Contragent, FedState, Regions, \
     GroupPost, StPotr, StGaz, PG, Dogovor, TU, Proizv, VersProgn
-from progSpros_back.model.mappings_ps import yn_mapping
 
 # Define the namespace
 ns_sankey_ps = Namespace('Sankey', description='Sankey')
@@ -34,6 +38,7 @@ ns_sankey_ps = Namespace('Sankey', description='Sankey')
 })
 
 class Sankey(Resource):
+    @cached_response()
     def get(self):
         """
         Возвращает обратно данные для Прогнозный спрос РФ
@@ -43,92 +48,32 @@ class Sankey(Resource):
         """
         try:
             #db = set_db_connection()
+            # Фильтры запроса (global_filters, session и параметры otrasl, vers, grpost, fo, region, ...)
+            filter_spec = FilterSpec.current()
 
-            # Мэппинги из справочников
-            otr_mapping = mapping(Otrasl)
-            vers_mapping = mapping(VersProgn)
-            grpost_mapping = mapping(GroupPost)
-            fo_mapping = mapping(FedState)
-            region_mapping = mapping(Regions)
+            yearfrom = request.args.get('yearfrom', 2023, type=int)
+            date = request.args.get('date', type=to_date)
 
-            # Получить фильтр-параметры из запроса
-            filter_params = create_filter_params(request)
-            # Если не заданы глобальные параметры, взять их из session
-            if not filter_params:
-                filter_params = session.get('filter_params')
+            # Определите базовый запрос с помощью фильтров: из агрегата tab_progn_spr_gaz_cube_d314,
+            # если он актуален для даты загрузки, иначе из tab_progn_spr_gaz_d314
+            forecast = forecast_source(date, filter_spec)
+            base_query = filter_spec.apply(db.query(forecast), forecast)
 
-            # Определите базовый запрос с помощью динамических фильтров
-            base_query = db.query(PSDATA)
-            base_query = apply_dynamic_filters(base_query, PSDATA, filter_params, db, reference_models)
+            # Один проход по данным: суммы по производителю, группе поставщиков и отрасли
+            flows = id_rows('sankey_flow_query', sankey_flow_query(base_query, forecast, yearfrom, date),
+                            ('tab_proizvoditel_d314_ids', 'tab_group_post_d314_ids', 'tab_otrasl_economy_d314_ids'),
+                            filter_spec, date, (yearfrom,))
 
-            yearfrom = request.args.get('yearfrom', 2023, type=int)
-
-            date = request.args.get('date', type=to_date)
+            # Узлы и связи sankey - группировка потоков в памяти
+            query = rollup_rows(flows, [('proizv', 0, Proizv), ('grpost', 1, GroupPost)])
+            query2 = rollup_rows(flows, [('grpost', 1, GroupPost), ('otrasl', 2, Otrasl)], order=['otrasl', 'grpost'])
+            query3 = rollup_rows(flows, [('proizv', 0, Proizv)])
+            query4 = rollup_rows(flows, [('grpost', 1, GroupPost)])
+            query5 = rollup_rows(flows, [('otrasl', 2, Otrasl)])
 
-            # Параметры Отрасль
-            reverse_otr_mapping = {value: key for key, value in otr_mapping.items()}
-            otr = [company.strip() for item in request.args.getlist('otrasl', None) for company in item.split(',')]
-            mapped_otr = [reverse_otr_mapping.get(company, company) for company in otr]
-            if otr:
-                base_query = base_query.filter((PSDATA.tab_otrasl_economy_d314_ids.in_(mapped_otr)))
-
-            # Параметры Версия прогноза
-            reverse_vers_mapping = {value: key for key, value in vers_mapping.items()}
-            vers = [company.strip() for item in request.args.getlist('vers', None) for company in item.split(',')]
-            mapped_vers = [reverse_vers_mapping.get(company, company) for company in vers]
-            if vers:
-                base_query = base_query.filter((PSDATA.tab_ver_real_pr_d314_ids.in_(mapped_vers)))
-
-            # Параметры Группа поставщиков
-            reverse_grpost_mapping = {value: key for key, value in grpost_mapping.items()}
-            grpost = [company.strip() for item in request.args.getlist('grpost', None) for company in item.split(',')]
-            mapped_grpost = [reverse_grpost_mapping.get(company, company) for company in grpost]
-            if grpost:
-                base_query = base_query.filter((PSDATA.tab_group_post_d314_ids.in_(mapped_grpost)))
-
-            # Параметры Федеральный округ
-            reverse_fo_mapping = {value: key for key, value in fo_mapping.items()}
-            fo = [company.strip() for item in request.args.getlist('fo', None) for company in item.split(',')]
-            mapped_fo = [reverse_fo_mapping.get(company, company) for company in fo]
-            if fo:
-                base_query = base_query.filter((PSDATA.tab_fo_d314_ids.in_(mapped_fo)))
-
-            # Параметры Регион
-            reverse_region_mapping = {value: key for key, value in region_mapping.items()}
-            region = [company.strip() for item in request.args.getlist('region', None) for company in item.split(',')]
-            mapped_region = [reverse_region_mapping.get(company, company) for company in region]
-            if region:
-                base_query = base_query.filter((PSDATA.tab_region_d314_ids.in_(mapped_region)))
-
-            # Параметры Договор
-            reverse_dog_mapping = {value: key for key, value in yn_mapping.items()}
-            dogovor = [company.strip() for item in request.args.getlist('dogovor', None) for company in item.split(',')]
-            mapped_dog = [reverse_dog_mapping.get(company, company) for company in dogovor]
-            if dogovor:
-                base_query = base_query.filter((PSDATA.tab_dogovor_visual_d314_ids.in_(mapped_dog)))
-
-            # Параметры ТУ
-            reverse_tu_mapping = {value: key for key, value in yn_mapping.items()}
-            tu = [company.strip() for item in request.args.getlist('tu', None) for company in item.split(',')]
-            mapped_tu = [reverse_tu_mapping.get(company, company) for company in tu]
-            if tu:
-                base_query = base_query.filter((PSDATA.tab_tu_visual_d314_ids.in_(mapped_tu)))
-
-            # Параметры Инфраструктура
-            reverse_infr_mapping = {value: key for key, value in yn_mapping.items()}
-            infr = [company.strip() for item in request.args.getlist('infr', None) for company in item.split(',')]
-            mapped_infr = [reverse_infr_mapping.get(company, company) for company in infr]
-            if infr:
-                base_query = base_query.filter((PSDATA.tab_infr_d314_ids.in_(mapped_infr)))
-
-            query = sankey_query(base_query, PSDATA, GroupPost, Proizv, yearfrom, date)
-            query2 = sankey_query2(base_query, PSDATA, Otrasl, GroupPost, yearfrom, date)
-            query3 = sankey_query3(base_query, PSDATA, Proizv, yearfrom, date)
-            query4 = sankey_query4(base_query, PSDATA, GroupPost, yearfrom, date)
-            query5 = sankey_query5(base_query, PSDATA, Otrasl, yearfrom, date)
-            
             summ_all = 0
             result = {'nodes':[],'data':[], 'sum_all': round(summ_all/1000, 2)}
+            seen_nodes, seen_data = set(), set()
             title = f"Sankey"
 
             #Проценты Производители
@@ -143,8 +88,7 @@ class Sankey(Resource):
 
                 result_dict = {'proizv': row.proizv, 'sum': summ, 'percent': round(row.summ / summ_all * 100,1)}
 
-                if result_dict not in result['nodes']:
-                    result['nodes'].append(result_dict)
+                append_unique(result['nodes'], result_dict, seen_nodes)
             # Проценты Группа поставщиков
             for row in query4:
                 summ = round(row.summ/1000, 2)
@@ -153,8 +97,7 @@ class Sankey(Resource):
 
                 result_dict = {'grpost': row.grpost, 'sum': summ, 'percent': round(row.summ / summ_all * 100,1)}
 
-                if result_dict not in result['nodes']:
-                    result['nodes'].append(result_dict)
+                append_unique(result['nodes'], result_dict, seen_nodes)
 
             # Проценты Группа поставщиков
             for row in query5:
@@ -164,8 +107,7 @@ class Sankey(Resource):
 
                 result_dict = {'otrasl': row.otrasl, 'sum': summ, 'percent': round(row.summ / summ_all * 100,1)}
 
-                if result_dict not in result['nodes']:
-                    result['nodes'].append(result_dict)
+                append_unique(result['nodes'], result_dict, seen_nodes)
 
             for row in query:
                 summ = row.summ
@@ -173,8 +115,7 @@ class Sankey(Resource):
                 #if summ < 0.01:
                 #    summ = 0.01
                 result_dict = {'proizv': row.proizv, 'grpost': row.grpost, 'sum': summ}
-                if result_dict not in result['data']:
-                    result['data'].append(result_dict)
+                append_unique(result['data'], result_dict, seen_data)
 
 
             for row in query2:
@@ -183,8 +124,7 @@ class Sankey(Resource):
                 #if summ < 0.01:
                 #    summ = 0.01
                 result_dict2 = {'grpost': row.grpost,'otrasl': row.otrasl, 'sum': summ}
-                if result_dict2 not in result['data']:
-                    result['data'].append(result_dict2)
+                append_unique(result['data'], result_dict2, seen_data)
 
             summ_itog = summ_all/1000
             #summ_itog = round(summ_all/1000, 2)
@@ -198,8 +138,7 @@ class Sankey(Resource):
                 "data": result
             }
 
-            response = jsonify(graph_data)
-            response.headers.add('Access-Control-Allow-Origin', '*');
+            response = json_response(graph_data)
             return response
         except Exception as e:
             ns_sankey_ps.abort(*errorhandler(e))
\ No newline at end of file
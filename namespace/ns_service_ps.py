@@ -0,0 +1,91 @@
+from flask import request
+from flask_restx import Namespace, Resource
+# Import the database session
+from progSpros_back.database_ps import errorhandler
+from progSpros_back.functions.json_response_ps import json_response
+from progSpros_back.functions.data_version_ps import data_version
+from progSpros_back.functions.response_cache_ps import get_cache_stats
+from progSpros_back.functions.slow_query_ps import slow_query_log
+
+# Define the namespace
+ns_service_ps = Namespace('Service', description='Служебные данные')
+
+
+@ns_service_ps.route('/cache-stats')
+@ns_service_ps.response(200, 'Success')
+
+class CacheStats(Resource):
+    def get(self):
+        """
+        Возвращает счетчики попаданий и промахов кэша ответов
+        """
+        try:
+            graph_data = {
+                "title": "Кэш ответов",
+                "data": get_cache_stats()
+            }
+
+            response = json_response(graph_data)
+            return response
+
+        except Exception as e:
+            ns_service_ps.abort(*errorhandler(e))
+
+
+@ns_service_ps.route('/data-version')
+@ns_service_ps.response(200, 'Success')
+
+class DataVersionInfo(Resource):
+    def get(self):
+        """
+        Возвращает версии таблиц данных (номер загрузки или последняя дата загрузки и количество строк)
+        """
+        try:
+            graph_data = {
+                "title": "Версия данных",
+                "data": data_version.versions()
+            }
+
+            response = json_response(graph_data)
+            return response
+
+        except Exception as e:
+            ns_service_ps.abort(*errorhandler(e))
+
+
+@ns_service_ps.route('/slow-queries')
+@ns_service_ps.response(200, 'Success')
+@ns_service_ps.doc(params={
+    'fingerprint': {'description': 'Отпечаток запроса', 'in': 'query', 'type': 'string'},
+})
+
+class SlowQueries(Resource):
+    def get(self):
+        """
+        Возвращает журнал медленных запросов процесса (новые первыми) и сводку по отпечаткам
+        """
+        try:
+            graph_data = {
+                "title": "Медленные запросы",
+                "threshold_ms": slow_query_log.threshold_ms,
+                "explain": slow_query_log.explain_mode,
+                "summary": slow_query_log.summary(),
+                "data": slow_query_log.entries(request.args.get('fingerprint')),
+            }
+
+            response = json_response(graph_data)
+            return response
+
+        except Exception as e:
+            ns_service_ps.abort(*errorhandler(e))
+
+    def delete(self):
+        """
+        Очищает журнал медленных запросов процесса
+        """
+        try:
+            slow_query_log.clear()
+            return json_response({"title": "Медленные запросы", "data": []})
+
+        except Exception as e:
+            ns_service_ps.abort(*errorhandler(e))
@@ -1,8 +1,10 @@
 import datetime
-from flask import jsonify, session, request
+from flask import session, request
 from flask_restx import Namespace, Resource
 # Import the database session
 from progSpros_back.database_ps import db, cache, errorhandler
+from progSpros_back.functions.json_response_ps import json_response
+from progSpros_back.functions.response_cache_ps import cached_response
 from progSpros_back.functions.query_functions_ps import year_query, yearto_query
 from progSpros_back.functions.utility_functions_ps import set_db_connection
 from progSpros_back.model.db_models_ps import PSDATA
@@ -15,6 +17,7 @@ ns_years_ps = Namespace('Years', description='Годы')
 @ns_years_ps.response(200, 'Success')
 
 class YearDATA(Resource):
+    @cached_response()
     def get(self):
         try:
             #db = set_db_connection()
@@ -45,8 +48,7 @@ class YearDATA(Resource):
 
             #            return jsonify(graph_data)
 
-            response = jsonify(graph_data)
-            response.headers.add('Access-Control-Allow-Origin', '*');
+            response = json_response(graph_data)
             return response
 
         except Exception as e:
@@ -1,206 +1,140 @@
 ﻿from typing import List, Tuple, Dict, Any
-from dataclasses import dataclass, field
 
-@dataclass
-class RelColumn:
-    """Класс для хранения пар название-значение"""
-    name: str
-    value: Any
+# Строки отчета хранятся как кортежи значений; названия колонок - общий заголовок региона (header).
+# В JSON строка выводится как пары [название, значение].
 
-@dataclass
 class Consumer:
     """Класс для хранения данных о потребителе"""
-    name: str
-    rel_columns: List[RelColumn] = field(default_factory=list)
+    __slots__ = ('name', 'values')
 
-    def to_dict(self) -> Dict:
+    def __init__(self, name: str, values: Tuple):
+        self.name = name
+        self.values = values
+
+    def to_dict(self, header: Tuple[str, ...]) -> Dict:
         """Конвертация в словарь"""
         return {
             "name": self.name,
-            "rel_columns": [[col.name, col.value] for col in self.rel_columns]
+            "rel_columns": [[name, value] for name, value in zip(header, self.values)]
         }
 
-@dataclass
 class Demand:
-    """Класс для хранения данных о потребителе"""
-    rel_columns: List[RelColumn] = field(default_factory=list)
+    """Класс для хранения данных о спросе"""
+    __slots__ = ('values',)
 
-    def to_dict(self) -> Any:
+    def __init__(self, values: Tuple):
+        self.values = values
+
+    def to_dict(self, header: Tuple[str, ...]) -> Any:
         """Конвертация в словарь"""
-        return [[col.name, col.value] for col in self.rel_columns]
+        return [[name, value] for name, value in zip(header, self.values)]
+
+# Списки потребителей RegionData по вероятности реализации проекта
+CONSUMERS_BY_VER_REAL = {
+    "действующие потребители": "active_consumers",
+    "ожидаемые перспективные потребители": "expected_consumers",
+    "потенциальные перспективные потребители": "potential_consumers",
+}
+
+DETALIZATION_BY_VER_REAL = {
+    "действующие потребители": "detalization_active_consumers",
+    "ожидаемые перспективные потребители": "detalization_expected_consumers",
+    "потенциальные перспективные потребители": "detalization_potential_consumers",
+}
 
-@dataclass
 class RegionData:
     """Класс для хранения данных по региону"""
-    region_name: str
-    # active
-    active_consumers: List[Consumer] = field(default_factory=list)
-    # promising
-    promising_total_consumers: Consumer = None
-    expected_consumers: List[Consumer] = field(default_factory=list)
-    potential_consumers: List[Consumer] = field(default_factory=list)
-    #
-    expected_demand: List[Demand] = field(default_factory=list)
-    max_demand: List[Demand] = field(default_factory=list)
-    #
-    detalization_active_consumers: List[Consumer] = field(default_factory=list)
-    detalization_expected_consumers: List[Consumer] = field(default_factory=list)
-    detalization_potential_consumers: List[Consumer] = field(default_factory=list)
+    __slots__ = (
+        'region_name', 'header',
+        # active
+        'active_consumers',
+        # promising
+        'promising_total_consumers', 'expected_consumers', 'potential_consumers',
+        #
+        'expected_demand', 'max_demand',
+        #
+        'detalization_active_consumers', 'detalization_expected_consumers', 'detalization_potential_consumers',
+    )
+
+    def __init__(self, region_name: str, header: Tuple[str, ...]):
+        self.region_name = region_name
+        self.header = header
+        self.active_consumers: List[Consumer] = []
+        self.promising_total_consumers: Consumer = None
+        self.expected_consumers: List[Consumer] = []
+        self.potential_consumers: List[Consumer] = []
+        self.expected_demand: List[Demand] = []
+        self.max_demand: List[Demand] = []
+        self.detalization_active_consumers: List[Consumer] = []
+        self.detalization_expected_consumers: List[Consumer] = []
+        self.detalization_potential_consumers: List[Consumer] = []
 
     # consumers
-    def add_consumers(self, ver_real: str, name: str, data: Dict[str, Any]):
-        if ver_real == "действующие потребители":
-            self.add_active_consumers(
-                name=name,
-                data=data
-            )
-        elif ver_real == "ожидаемые перспективные потребители":
-            self.add_expected_consumers(
-                name=name,
-                data=data
-            )
-        elif ver_real == "потенциальные перспективные потребители":
-            self.add_potential_consumers(
-                name=name,
-                data=data
-            )
-
-    def add_active_consumers(self, name: str, data: Dict[str, Any]):
-        """Добавление потребителя"""
-        consumer = Consumer(name=name)
-        for col_name, col_value in data.items():
-            consumer.rel_columns.append(RelColumn(name=col_name, value=col_value))
-        self.active_consumers.append(consumer)
-
-    def add_expected_consumers(self, name: str, data: Dict[str, Any]):
-        """Добавление потребителя"""
-        consumer = Consumer(name=name)
-        for col_name, col_value in data.items():
-            consumer.rel_columns.append(RelColumn(name=col_name, value=col_value))
-        self.expected_consumers.append(consumer)
-
-    def add_potential_consumers(self, name: str, data: Dict[str, Any]):
-        """Добавление потребителя"""
-        consumer = Consumer(name=name)
-        for col_name, col_value in data.items():
-            consumer.rel_columns.append(RelColumn(name=col_name, value=col_value))
-        self.potential_consumers.append(consumer)
+    def add_consumers(self, ver_real: str, name: str, values: Tuple):
+        """Добавление потребителя (значения в порядке header)"""
+        attr = CONSUMERS_BY_VER_REAL.get(ver_real)
+        if attr is not None:
+            getattr(self, attr).append(Consumer(name, values))
 
     # total consumers
-    def add_total_consumers(self, ver_real: str, name: str, data: Dict[str, Any]):
-        if ver_real == "перспективные потребители":
-            self.add_promising_total_consumers(
-                name=name,
-                data=data
-            )
-
-    def add_promising_total_consumers(self, name: str, data: Dict[str, Any]):
+    def add_total_consumers(self, ver_real: str, name: str, values: Tuple):
         """total в promising_consumers"""
-        consumer = Consumer(name=name)
-        for col_name, col_value in data.items():
-            consumer.rel_columns.append(RelColumn(name=col_name, value=col_value))
-        self.promising_total_consumers = consumer
+        if ver_real == "перспективные потребители":
+            self.promising_total_consumers = Consumer(name, values)
 
     # detalization consumers
-    def add_detalization_consumers(self, ver_real: str, name: str, data: Dict[str, Any]):
+    def add_detalization_consumers(self, ver_real: str, name: str, values: Tuple):
         """Добавление потребителя"""
-        if ver_real == "действующие потребители":
-            self.add_detalization_active_consumers(
-                name=name,
-                data=data
-            )
-        elif ver_real == "ожидаемые перспективные потребители":
-            self.add_detalization_expected_consumers(
-                name=name,
-                data=data
-            )
-        elif ver_real == "потенциальные перспективные потребители":
-            self.add_detalization_potential_consumers(
-                name=name,
-                data=data
-            )
-
-    def add_detalization_active_consumers(self, name: str, data: Dict[str, Any]):
-        """Добавление потребителя"""
-        consumer = Consumer(name=name)
-        for col_name, col_value in data.items():
-            consumer.rel_columns.append(RelColumn(name=col_name, value=col_value))
-        self.detalization_active_consumers.append(consumer)
-
-    def add_detalization_expected_consumers(self, name: str, data: Dict[str, Any]):
-        """Добавление потребителя"""
-        consumer = Consumer(name=name)
-        for col_name, col_value in data.items():
-            consumer.rel_columns.append(RelColumn(name=col_name, value=col_value))
-        self.detalization_expected_consumers.append(consumer)
-
-    def add_detalization_potential_consumers(self, name: str, data: Dict[str, Any]):
-        """Добавление потребителя"""
-        consumer = Consumer(name=name)
-        for col_name, col_value in data.items():
-            consumer.rel_columns.append(RelColumn(name=col_name, value=col_value))
-        self.detalization_potential_consumers.append(consumer)
+        attr = DETALIZATION_BY_VER_REAL.get(ver_real)
+        if attr is not None:
+            getattr(self, attr).append(Consumer(name, values))
 
     # demand
-    def add_expected_demand(self, data: Dict[str, Any]):
-        """Добавление потребителя"""
-        demand = Demand()
-        for col_name, col_value in data.items():
-            demand.rel_columns.append(RelColumn(name=col_name, value=col_value))
-        self.expected_demand.append(demand)
+    def add_expected_demand(self, values: Tuple):
+        """Добавление ожидаемого спроса"""
+        self.expected_demand.append(Demand(values))
 
-    def add_max_demand(self, data: Dict[str, Any]):
-        """Добавление потребителя"""
-        demand = Demand()
-        for col_name, col_value in data.items():
-            demand.rel_columns.append(RelColumn(name=col_name, value=col_value))
-        self.max_demand.append(demand)
+    def add_max_demand(self, values: Tuple):
+        """Добавление максимального спроса"""
+        self.max_demand.append(Demand(values))
 
-    def to_dict_consumers(self) -> Dict:
-        """consumers - Конвертация в словарь"""
-        return {
-            "region_name": self.region_name,
-            "active_consumers": [consumer.to_dict() for consumer in self.active_consumers],
-            "promising_consumers": {
-                 "expected": [consumer.to_dict() for consumer in self.expected_consumers],
-                 "potential": [consumer.to_dict() for consumer in self.potential_consumers],
-                 "total": self.promising_total_consumers.to_dict() if self.promising_total_consumers else None
-             },
-            "expected_demand": {
-                "rel_columns": demand.to_dict() for demand in self.expected_demand
-            },
-            "max_demand": {
-                "rel_columns": demand.to_dict() for demand in self.max_demand
-            },
-            "consumers_detalization": {
-                "active_consumers": [consumer.to_dict() for consumer in self.detalization_active_consumers],
-                "expected_comsumers": [consumer.to_dict() for consumer in self.detalization_expected_consumers],
-                "potential_comsumers": [consumer.to_dict() for consumer in self.detalization_potential_consumers],
-            }
-        }
+    def _consumers(self, consumers: List[Consumer]) -> List[Dict]:
+        return [consumer.to_dict(self.header) for consumer in consumers]
+
+    def _demand(self, demands: List[Demand]) -> Dict:
+        # В ответ попадает последняя строка спроса
+        return {"rel_columns": demands[-1].to_dict(self.header)} if demands else {}
 
     def to_dict_total(self) -> Dict:
         """total - Конвертация в словарь"""
         return {
             "region_name": self.region_name,
-            "active_consumers": [consumer.to_dict() for consumer in self.active_consumers],
+            "active_consumers": self._consumers(self.active_consumers),
             "promising_consumers": {
-                 "expected": [consumer.to_dict() for consumer in self.expected_consumers],
-                 "potential": [consumer.to_dict() for consumer in self.potential_consumers],
-                 "total": self.promising_total_consumers.to_dict() if self.promising_total_consumers else None
+                 "expected": self._consumers(self.expected_consumers),
+                 "potential": self._consumers(self.potential_consumers),
+                 "total": self.promising_total_consumers.to_dict(self.header) if self.promising_total_consumers else None
              },
-            "expected_demand": {
-                "rel_columns": demand.to_dict() for demand in self.expected_demand
-            },
-            "max_demand": {
-                "rel_columns": demand.to_dict() for demand in self.max_demand
-            },
+            "expected_demand": self._demand(self.expected_demand),
+            "max_demand": self._demand(self.max_demand),
+        }
+
+    def to_dict_consumers(self) -> Dict:
+        """consumers - Конвертация в словарь"""
+        result = self.to_dict_total()
+        result["consumers_detalization"] = {
+            "active_consumers": self._consumers(self.detalization_active_consumers),
+            "expected_comsumers": self._consumers(self.detalization_expected_consumers),
+            "potential_comsumers": self._consumers(self.detalization_potential_consumers),
         }
+        return result
 
-@dataclass
 class Consumers:
-    consumers: List[RegionData] = field(default_factory=list)
-    total: List[RegionData] = field(default_factory=list)
+    __slots__ = ('consumers', 'total')
+
+    def __init__(self):
+        self.consumers: List[RegionData] = []
+        self.total: List[RegionData] = []
 
     def add_consumer(self, rd :RegionData):
         self.consumers.append(rd)
@@ -213,4 +147,4 @@ class Consumers:
         return {
              "consumers": [consumer.to_dict_consumers() for consumer in self.consumers],
              "total": [total.to_dict_total() for total in self.total],
-        }
\ No newline at end of file
+        }
@@ -1,4 +1,22 @@
+"""
+    Строки отчета "Оценка прогнозного спроса" из результата get_query.
+
+    Регионы обрабатываются последовательно, параллельного выполнения по регионам нет:
+        - итоги всех уровней считает rollup_levels одним проходом pandas по всем регионам сразу,
+          делить его по регионам незачем;
+        - параллелить можно только вывод (rows_by_region, fill_region) - это создание объектов
+          Python и форматирование строк, потоки его не ускоряют из-за GIL;
+        - пул процессов должен передать в процессы части DataFrame и вернуть сериализованные
+          объекты отчета - только pickle результата сопоставим с выигрышем, плюс запуск пула;
+        - запрос по региону в потоках заменяет один запрос десятками с повторным соединением
+          таблиц, а время ответа и так определяет SQL.
+
+    benchmark/ots_pr_spr_phases_ps.py, синтетические данные 1e6 строк (21 963 строки запроса,
+    90 регионов, SQLite, 2024-2036): SQL 4127 мс, подготовка 206 мс, итоги 412 мс, вывод по
+    регионам 239 мс, pickle результата 37 мс. Параллельная часть - меньше 5% времени ответа.
+"""
 import pandas as pd
+from decimal import Decimal
 from typing import List, Tuple, Dict, Any
 #
 from progSpros_back.namespace.ots_pr_spr.data_models import Consumers, RegionData
@@ -19,19 +37,16 @@ def get_data(query, shown_columns, otrasl_total, yearfrom: int, yearto: int, sum
 
     # Суммирование по полям Год и prirost
     years = [str(y) for y in range(yearfrom, yearto + 1)]
-    agg_dict = {
-        **{f'y{y}': 'sum' for y in years},
-        'prirost': 'sum',
-    }
 
-    # null
-    data_dict_null = {
-        **{f'{get_column_name(column, columns_map)}': None for column in shown_columns},
-        **{f'{y} год': f"0.0" for y in years},
-        f'{get_column_name("prirost", columns_map)}': f"0.0"
-    }
+    # Заголовок строк отчета: колонки, годы, прирост
+    header = tuple(
+        [get_column_name(column, columns_map) for column in shown_columns]
+        + [f'{y} год' for y in years]
+        + [get_column_name('prirost', columns_map)]
+    )
 
-    data_dict_null = replace_value_map(data_dict_null, value_map)
+    # null
+    values_null = (None,) * len(shown_columns) + (value_map.get("0.0", "0.0"),) * (len(years) + 1)
 
     df = pd.DataFrame([row._asdict() for row in query])
 
@@ -48,269 +63,178 @@ def get_data(query, shown_columns, otrasl_total, yearfrom: int, yearto: int, sum
 
     processed_df = preprocess_data(df, years, shown_columns)
 
-    ver_real_null = f_ver_real_null()
+    # Итоги всех уровней считаются заранее, строки отчета выводятся из готовых таблиц
+    value_columns = [f'y{y}' for y in years] + ['prirost']
+    rollup = rollup_levels(processed_df, shown_columns, otrasl_total_filter, value_columns)
+
     ####################################################################################################################
     # total
-    total = RegionData(region_name="ИТОГО")
-    # -------------------------------------------------------------------------------
-    # Группировка (ver_real_level2) по вероятности реализации проекта (действующие потребители, перспективные потребители)
-    for ver_real2, ver_real_group2 in processed_df.groupby('ver_real_level2'):
-        # Итог по вероятности реализации проекта
-        subgroup_itog = ver_real_group2.groupby(['ver_real_level2']).agg(agg_dict).reset_index()
-        for row in subgroup_itog.itertuples():
-            data_dict = {
-                **{f'{get_column_name(column, columns_map)}': None for column in shown_columns},
-                **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 1):.1f}" for y in years},
-                f'{get_column_name("prirost", columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-            }
-
-            data_dict = replace_value_map(data_dict, value_map)
-
-            total.add_total_consumers(
-                ver_real=ver_real2,
-                name="ИТОГО",
-                data=data_dict
-            )
-
-        # Группировка (ver_real_level1) по вероятности реализации проекта (Действующие потребители, Ожидаемые, Потенциальные)
-        for ver_real, ver_real_group in ver_real_group2.groupby('ver_real_level1'):
-            # Итог по вероятности реализации проекта
-            subgroup_itog = ver_real_group.groupby(['ver_real_level1']).agg(agg_dict).reset_index()
-            for row in subgroup_itog.itertuples():
-                data_dict = {
-                    **{f'{get_column_name(column,columns_map)}': None for column in shown_columns},
-                    **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-                    f'{get_column_name("prirost",columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-                }
-
-                data_dict = replace_value_map(data_dict, value_map)
-
-                total.add_consumers(
-                    ver_real=ver_real,
-                    name="ИТОГО",
-                    data=data_dict
-                )
-
-                ver_real_null[ver_real] = "true"
-
-            # Отрасль в итогах
-            if len(otrasl_total_filter):
-                filtered = ver_real_group[ver_real_group['otrasl'].isin(otrasl_total_filter)]
-                subgroup_itog = filtered.groupby(['otrasl']).agg(agg_dict).reset_index()
-            else:
-                subgroup_itog = ver_real_group.groupby(['otrasl']).agg(agg_dict).reset_index()
-
-            for row in subgroup_itog.itertuples():
-                data_dict = {
-                    **{f'{get_column_name(column,columns_map)}': None for column in shown_columns},
-                    **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-                    f'{get_column_name("prirost",columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-                }
-
-                data_dict = replace_value_map(data_dict, value_map)
-
-                total.add_consumers(
-                    ver_real=ver_real,
-                    name=row.otrasl,
-                    data=data_dict
-                )
+    total = RegionData(region_name="ИТОГО", header=header)
+    # В общем итоге по ver_real_level2 годы округляются до одного знака
+    fill_region(total, rows_by_region(rollup['total'], value_columns, rollup['scale'], years_digits=1,
+                                      by_region=False)[None],
+                len(shown_columns), values_null, detalization=False)
+    consumers.add_total(total)
 
-    for ver_real, value in ver_real_null.items():
-        if value == "false":
-            total.add_consumers(
-                ver_real=ver_real,
-                name="ИТОГО",
-                data=data_dict_null
-            )
+    ####################################################################################################################
+    # regions
+    region_rows = rows_by_region(rollup['region'], value_columns, rollup['scale'])
+    for region_name in sorted(region_rows):
+        region = RegionData(region_name=region_name, header=header)
+        fill_region(region, region_rows[region_name], len(shown_columns), values_null, detalization=True)
+        consumers.add_consumer(region)
 
-    # Ожидаемый сценарий спроса
-    subgroup = processed_df.groupby(['expect']).agg(agg_dict).reset_index()
-    for row in subgroup.itertuples():
-        data_dict = {
-            **{f'{get_column_name(column,columns_map)}': None for column in shown_columns},
-            **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-            f'{get_column_name("prirost",columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-        }
+    result = consumers.to_dict()
 
-        data_dict = replace_value_map(data_dict, value_map)
+    return result
 
-        total.add_expected_demand(
-            data=data_dict
-        )
 
-    # Максимальный спрос
-    subgroup = processed_df.groupby(['maximum']).agg(agg_dict).reset_index()
-    for row in subgroup.itertuples():
-        data_dict = {
-            **{f'{get_column_name(column,columns_map)}': None for column in shown_columns},
-            **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-            f'{get_column_name("prirost",columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-        }
+# Максимальный масштаб значений, при котором суммы считаются в int64
+MAX_SCALE = 9
 
-        data_dict = replace_value_map(data_dict, value_map)
+# Уровни итогов: уровень → колонки группировки (внутри региона или общего итога)
+ROLLUP_LEVELS = {
+    'ver_real_level2': ['ver_real_level2'],
+    'ver_real_level1': ['ver_real_level1'],
+    'otrasl': ['ver_real_level1', 'otrasl'],
+    'expect': ['expect'],
+    'maximum': ['maximum'],
+}
 
-        total.add_max_demand(
-            data=data_dict
-        )
 
-    consumers.add_total(total)
+def rollup_levels(df: pd.DataFrame, shown_columns: List[str], otrasl_total: List[str],
+                  value_columns: List[str]) -> Dict[str, Dict[str, pd.DataFrame]]:
+    """
+    Итоги отчета за один проход: строки группируются один раз до всех колонок уровней,
+    итоги уровней (ver_real_level2, ver_real_level1, otrasl, expect, maximum) для общего итога
+    и регионов считаются по этой таблице, детализация по потребителям - одной группировкой.
 
-    ####################################################################################################################
-    # regions
-    for region, region_group in processed_df.groupby('region'):
-        ver_real_null = f_ver_real_null()
-        # регион
-        region = RegionData(region_name=region)
-
-        # Группировка (ver_real_level2) по вероятности реализации проекта (действующие потребители, перспективные потребители)
-        for ver_real2, ver_real_group2 in region_group.groupby('ver_real_level2'):
-            # Итог по вероятности реализации проекта (перспективные потребители)
-            subgroup_itog = ver_real_group2.groupby(['ver_real_level2']).agg(agg_dict).reset_index()
-            for row in subgroup_itog.itertuples():
-                data_dict = {
-                    **{f'{get_column_name(column, columns_map)}': None for column in shown_columns},
-                    **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-                    f'{get_column_name("prirost", columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-                }
-
-                data_dict = replace_value_map(data_dict, value_map)
-
-                region.add_total_consumers(
-                    ver_real=ver_real2,
-                    name="ИТОГО",
-                    data=data_dict
-                )
-
-            # Группировка (ver_real_level1) по вероятности реализации проекта (Действующие потребители, Ожидаемые, Потенциальные)
-            for ver_real, ver_real_group in ver_real_group2.groupby('ver_real_level1'):
-                # Итог по вероятности реализации проекта
-                subgroup_itog = ver_real_group.groupby(['ver_real_level1']).agg(agg_dict).reset_index()
-                for row in subgroup_itog.itertuples():
-                    data_dict = {
-                        **{f'{get_column_name(column,columns_map)}': None for column in shown_columns},
-                        **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-                        f'{get_column_name("prirost",columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-                    }
-
-                    data_dict = replace_value_map(data_dict, value_map)
-
-                    region.add_consumers(
-                        ver_real=ver_real,
-                        name="ИТОГО",
-                        data=data_dict
-                    )
-
-                    region.add_detalization_consumers(
-                        ver_real=ver_real,
-                        name="ИТОГО",
-                        data=data_dict
-                    )
-
-                    ver_real_null[ver_real] = "true"
-
-                # Отрасль в итогах
-                if len(otrasl_total_filter):
-                    filtered = ver_real_group[ver_real_group['otrasl'].isin(otrasl_total_filter)]
-                    subgroup_itog = filtered.groupby(['otrasl']).agg(agg_dict).reset_index()
-                else:
-                    subgroup_itog = ver_real_group.groupby(['otrasl']).agg(agg_dict).reset_index()
-
-                for row in subgroup_itog.itertuples():
-                    data_dict = {
-                        **{f'{get_column_name(column,columns_map)}': None for column in shown_columns},
-                        **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-                        f'{get_column_name("prirost",columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-
-                    }
-
-                    data_dict = replace_value_map(data_dict, value_map)
-
-                    region.add_consumers(
-                        ver_real=ver_real,
-                        name=row.otrasl,
-                        data=data_dict
-                    )
-
-                # Детализация по потребителям
-                group_cols = ['sort', 'contragent'] + shown_columns
-                subgroup_itog = (
-                    ver_real_group
-                    .groupby(group_cols, dropna=False)  # важно оставить dropna=False
-                    .agg(agg_dict)
-                    .reset_index()
-                )
-                subgroup_itog = subgroup_itog.merge(
-                    ver_real_group[['sort', 'contragent', 'otrasl_ord'] + shown_columns].drop_duplicates(),
-                    on=['sort', 'contragent'] + shown_columns,
-                    how='left'
-                )
-
-                subgroup_itog = sort_subgroup(subgroup_itog)  # Применяем сортировку
-                for row in subgroup_itog.itertuples():
-                    data_dict = {
-                        **{f'{get_column_name(column, columns_map)}': getattr(row, f'{column}') for column in
-                           shown_columns},
-                        **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-                        f'{get_column_name("prirost", columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-                    }
-
-                    data_dict = replace_value_map(data_dict, value_map)
-
-                    region.add_detalization_consumers(
-                        ver_real=ver_real,
-                        name=row.contragent,
-                        data=data_dict
-                    )
-
-        for ver_real, value in ver_real_null.items():
-            if value == "false":
-                region.add_consumers(
-                    ver_real=ver_real,
-                    name="ИТОГО",
-                    data=data_dict_null
-                )
-
-                region.add_detalization_consumers(
-                    ver_real=ver_real,
-                    name="ИТОГО",
-                    data=data_dict_null
-                )
-
-        # Ожидаемый сценарий спроса
-        subgroup = region_group.groupby(['expect']).agg(agg_dict).reset_index()
-        for row in subgroup.itertuples():
-            data_dict = {
-                **{f'{get_column_name(column,columns_map)}': None for column in shown_columns},
-                **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-                f'{get_column_name("prirost",columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-            }
-
-            data_dict = replace_value_map(data_dict, value_map)
-
-            region.add_expected_demand(
-                data=data_dict
-            )
-
-        # Максимальный спрос
-        subgroup = region_group.groupby(['maximum']).agg(agg_dict).reset_index()
-        for row in subgroup.itertuples():
-            data_dict = {
-                **{f'{get_column_name(column,columns_map)}': None for column in shown_columns},
-                **{f'{y} год': f"{round(safe_float(getattr(row, f'y{y}')), 2):.1f}" for y in years},
-                f'{get_column_name("prirost",columns_map)}': f"{round(safe_float(row.prirost), 2):.1f}"
-            }
-
-            data_dict = replace_value_map(data_dict, value_map)
-
-            region.add_max_demand(
-                data=data_dict
-            )
+    Returns:
+        {'scale': масштаб значений (см. to_units), 'total': {уровень: DataFrame},
+         'region': {уровень: DataFrame, 'consumer': DataFrame}}
+    """
+    df, scale = to_units(df, value_columns)
+    base_columns = ['region', 'ver_real_level2', 'ver_real_level1', 'otrasl', 'expect', 'maximum']
+    base = df.groupby(base_columns, dropna=False)[value_columns].sum().reset_index()
 
-        consumers.add_consumer(region)
+    # Отрасль в итогах
+    otrasl_base = base[base['otrasl'].isin(otrasl_total)] if len(otrasl_total) else base
+
+    rollup = {'scale': scale, 'total': {}, 'region': {}}
+    for level, columns in ROLLUP_LEVELS.items():
+        source = otrasl_base if level == 'otrasl' else base
+        rollup['total'][level] = source.groupby(columns)[value_columns].sum().reset_index()
+        rollup['region'][level] = source.groupby(['region'] + columns)[value_columns].sum().reset_index()
+
+    # Детализация по потребителям
+    keys = ['region', 'ver_real_level1', 'sort', 'contragent'] + shown_columns
+    consumer = (
+        df
+        .groupby(keys, dropna=False)  # важно оставить dropna=False
+        [value_columns].sum()
+        .reset_index()
+    )
+    consumer = consumer.merge(df[keys + ['otrasl_ord']].drop_duplicates(), on=keys, how='left')
+    rollup['region']['consumer'] = sort_subgroup(consumer, ['region', 'ver_real_level1'])  # Применяем сортировку
+
+    return rollup
+
+
+def to_units(df: pd.DataFrame, value_columns: List[str]) -> Tuple[pd.DataFrame, Any]:
+    """
+    Переводит значения Decimal в целые int64 в единицах 10^-scale: группировка идет без объектов Python,
+    а суммы точно совпадают с суммами Decimal.
+
+    Returns:
+        (DataFrame, scale); scale=None - значения суммируются как есть (float или Decimal, если
+        масштаб больше MAX_SCALE или суммы не помещаются в int64)
+    """
+    values = df[value_columns].to_numpy().ravel()
+    if not all(isinstance(value, Decimal) and value.is_finite() for value in values):
+        return df.astype({column: float for column in value_columns}), None
+
+    scale = max([-value.as_tuple().exponent for value in values] + [0])
+    if scale > MAX_SCALE:
+        return df, None
+    units = {column: [int(value.scaleb(scale)) for value in df[column].to_numpy()] for column in value_columns}
+    if max(sum(abs(unit) for unit in column_units) for column_units in units.values()) >= 2 ** 62:
+        return df, None
+    return df.assign(**{column: pd.Series(units[column], index=df.index, dtype='int64')
+                        for column in value_columns}), scale
+
+
+def format_values(frame: pd.DataFrame, value_columns: List[str], scale: Any = None,
+                  years_digits: int = 2) -> List[Tuple]:
+    """Значения строк как в отчете: округление, один знак после запятой, '0.0' → '-'"""
+    digits = [years_digits] * (len(value_columns) - 1) + [2]
+    rows = frame[value_columns].itertuples(index=False, name=None)
+    if scale is not None:
+        rows = ([float(Decimal(int(unit)).scaleb(-scale)) for unit in row] for row in rows)
+    return [
+        tuple(value_map.get(text, text) for text in (f"{round(safe_float(value), d):.1f}" for value, d in zip(row, digits)))
+        for row in rows
+    ]
+
+
+def rows_by_region(levels: Dict[str, pd.DataFrame], value_columns: List[str], scale: Any = None,
+                   years_digits: int = 2, by_region: bool = True) -> Dict[Any, Dict[str, List[Tuple]]]:
+    """
+    Раскладывает таблицы итогов по регионам: регион → уровень → [(ключ, значения)].
+    Для общего итога (by_region=False) регион - None.
+    """
+    result = {}
+    for level, frame in levels.items():
+        key_columns = [column for column in frame.columns if column not in value_columns and column != 'otrasl_ord']
+        values = format_values(frame, value_columns, scale, years_digits if level == 'ver_real_level2' else 2)
+        for key, row_values in zip(frame[key_columns].itertuples(index=False, name=None), values):
+            region = key[0] if by_region else None
+            if by_region:
+                key = key[1:]
+            result.setdefault(region, {name: [] for name in levels})[level].append((key, row_values))
+    return result
 
-    result = consumers.to_dict()
 
-    return result
+def fill_region(region: RegionData, rows: Dict[str, List[Tuple]], shown_count: int, values_null: Tuple,
+                detalization: bool) -> None:
+    """Заполняет RegionData строками итогов (и детализацией по потребителям для регионов)"""
+    empty = (None,) * shown_count
+
+    # Итог по вероятности реализации проекта (перспективные потребители)
+    for (ver_real2,), values in rows['ver_real_level2']:
+        region.add_total_consumers(ver_real=ver_real2, name="ИТОГО", values=empty + values)
+
+    # Итог по вероятности реализации проекта (Действующие потребители, Ожидаемые, Потенциальные)
+    ver_real_null = f_ver_real_null()
+    for (ver_real,), values in rows['ver_real_level1']:
+        values = empty + values
+        region.add_consumers(ver_real=ver_real, name="ИТОГО", values=values)
+        if detalization:
+            region.add_detalization_consumers(ver_real=ver_real, name="ИТОГО", values=values)
+        ver_real_null[ver_real] = "true"
+
+    # Отрасль в итогах
+    for (ver_real, otrasl), values in rows['otrasl']:
+        region.add_consumers(ver_real=ver_real, name=otrasl, values=empty + values)
+
+    # Детализация по потребителям
+    if detalization:
+        for (ver_real, sort, contragent, *shown_values), values in rows['consumer']:
+            shown_values = tuple(value_map.get(value, value) for value in shown_values)
+            region.add_detalization_consumers(ver_real=ver_real, name=contragent, values=shown_values + values)
+
+    for ver_real, value in ver_real_null.items():
+        if value == "false":
+            region.add_consumers(ver_real=ver_real, name="ИТОГО", values=values_null)
+            if detalization:
+                region.add_detalization_consumers(ver_real=ver_real, name="ИТОГО", values=values_null)
+
+    # Ожидаемый сценарий спроса
+    for key, values in rows['expect']:
+        region.add_expected_demand(values=empty + values)
+
+    # Максимальный спрос
+    for key, values in rows['maximum']:
+        region.add_max_demand(values=empty + values)
 
 def preprocess_data(df: pd.DataFrame, years: List[str], others_columns: List[str]) -> pd.DataFrame:
     """Предварительная обработка данных"""
@@ -376,16 +300,16 @@ def f_ver_real_null():
         "потенциальные перспективные потребители": "false",
     }
 
-def sort_subgroup(df: pd.DataFrame) -> pd.DataFrame:
-    """Сортировка подгрупп: сначала по otrasl_ord (пустые в конец), затем по contragent"""
+def sort_subgroup(df: pd.DataFrame, group_columns: List[str] = ()) -> pd.DataFrame:
+    """Сортировка подгрупп (внутри group_columns): сначала по otrasl_ord (пустые в конец), затем по contragent"""
     return (
         df.assign(
             # Флаг: True, если пустое значение
             _otrasl_empty=lambda x: x['otrasl_ord'].isna() | (x['otrasl_ord'] == '')
         )
         .sort_values(
-            by=['_otrasl_empty', 'otrasl_ord', 'contragent'],
-            ascending=[True, True, True],
+            by=[*group_columns, '_otrasl_empty', 'otrasl_ord', 'contragent'],
+            ascending=True,
             na_position='last'
         )
         .drop(columns=['_otrasl_empty'])
@@ -1,4 +1,5 @@
-﻿import os
+﻿import io
+import os
 import pandas as pd
 import json
 from datetime import datetime, date
@@ -7,6 +8,8 @@ from openpyxl import load_workbook
 from openpyxl.styles import Font, PatternFill, Border, Side, Alignment, numbers
 from openpyxl.utils import get_column_letter
 from typing import List, Tuple, Dict, Any
+from progSpros_back.functions.filter_spec_ps import FilterSpec
+from progSpros_back.namespace.ots_pr_spr.query_builder import get_query
 
 class CustomJSONEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -47,7 +50,7 @@ def get_data_exl(query, shown_columns, yearfrom: int, yearto: int, otrasl_total:
     others_columns = shown_columns + ['otrasl_ord'] if 'otrasl_ord' not in shown_columns else shown_columns
 
     try:
-        results = query.session.execute(query).fetchall()
+        results = query.all()
         df = pd.DataFrame(results, columns=[col['name'] for col in query.column_descriptions])
         if sum_pr is not None:
             #df = df[df['prirost'] > sum_pr]
@@ -97,6 +100,8 @@ def preprocess_data(df: pd.DataFrame, years: List[str], others_columns: List[str
     # Сначала очищаем данные для специальных контрагентов
     mask = df['contragent'].isin(['Действующие потребители', 'Прочие потребители'])
     cols_to_clear = [c for c in others_columns if c != 'ver_real']
+    # Числовые колонки приводятся к object: pandas не записывает '' в колонку float64
+    df[cols_to_clear] = df[cols_to_clear].astype(object)
     df.loc[mask, cols_to_clear] = ''
 
     # Затем преобразуем категории
@@ -426,7 +431,7 @@ def safe_float(value: Any) -> float:
     return float(value) if value is not None else 0.0
 
 """ GET_EXCEL """
-def get_excel(result, yearfrom, yearto, fo_params=None):
+def get_excel(result, yearfrom, yearto, fo_params, path):
     from openpyxl import load_workbook
     from openpyxl.styles import Font, PatternFill, Border, Side, Alignment, numbers
     from openpyxl.utils import get_column_letter
@@ -602,18 +607,16 @@ def get_excel(result, yearfrom, yearto, fo_params=None):
          "exclude": ["contragent"] + [f"y{y}" for y in range(yearfrom, yearto + 1)] + ["prirost"]},
     ]
 
-    # Имя файла
-    name = 'output.xlsx'
-    # basic_path = os.path.expanduser("~/work/backend/progSpros_back/")
-    #basic_path = '/opt/foresight/progSpros_back/'
-    basic_path = 'C:\\Users\\user\\PycharmProjects\\backend\\progSpros_back\\'
+    # Файл передает выгрузка (export_excel): задание или синхронный запрос
+    basic_path, name = os.path.split(path)
+    basic_path += os.sep
 
     # Сохраняем DataFrame в Excel
     y = json.dumps(result, cls=CustomJSONEncoder)
-    df = pd.read_json(y)
-    df.to_excel(basic_path + name, index=False)
+    df = pd.read_json(io.StringIO(y))
+    df.to_excel(path, index=False)
 
-    wb = load_workbook(basic_path + name)
+    wb = load_workbook(path)
     ws = wb.active
 
     # Вставляем заголовок
@@ -798,5 +801,19 @@ def get_excel(result, yearfrom, yearto, fo_params=None):
         if max_height > 30:
             ws.row_dimensions[cell.row].height = max_height
 
-    wb.save(basic_path + name)
-    return name, basic_path
\ No newline at end of file
+    wb.save(path)
+    return name, basic_path
+
+
+""" EXPORT_JOB """
+def export_excel(params: Dict[str, Any], path: str, progress) -> None:
+    """Выгрузка в Excel для задания ExportJobs: params - параметры OtsPrSprXls, файл пишется в path"""
+    yearfrom, yearto = params['yearfrom'], params['yearto']
+
+    progress('query', 5)
+    query = get_query(FilterSpec.from_dict(params['filter_spec']), yearfrom, yearto)
+
+    result = get_data_exl(query, params['shown_columns'], yearfrom, yearto, params['otrasl_total'], params['sum_pr'])
+
+    progress('excel', 50)
+    get_excel(result, yearfrom, yearto, params['fo_params'], path=path)
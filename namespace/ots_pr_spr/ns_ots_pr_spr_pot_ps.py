@@ -1,18 +1,97 @@
-from flask import jsonify, session, request, send_from_directory, send_file
+import io
+from types import SimpleNamespace
+
+from flask import session, request, send_file
 from flask_restx import Namespace, Resource
+from werkzeug.datastructures import MultiDict
 # Import the database session
 from progSpros_back.database_ps import cache, errorhandler
+from progSpros_back.functions.json_response_ps import json_response
+from progSpros_back.functions.export_jobs_ps import export_jobs
+from progSpros_back.functions.filter_spec_ps import FilterSpec
+from progSpros_back.functions.response_cache_ps import cached_response
+from progSpros_back.functions.xlsx_writer_ps import XLSX_MIMETYPE
 from progSpros_back.model.mappings_ps import yn_mapping
 #
 from progSpros_back.namespace.ots_pr_spr.constants import shown_columns_map
 from progSpros_back.namespace.ots_pr_spr.query_builder import get_query
-from progSpros_back.namespace.ots_pr_spr.data_processor import get_data
-from progSpros_back.namespace.ots_pr_spr.excel_generator import get_data_exl, get_excel
+# data_processor и excel_generator (pandas, openpyxl) импортируются в обработчиках при первом запросе отчета:
+# процессам, которые отдают только графики, эти библиотеки не нужны
 from progSpros_back.namespace.ots_pr_spr.maping import reverse_replace
 
 # Define the namespace
 ns_ots_pr_spr_ps = Namespace('OtsPrSpr', description='Оценка прогнозного спроса на газ потребителей')
 
+# Параметры выгрузки в Excel
+XLS_PARAMS = {
+    'yearfrom': {'description': 'Год с', 'in': 'query', 'type': 'integer'},
+    'yearto': {'description': 'Год по', 'in': 'query', 'type': 'integer'},
+    'sum_pr': {'description': 'Прирост с', 'in': 'query', 'type': 'integer'},
+    'fo': {'description': 'Федеральный округ', 'in': 'query', 'type': 'string'},
+    'region': {'description': 'Регион', 'in': 'query', 'type': 'string'},
+    'otrasl': {'description': 'Отрасль', 'in': 'query', 'type': 'string'},
+    'vers': {'description': 'Версия прогноза', 'in': 'query', 'type': 'string'},
+    'grpost': {'description': 'Группа поставщиков', 'in': 'query', 'type': 'string'},
+    'dogovor': {'description': 'Договор', 'in': 'query', 'type': 'string'},
+    'tu': {'description': 'ТУ', 'in': 'query', 'type': 'string'},
+    'shown_columns': {'description': 'Колонки', 'in': 'query', 'type': 'string'},
+    'otrasl_total': {'description': 'Отрасли в итогах', 'in': 'query', 'type': 'string'},
+    'infr': {'description': 'Инфраструктура', 'in': 'query', 'type': 'string'},
+}
+
+
+def job_args():
+    """
+    Аргументы задания выгрузки: параметры строки запроса и тело JSON (если передано).
+    Значения тела заменяют одноименные параметры строки; список в теле - то же, что повторенный параметр
+    """
+    args = MultiDict(request.args)
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        for name, value in body.items():
+            values = value if isinstance(value, list) else [value]
+            args.setlist(name, [str(item) for item in values if item is not None])
+    return args
+
+
+def get_xls_params(args=None):
+    """
+    Параметры выгрузки в Excel из запроса (сериализуемые, для задания ExportJobs)
+    Аргументы:
+        - args: аргументы выгрузки (MultiDict), по умолчанию - параметры строки запроса
+    """
+    if args is None:
+        args, filter_spec = request.args, FilterSpec.current()
+    else:
+        filter_spec = FilterSpec.from_request(SimpleNamespace(args=args))
+
+    # Колонки
+    shown_columns = [company.strip() for item in args.getlist('shown_columns', None) for company in item.split(',')]
+    if not len(shown_columns):
+        shown_columns = ['otrasl', 'dogovor', 'tu']
+
+    return {
+        'yearfrom': args.get('yearfrom', 2024, type=int),
+        'yearto': args.get('yearto', 2036, type=int),
+        'fo_params': [fo.strip() for item in args.getlist('fo') for fo in item.split(',') if fo.strip()],
+        'otrasl_total': args.get('otrasl_total', 'Население', type=str),
+        'sum_pr': args.get('sum_pr', None, type=float),
+        'shown_columns': reverse_replace(shown_columns, shown_columns_map),
+        'filter_spec': filter_spec.to_dict(),
+    }
+
+
+def job_response(status, code=200):
+    """
+    Ответ с состоянием задания выгрузки
+    """
+    graph_data = {
+        "title": "Выгрузка в Excel",
+        "data": status
+    }
+
+    return json_response(graph_data, code)
+
 @ns_ots_pr_spr_ps.route('/columns')
 @ns_ots_pr_spr_ps.response(200, 'Success')
 
@@ -32,8 +111,7 @@ class Columns(Resource):
                 "data": result
             }
 
-            response = jsonify(graph_data)
-            response.headers.add('Access-Control-Allow-Origin', '*');
+            response = json_response(graph_data)
             return response
 
         except Exception as e:
@@ -58,6 +136,7 @@ class Columns(Resource):
     'infr': {'description': 'Инфраструктура', 'in': 'query', 'type': 'string'}
     })
 class OtsPrSpr(Resource):
+    @cached_response()
     def get(self):
         """
         Возвращает данные для отчета
@@ -82,7 +161,9 @@ class OtsPrSpr(Resource):
             otrasl_total = [company.strip() for item in request.args.getlist('otrasl_total', None) for company in
                              item.split(',')]
 
-            query = get_query(request, yearfrom, yearto)
+            from progSpros_back.namespace.ots_pr_spr.data_processor import get_data
+
+            query = get_query(FilterSpec.current(), yearfrom, yearto)
 
             result = get_data(query, shown_columns, otrasl_total, yearfrom, yearto, sum_pr)
 
@@ -91,8 +172,7 @@ class OtsPrSpr(Resource):
                 "data": result
             }
 
-            response = jsonify(graph_data)
-            response.headers.add('Access-Control-Allow-Origin', '*')
+            response = json_response(graph_data)
 
             return response
 
@@ -102,21 +182,7 @@ class OtsPrSpr(Resource):
 
 @ns_ots_pr_spr_ps.route('/ots_pr_spr_pot_ps_xls')
 @ns_ots_pr_spr_ps.response(200, 'Success')
-@ns_ots_pr_spr_ps.doc(params={
-    'yearfrom': {'description': 'Год с', 'in': 'query', 'type': 'integer'},
-    'yearto': {'description': 'Год по', 'in': 'query', 'type': 'integer'},
-    'sum_pr': {'description': 'Прирост с', 'in': 'query', 'type': 'integer'},
-    'fo': {'description': 'Федеральный округ', 'in': 'query', 'type': 'string'},
-    'region': {'description': 'Регион', 'in': 'query', 'type': 'string'},
-    'otrasl': {'description': 'Отрасль', 'in': 'query', 'type': 'string'},
-    'vers': {'description': 'Версия прогноза', 'in': 'query', 'type': 'string'},
-    'grpost': {'description': 'Группа поставщиков', 'in': 'query', 'type': 'string'},
-    'dogovor': {'description': 'Договор', 'in': 'query', 'type': 'string'},
-    'tu': {'description': 'ТУ', 'in': 'query', 'type': 'string'},
-    'shown_columns': {'description': 'Колонки', 'in': 'query', 'type': 'string'},
-    'otrasl_total': {'description': 'Отрасли в итогах', 'in': 'query', 'type': 'string'},
-    'infr': {'description': 'Инфраструктура', 'in': 'query', 'type': 'string'},
-    })
+@ns_ots_pr_spr_ps.doc(params=XLS_PARAMS)
 
 class OtsPrSprXls(Resource):
     def get(self):
@@ -124,30 +190,75 @@ class OtsPrSprXls(Resource):
         Возвращает Excel
         """
         try:
+            from progSpros_back.namespace.ots_pr_spr.excel_generator import export_excel
 
-            yearfrom = request.args.get('yearfrom', 2024, type=int)
-            yearto = request.args.get('yearto', 2036, type=int)
-            fo_params = [fo.strip() for item in request.args.getlist('fo') for fo in item.split(',') if fo.strip()]
-            otrasl_total = request.args.get('otrasl_total', 'Население', type=str)
-            sum_pr = request.args.get('sum_pr', None, type=float)
-            # Колонки
-            shown_columns = [company.strip() for item in request.args.getlist('shown_columns', None) for company in item.split(',')]
+            # Та же выгрузка, что у заданий, во временный файл запроса
+            data = export_jobs.run(export_excel, get_xls_params())
 
-            if not len(shown_columns):
-                shown_columns = ['otrasl', 'dogovor', 'tu']
-            shown_columns = reverse_replace(shown_columns, shown_columns_map)
+            response = send_file(io.BytesIO(data), mimetype=XLSX_MIMETYPE, as_attachment=True,
+                                 download_name='output.xlsx')
 
-            query = get_query(request, yearfrom, yearto)
+            return response
 
-            result = get_data_exl(query, shown_columns, yearfrom, yearto, otrasl_total, sum_pr)
+        except Exception as e:
+             ns_ots_pr_spr_ps.abort(*errorhandler(e))
 
-            name, basic_path = get_excel(result, yearfrom, yearto, fo_params)
 
-            # Передать файл Excel выгруженный на сервер
-            response = send_from_directory(directory=f"{basic_path}", path=name, as_attachment=True)
-            response.headers.add('Access-Control-Allow-Origin', '*')
+@ns_ots_pr_spr_ps.route('/ots_pr_spr_pot_ps_xls/jobs')
+@ns_ots_pr_spr_ps.response(202, 'Accepted')
+@ns_ots_pr_spr_ps.doc(params=XLS_PARAMS)
 
+class OtsPrSprXlsJobs(Resource):
+    def post(self):
+        """
+        Ставит выгрузку в Excel в очередь и возвращает задание (job, state, stage, progress)
+        Аргументы:
+            - те же, что у /ots_pr_spr_pot_ps_xls: в строке запроса или в теле JSON
+              ({"yearfrom": 2024, "otrasl": ["Энергетика", "Металлургия"], ...})
+            - одинаковые параметры при одной версии данных возвращают одно задание
+        """
+        try:
+            from progSpros_back.namespace.ots_pr_spr.excel_generator import export_excel
+
+            status = export_jobs.submit('ots_pr_spr_pot_ps_xls', export_excel, get_xls_params(job_args()))
+
+            response = job_response(status, 202)
+            response.headers['Location'] = f"{request.path}/{status['job']}"
             return response
 
         except Exception as e:
-             ns_ots_pr_spr_ps.abort(*errorhandler(e))
\ No newline at end of file
+             ns_ots_pr_spr_ps.abort(*errorhandler(e))
+
+
+@ns_ots_pr_spr_ps.route('/ots_pr_spr_pot_ps_xls/jobs/<string:job_id>')
+@ns_ots_pr_spr_ps.response(200, 'Success')
+@ns_ots_pr_spr_ps.response(404, 'Задание не найдено')
+
+class OtsPrSprXlsJob(Resource):
+    def get(self, job_id):
+        """
+        Возвращает состояние задания выгрузки (queued, running, done, failed) и ход выполнения
+        """
+        status = export_jobs.status(job_id)
+        if status is None:
+            ns_ots_pr_spr_ps.abort(404, f"Задание не найдено: {job_id}")
+        return job_response(status)
+
+
+@ns_ots_pr_spr_ps.route('/ots_pr_spr_pot_ps_xls/jobs/<string:job_id>/file')
+@ns_ots_pr_spr_ps.response(200, 'Success')
+@ns_ots_pr_spr_ps.response(404, 'Файл не готов')
+
+class OtsPrSprXlsJobFile(Resource):
+    def get(self, job_id):
+        """
+        Возвращает файл Excel готового задания выгрузки
+        """
+        status = export_jobs.status(job_id)
+        path = export_jobs.path(job_id, status)
+        if path is None:
+            ns_ots_pr_spr_ps.abort(404, f"Файл задания не готов: {job_id}")
+
+        response = send_file(path, mimetype=XLSX_MIMETYPE, as_attachment=True,
+                             download_name=status['filename'])
+        return response
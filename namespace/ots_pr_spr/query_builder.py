@@ -1,19 +1,12 @@
 ﻿from flask import session
 from sqlalchemy import and_, func, case
-from progSpros_back.functions.chart_data_functions_ps import apply_dynamic_filters
-from progSpros_back.functions.utility_functions_ps import create_filter_params, set_db_connection
+from progSpros_back.functions.utility_functions_ps import set_db_connection
 from progSpros_back.model.db_models_ps import Prirost, PSDATA, reference_models, Otrasl, FedState, Regions, GroupPost, Contragent, StPotr, StGaz, PG, Dogovor, TU, Infr, VersProgn, Proizv
-from progSpros_back.model.mappings_ps import otr_mapping, vers_mapping, grpost_mapping, fo_mapping, region_mapping, yn_mapping
 from progSpros_back.database_ps import db
+from progSpros_back.functions.slow_query_ps import query_origin
 
-def get_query(request, yearfrom, yearto):
+def get_query(filter_spec, yearfrom, yearto):
     try:
-        # Получить фильтр-параметры из запроса
-        filter_params = create_filter_params(request)
-        # Если не заданы глобальные параметры, взять их из session
-        if not filter_params:
-            filter_params = session.get('filter_params')
-
         base_query = (
             db.query(
                 PSDATA.tab_fo_d314_ids,
@@ -50,65 +43,9 @@ def get_query(request, yearfrom, yearto):
             )
         )
 
-        base_query = apply_dynamic_filters(base_query, PSDATA, filter_params, db, reference_models)
-
-        sum_pr = request.args.get('sum_pr', 0, type=int)
-
-        # Параметры Отрасль
-        reverse_otr_mapping = {value: key for key, value in otr_mapping.items()}
-        otr = [company.strip() for item in request.args.getlist('otrasl', None) for company in item.split(',')]
-        mapped_otr = [reverse_otr_mapping.get(company, company) for company in otr]
-        if otr:
-            base_query = base_query.filter((PSDATA.tab_otrasl_economy_d314_ids.in_(mapped_otr)))
-
-        # Параметры Версия прогноза
-        reverse_vers_mapping = {value: key for key, value in vers_mapping.items()}
-        vers = [company.strip() for item in request.args.getlist('vers', None) for company in item.split(',')]
-        mapped_vers = [reverse_vers_mapping.get(company, company) for company in vers]
-        if vers:
-            base_query = base_query.filter((PSDATA.tab_ver_real_pr_d314_ids.in_(mapped_vers)))
-
-        # Параметры Группа поставщиков
-        reverse_grpost_mapping = {value: key for key, value in grpost_mapping.items()}
-        grpost = [company.strip() for item in request.args.getlist('grpost', None) for company in item.split(',')]
-        mapped_grpost = [reverse_grpost_mapping.get(company, company) for company in grpost]
-        if grpost:
-            base_query = base_query.filter((PSDATA.tab_group_post_d314_ids.in_(mapped_grpost)))
+        # Фильтры запроса (global_filters, session и параметры otrasl, vers, grpost, fo, region, ...)
+        base_query = filter_spec.apply(base_query, PSDATA)
 
-        # Параметры Федеральный округ
-        reverse_fo_mapping = {value: key for key, value in fo_mapping.items()}
-        fo = [company.strip() for item in request.args.getlist('fo', None) for company in item.split(',')]
-        mapped_fo = [reverse_fo_mapping.get(company, company) for company in fo]
-        if fo:
-            base_query = base_query.filter((PSDATA.tab_fo_d314_ids.in_(mapped_fo)))
-
-        # Параметры Регион
-        reverse_region_mapping = {value: key for key, value in region_mapping.items()}
-        region = [company.strip() for item in request.args.getlist('region', None) for company in item.split(',')]
-        mapped_region = [reverse_region_mapping.get(company, company) for company in region]
-        if region:
-            base_query = base_query.filter((PSDATA.tab_region_d314_ids.in_(mapped_region)))
-
-        # Параметры Договор
-        reverse_dog_mapping = {value: key for key, value in yn_mapping.items()}
-        dogovor = [company.strip() for item in request.args.getlist('dogovor', None) for company in item.split(',')]
-        mapped_dog = [reverse_dog_mapping.get(company, company) for company in dogovor]
-        if dogovor:
-            base_query = base_query.filter((PSDATA.tab_dogovor_visual_d314_ids.in_(mapped_dog)))
-
-        # Параметры ТУ
-        reverse_tu_mapping = {value: key for key, value in yn_mapping.items()}
-        tu = [company.strip() for item in request.args.getlist('tu', None) for company in item.split(',')]
-        mapped_tu = [reverse_tu_mapping.get(company, company) for company in tu]
-        if tu:
-            base_query = base_query.filter((PSDATA.tab_tu_visual_d314_ids.in_(mapped_tu)))
-
-        # Параметры Инфраструктура
-        reverse_infr_mapping = {value: key for key, value in yn_mapping.items()}
-        infr = [company.strip() for item in request.args.getlist('infr', None) for company in item.split(',')]
-        mapped_infr = [reverse_infr_mapping.get(company, company) for company in infr]
-        if infr:
-            base_query = base_query.filter((PSDATA.tab_infr_d314_ids.in_(mapped_infr)))
         years = [str(year) for year in range(yearfrom, yearto + 1)]
 
         # Продолжить создавать основной запрос
@@ -116,14 +53,11 @@ def get_query(request, yearfrom, yearto):
                                     Regions, GroupPost, StPotr, StGaz, Infr, Dogovor, TU,
                                     yearfrom, yearto, Contragent, VersProgn, db)
 
-        #from sqlalchemy.dialects import postgresql
-        # This will print the query with parameters inline
-        #print(query.statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
-
         return query
     finally:
         db.close()
 
+@query_origin
 def ots_pr_spr_pot_query(
         years, base_query,
         tab_prirost_d314, tab_progn_spr_gaz_d314, tab_otrasl_economy_d314, tab_fo_d314,
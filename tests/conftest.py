@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Как в progSpros_back.wsgi: каталог проекта (для import config_ps) и его родитель (для import progSpros_back)
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (PROJECT_DIR, os.path.dirname(PROJECT_DIR)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,135 @@
+"""
+    Загрузчик прогноза (functions/bulk_load_ps.py) на PostgreSQL: COPY во временную таблицу, замена строк
+    дат загрузки, откат при ошибке в данных и номер загрузки.
+
+    Тест выполняется, если PROGSPROS_DATABASE_URI указывает на PostgreSQL, иначе пропускается.
+    Нужна отдельная тестовая БД: тест применяет миграции и пишет строки за даты LOAD_DATE и OTHER_DATE.
+"""
+import csv
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import delete, func, insert, inspect, select
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+from progSpros_back.functions.bulk_load_ps import STAGING_TABLE, load_forecast
+from progSpros_back.functions.forecast_cube_ps import cube_coverage, invalidate_forecast_cube
+from progSpros_back.model.db_models_ps import LoadGeneration, PSCube, PSCubeBuild, PSDATA, Prirost, PrirostBuild
+from progSpros_back.model.migrations_ps import upgrade
+
+pytestmark = pytest.mark.skipif(
+    engine.dialect.name != 'postgresql', reason='PROGSPROS_DATABASE_URI не указывает на PostgreSQL'
+)
+
+LOAD_DATE = datetime(1990, 1, 1)
+OTHER_DATE = datetime(1990, 2, 1)
+
+HEADER = ['tab_fo_d314_ids', 'tab_region_d314_ids', 'poruch', 'year', 'summ', 'date']
+
+
+def write_csv(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    return str(path)
+
+
+def forecast_rows(date):
+    with engine.connect() as connection:
+        return connection.execute(
+            select(PSDATA.tab_fo_d314_ids, PSDATA.poruch, PSDATA.year, PSDATA.summ)
+            .where(PSDATA.date == date).order_by(PSDATA.year, PSDATA.tab_fo_d314_ids)
+        ).all()
+
+
+def generations():
+    with engine.connect() as connection:
+        return dict(connection.execute(select(LoadGeneration.table_name, LoadGeneration.generation)).all())
+
+
+def clean():
+    dates = [LOAD_DATE, OTHER_DATE]
+    with engine.begin() as connection:
+        for model in (PSDATA, Prirost, PrirostBuild, PSCube, PSCubeBuild):
+            connection.execute(delete(model).where(model.date.in_(dates)))
+
+
+@pytest.fixture
+def database(monkeypatch):
+    upgrade(engine)
+    monkeypatch.setattr(Config, 'PRIROST_BUILD_ON_LOAD', False, raising=False)
+    clean()
+    with engine.begin() as connection:
+        connection.execute(insert(PSDATA), [
+            {'tab_fo_d314_ids': 1, 'year': 2030, 'summ': Decimal('1.5'), 'date': LOAD_DATE},
+            {'tab_fo_d314_ids': 1, 'year': 2030, 'summ': Decimal('7'), 'date': OTHER_DATE},
+        ])
+        connection.execute(insert(Prirost).values(
+            tab_fo_d314_ids=1, summ=Decimal('1.5'), yearfrom=2029, yearto=2030, date=LOAD_DATE,
+        ))
+    yield
+    clean()
+
+
+def test_replace_copies_rows_and_bumps_version(database, tmp_path):
+    path = write_csv(tmp_path / 'forecast.csv', [
+        [1, 10, 'Поручение, "с кавычками"', 2030, '2.25', '1990-01-01'],
+        [2, 11, '', 2030, '3,5', '01.01.1990'],
+        [1, 10, None, 2031, '', '1990-01-01 00:00:00'],
+    ])
+    before = generations()
+
+    # Пакеты по 2 строки: COPY выполняется несколько раз в одной транзакции
+    result = load_forecast(path, chunk_size=2)
+
+    assert result.rows == 3
+    assert result.dates == [LOAD_DATE]
+    assert forecast_rows(LOAD_DATE) == [
+        (1, 'Поручение, "с кавычками"', 2030, Decimal('2.25')),
+        (2, None, 2030, Decimal('3.5')),
+        (1, None, 2031, None),
+    ]
+    # Строки других дат не меняются
+    assert forecast_rows(OTHER_DATE) == [(1, None, 2030, Decimal('7'))]
+    # Прирост за дату загрузки удален вместе со старыми строками
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).where(Prirost.date == LOAD_DATE)).scalar() == 0
+    after = generations()
+    for model in (PSDATA, Prirost):
+        assert after[model.__tablename__] == before[model.__tablename__] + 1
+    # Агрегат пересобран: итоги за дату записаны в журнал пересборки
+    assert cube_coverage.covers(LOAD_DATE)
+    with engine.begin() as connection:
+        invalidate_forecast_cube(connection, [LOAD_DATE])
+    cube_coverage.invalidate()
+    assert not cube_coverage.covers(LOAD_DATE)
+
+
+def test_append_keeps_rows_of_load_date(database, tmp_path):
+    path = write_csv(tmp_path / 'forecast.csv', [[3, 12, 'x', 2030, '4', '1990-01-01']])
+
+    load_forecast(path, mode='append')
+
+    assert forecast_rows(LOAD_DATE) == [(1, None, 2030, Decimal('1.5')), (3, 'x', 2030, Decimal('4'))]
+
+
+def test_bad_row_rolls_back(database, tmp_path):
+    path = write_csv(tmp_path / 'forecast.csv', [
+        [1, 10, None, 2030, '2', '1990-01-01'],
+        [1, 10, None, 2031, '3', '1990-01-01'],
+        [1, 10, None, 2032, 'не число', '1990-01-01'],
+    ])
+    before = generations()
+
+    # Первый пакет уже скопирован во временную таблицу, ошибка во втором пакете
+    with pytest.raises(ValueError, match='строка 4, колонка summ'):
+        load_forecast(path, chunk_size=2)
+
+    assert forecast_rows(LOAD_DATE) == [(1, None, 2030, Decimal('1.5'))]
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).where(Prirost.date == LOAD_DATE)).scalar() == 1
+        assert not inspect(connection).has_table(STAGING_TABLE)
+    assert generations() == before
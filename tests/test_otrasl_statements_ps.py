@@ -0,0 +1,34 @@
+"""Количество SQL-запросов /PrSprOtrasl/pr-spr-otrasl-data: прирост по отраслям считается одним запросом."""
+from sqlalchemy import event
+
+from progSpros_back.config_ps import Config
+from progSpros_back.database_ps import engine
+from progSpros_back.functions.data_version_ps import data_version
+from progSpros_back.Progn_Spros_app import app
+
+URL = '/PrSprOtrasl/pr-spr-otrasl-data'
+
+
+def test_otrasl_growth_single_statement(monkeypatch):
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_ENABLED', False, raising=False)
+    # Версия данных не перечитывается между запросами теста
+    monkeypatch.setattr(data_version, '_ttl', 3600)
+    client = app.test_client()
+    params = {'yearfrom': 2023, 'yearto': 2034, 'date': '2024-06-01'}
+
+    # Первый запрос заполняет кэши процесса: схема, справочники, версия данных, актуальность агрегата
+    assert client.get(URL, query_string=params).status_code == 200
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(URL, query_string=params)
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    assert response.status_code == 200
+    assert len(statements) == 1, statements
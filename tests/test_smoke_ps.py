@@ -0,0 +1,26 @@
+"""Проверка, что приложение импортируется и кэш ответов по умолчанию инициализируется Flask-Caching."""
+from flask import Flask
+from flask_caching import Cache
+
+
+def test_app_imports():
+    from progSpros_back.Progn_Spros_app import app
+
+    response = app.test_client().get('/swagger.json')
+    assert response.status_code == 200
+
+
+def test_memory_bounded_cache_init_app():
+    app = Flask(__name__)
+    app.config.update(
+        CACHE_TYPE='progSpros_back.functions.response_cache_ps.MemoryBoundedCache',
+        CACHE_DEFAULT_TIMEOUT=60,
+        CACHE_MAX_BYTES=1024,
+    )
+    cache = Cache(app)
+    backend = cache.cache
+
+    assert backend.default_timeout == 60
+    assert backend.stats()['max_bytes'] == 1024
+    assert cache.set('key', {'body': b'x'})
+    assert cache.get('key') == {'body': b'x'}